@@ -2,15 +2,23 @@
 to the plugin."""
 
 import gdb
+import itertools
 import json
 import logging
 import os
 import queue
 import re
+import select
 import socket
+import struct
 import sys
 import threading
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # -----------------------------------------------------------------------------
 # Logging
 # -----------------------------------------------------------------------------
@@ -26,6 +34,98 @@ handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s]: %(message)s
 logger.addHandler(handler)
 
 
+# Responses longer than this are split into several datagrams
+MAX_DATAGRAM = 60000
+SOCK_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Limits of the value summaries for the inspector
+INSPECT_MAX_ELEMENTS = 20
+INSPECT_MAX_DEPTH = 1
+INSPECT_MAX_SUMMARY = 1000
+
+# Requests and debugger commands that don't change anything in GDB
+CACHEABLE_REQUESTS = {"info-breakpoints", "get-backtrace", "breakpoints-list"}
+CACHEABLE_COMMANDS = {"info breakpoints", "bt", "backtrace",
+                      "nvim-gdb-info-breakpoints"}
+
+# The side channel address prefix requesting a Unix-domain stream socket
+UNIX_PREFIX = "unix:"
+
+
+# -----------------------------------------------------------------------------
+# Transport
+# -----------------------------------------------------------------------------
+
+class DatagramPeer:
+    """The plugin reached over UDP, every message is a JSON datagram."""
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+
+    def send(self, message):
+        msg = json.dumps(message).encode("utf-8")
+        if len(msg) <= MAX_DATAGRAM:
+            self.sock.sendto(msg, self.addr)
+            return
+        # Too big for a single datagram: send the message in chunks
+        # "#<req_id> <index> <count>\n<part of the message>" to be
+        # reassembled by the plugin.
+        chunks = [msg[i:i + MAX_DATAGRAM]
+                  for i in range(0, len(msg), MAX_DATAGRAM)]
+        for idx, chunk in enumerate(chunks):
+            header = "#{} {} {}\n".format(message.get("request"), idx,
+                                          len(chunks))
+            self.sock.sendto(header.encode("utf-8") + chunk, self.addr)
+
+
+class StreamPeer:
+    """The plugin connected to the Unix-domain socket.
+
+    Every frame is prefixed with its length (4 bytes, big endian).
+    The requests are plain text, the messages to the plugin start with
+    a byte denoting the encoding: J for JSON, M for msgpack.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = b""
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        if msgpack is not None:
+            payload = b"M" + msgpack.packb(_stringify_keys(message))
+        else:
+            payload = b"J" + json.dumps(message).encode("utf-8")
+        with self.lock:
+            self.conn.sendall(struct.pack(">I", len(payload)) + payload)
+
+    def recv(self, timeout=None):
+        """Receive the next frame, raise EOFError when disconnected."""
+        while True:
+            if len(self.buffer) >= 4:
+                size, = struct.unpack(">I", self.buffer[:4])
+                if len(self.buffer) >= 4 + size:
+                    frame = self.buffer[4:4 + size]
+                    self.buffer = self.buffer[4 + size:]
+                    return frame
+            # Don't let the socket timeout affect sending
+            if not select.select([self.conn], [], [], timeout)[0]:
+                raise socket.timeout()
+            data = self.conn.recv(65536)
+            if not data:
+                raise EOFError()
+            self.buffer += data
+
+
+def _stringify_keys(value):
+    """Make the keys strings as they would be in JSON."""
+    if isinstance(value, dict):
+        return {str(k): _stringify_keys(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stringify_keys(v) for v in value]
+    return value
+
 # -----------------------------------------------------------------------------
 # Command
 # -----------------------------------------------------------------------------
@@ -38,17 +138,82 @@ class NvimGdbInit(gdb.Command):
 
         self.quit = False
         self.thrd = None
-        self.cmd_queue = queue.Queue()
+        self.cmd_queue = queue.Queue()     # (command, peer)
 
         self.fallback_to_parsing = False
         self.state = "stopped"
         self.exited_or_ran = False
+        self.stop_count = 0
+
+        # Generations let the plugin skip unchanged data: the breakpoints
+        # and the location shown last.
+        self.breaks_gen = 0
+        self.frame_gen = 0
+        # The pending breakpoints have no locations to change breaks_gen
+        self.breaks_created = 0
+        self.frame_key = None
+
+        # The plugin subscribed to the stop notifications
+        self.listener = None
+
+        # Commands watched by the plugin {id -> [args, output, gen]},
+        # evaluated only when the program state might have changed.
+        self.watches = {}
+        self.watches_gen = 0
+        self.watches_key = None
+        self.mutation_count = 0
+
+        # Values being inspected {handle -> [value, name, children, position]}
+        # until the program resumes. The iterator of the children allows
+        # continuing from the position where the last page ended.
+        self.inspected = {}
+        self.last_inspect_handle = 0
+
+        # Where the last backtrace page ended (stop_count, level, frame)
+        # to continue unwinding from there.
+        self.backtrace_cursor = None
+
+        # Responses to the read-only requests {(request, args) -> result}
+        # valid until anything happens in GDB. The prompt is shown after
+        # every user command, so the commands can't affect the responses
+        # unnoticed.
+        self.response_cache = {}
+        self.has_response_cache = hasattr(gdb.events, "before_prompt")
+
+        # Breakpoint locations {normalized path -> {line -> [id]}}
+        # kept up to date by the breakpoint events.
+        self.breaks_index = {}
+        self.breaks_locations = {}      # {id -> [(path, line)]}
+        self.relative_break_paths = set()
+        self.breaks_index_valid = False
+        self.has_breakpoint_events = all(
+            hasattr(gdb.events, name) for name in (
+                "breakpoint_created",
+                "breakpoint_modified",
+                "breakpoint_deleted",
+            )
+        )
 
         # ---- GDB events (main thread only) -----------------------------------
 
         gdb.events.cont.connect(self._on_continue)
         gdb.events.stop.connect(self._on_stop)
         gdb.events.exited.connect(self._on_exit)
+        if self.has_breakpoint_events:
+            gdb.events.breakpoint_created.connect(self._on_breakpoint_created)
+            gdb.events.breakpoint_created.connect(self._on_breakpoint_changed)
+            gdb.events.breakpoint_modified.connect(self._on_breakpoint_changed)
+            gdb.events.breakpoint_deleted.connect(self._on_breakpoint_deleted)
+        for name in ("memory_changed", "register_changed"):
+            if hasattr(gdb.events, name):
+                getattr(gdb.events, name).connect(self._on_mutation)
+        if self.has_response_cache:
+            for name in ("cont", "stop", "exited", "breakpoint_created",
+                         "breakpoint_modified", "breakpoint_deleted",
+                         "memory_changed", "register_changed",
+                         "before_prompt"):
+                if hasattr(gdb.events, name):
+                    getattr(gdb.events, name).connect(self._invalidate_cache)
 
     # -------------------------------------------------------------------------
     # GDB event handlers (main thread)
@@ -57,13 +222,57 @@ class NvimGdbInit(gdb.Command):
     def _on_continue(self, event):
         self.state = "running"
         self.exited_or_ran = True
+        self.inspected = {}
 
     def _on_stop(self, event):
         self.state = "stopped"
+        self.stop_count += 1
+        if self.listener:
+            self._notify_stop(event)
 
     def _on_exit(self, event):
         self.state = "stopped"
         self.exited_or_ran = True
+        self.stop_count += 1
+        self.inspected = {}
+
+    def _invalidate_cache(self, *_):
+        self.response_cache = {}
+
+    def _on_mutation(self, event):
+        # The user has changed a variable or a register
+        self.mutation_count += 1
+
+    def _on_breakpoint_created(self, bp):
+        self.breaks_created += 1
+
+    def _on_breakpoint_changed(self, bp):
+        if self.breaks_index_valid and not self.fallback_to_parsing:
+            try:
+                locations = [(os.path.normpath(path), line)
+                             for path, line in self._enum_break_locations(bp)]
+            except AttributeError:
+                self.fallback_to_parsing = True
+                locations = None
+            if locations is not None:
+                if locations == self.breaks_locations.get(bp.number, []):
+                    # Only the hit count or the condition has changed
+                    return
+                self._remove_from_breaks_index(bp.number)
+                for path, line in locations:
+                    self._add_to_breaks_index(path, line, bp.number)
+                self.breaks_gen += 1
+                return
+        # The text output can only be parsed as a whole
+        self.breaks_index_valid = False
+        self.breaks_gen += 1
+
+    def _on_breakpoint_deleted(self, bp):
+        if self.breaks_index_valid and not self.fallback_to_parsing:
+            self._remove_from_breaks_index(bp.number)
+        else:
+            self.breaks_index_valid = False
+        self.breaks_gen += 1
 
     # -------------------------------------------------------------------------
     # GDB command entry
@@ -85,9 +294,20 @@ class NvimGdbInit(gdb.Command):
     # -------------------------------------------------------------------------
 
     def _server(self, server_address):
+        if server_address.startswith(UNIX_PREFIX):
+            self._serve_stream(server_address[len(UNIX_PREFIX):])
+        else:
+            self._serve_datagrams(server_address)
+
+    def _serve_datagrams(self, server_address):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         sock.bind(("127.0.0.1", 0))
         sock.settimeout(0.25)
+        try:
+            # Let large chunked responses be queued at once
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUFFER_SIZE)
+        except OSError:
+            pass
 
         _, port = sock.getsockname()
         with open(server_address, "w") as f:
@@ -108,7 +328,7 @@ class NvimGdbInit(gdb.Command):
                     continue
 
                 # enqueue for main thread
-                self.cmd_queue.put((command, sock, addr))
+                self.cmd_queue.put((command, DatagramPeer(sock, addr)))
                 gdb.post_event(self._process_queue)
 
         finally:
@@ -117,15 +337,52 @@ class NvimGdbInit(gdb.Command):
             except OSError:
                 pass
 
+    def _serve_stream(self, path):
+        srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        srv.bind(path)
+        # The plugin can connect as soon as the socket is listening
+        srv.listen(1)
+        srv.settimeout(0.25)
+        logger.info("Listening on %s", path)
+
+        try:
+            while not self.quit:
+                try:
+                    conn, _ = srv.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                peer = StreamPeer(conn)
+                try:
+                    while not self.quit:
+                        try:
+                            command = peer.recv(0.25).decode("utf-8")
+                        except socket.timeout:
+                            continue
+                        except UnicodeDecodeError:
+                            continue
+                        self.cmd_queue.put((command, peer))
+                        gdb.post_event(self._process_queue)
+                except (EOFError, OSError) as exc:
+                    logger.info("Disconnected: %s", exc)
+                finally:
+                    conn.close()
+        finally:
+            srv.close()
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
     # -------------------------------------------------------------------------
     # Main thread dispatcher
     # -------------------------------------------------------------------------
 
     def _process_queue(self):
         while not self.cmd_queue.empty():
-            command, sock, addr = self.cmd_queue.get()
+            command, peer = self.cmd_queue.get()
             try:
-                self._dispatch_command(command, sock, addr)
+                self._dispatch_command(command, peer)
             except Exception as exc:
                 logger.error("Command failed: %s", exc)
 
@@ -133,7 +390,7 @@ class NvimGdbInit(gdb.Command):
     # Main-thread command handling (ALL gdb.* calls live here)
     # -------------------------------------------------------------------------
 
-    def _dispatch_command(self, command, sock, addr):
+    def _dispatch_command(self, command, peer):
         logger.debug("Got command: %s", command)
 
         parts = re.split(r"\s+", command)
@@ -141,8 +398,48 @@ class NvimGdbInit(gdb.Command):
         request = parts[1]
         args = parts[2:]
 
+        if request == "batch":
+            # The sub-requests "<request> <args>" come as a JSON array,
+            # their results are sent back in one response.
+            requests = json.loads(command.split(None, 2)[2])
+            result = [self._get_response(*self._split_request(sub), peer)
+                      for sub in requests]
+        elif request == "breakpoints-restore":
+            # The JSON is taken as is to keep the runs of spaces
+            # in the locations.
+            result = self._restore_breaks(
+                json.loads(command.split(None, 2)[2]))
+        else:
+            result = self._get_response(request, args, peer)
+
+        peer.send({"request": req_id, "response": result})
+
+    @staticmethod
+    def _split_request(request):
+        parts = re.split(r"\s+", request)
+        return parts[0], parts[1:]
+
+    def _get_response(self, request, args, peer):
+        if not self._is_cacheable(request, args):
+            return self._handle_request(request, args, peer)
+        key = (request, tuple(args))
+        result = self.response_cache.get(key)
+        if result is None:
+            result = self._handle_request(request, args, peer)
+            self.response_cache[key] = result
+        return result
+
+    def _is_cacheable(self, request, args):
+        if not self.has_response_cache:
+            return False
+        if request == "handle-command":
+            return " ".join(args) in CACHEABLE_COMMANDS
+        return request in CACHEABLE_REQUESTS
+
+    def _handle_request(self, request, args, peer):
         if request == "info-breakpoints":
-            result = self._get_breaks(os.path.normpath(args[0]))
+            result = self._get_breaks_since(
+                os.path.normpath(args[0]), args[1] if len(args) > 1 else None)
 
         elif request == "get-process-state":
             result = self.state
@@ -153,13 +450,46 @@ class NvimGdbInit(gdb.Command):
         elif request == "has-exited-or-ran":
             result = self._get_reset_exited_or_ran()
 
+        elif request == "get-stop-snapshot":
+            result = self._get_stop_snapshot(*args)
+
+        elif request == "get-backtrace":
+            result = self._get_backtrace(int(args[0]), int(args[1]))
+
+        elif request == "inspect":
+            result = self._inspect(" ".join(args))
+
+        elif request == "inspect-children":
+            result = self._inspect_children(
+                int(args[0]), int(args[1]), int(args[2]))
+
         elif request == "handle-command":
             result = self._handle_gdb_command(args)
 
+        elif request == "register-watch":
+            # The plugin picks the identifier, so the request may be repeated
+            wid = int(args[0])
+            if wid not in self.watches:
+                self.watches[wid] = [args[1:], None, 0]
+            result = True
+
+        elif request == "unregister-watch":
+            result = self.watches.pop(int(args[0]), None) is not None
+
+        elif request == "get-watches":
+            result = self._get_watches_since(int(args[0]) if args else 0)
+
+        elif request == "breakpoints-list":
+            result = self._list_breaks_since(args[0] if args else None)
+
+        elif request == "register-listener":
+            self.listener = peer
+            result = True
+
         else:
             result = ""
 
-        self._send_response(result, req_id, sock, addr)
+        return result
 
     # -------------------------------------------------------------------------
     # Helpers (main thread)
@@ -178,12 +508,35 @@ class NvimGdbInit(gdb.Command):
         except RuntimeError as err:
             return str(err)
 
-    def _send_response(self, response, req_id, sock, addr):
-        msg = json.dumps({
-            "request": req_id,
-            "response": response,
-        }).encode("utf-8")
-        sock.sendto(msg, addr)
+    def _notify_stop(self, event):
+        """Push the new location to the plugin without waiting for a query."""
+        location = self._get_current_frame_location()
+        try:
+            self.listener.send({
+                "event": "stop",
+                "reason": self._get_stop_reason(event),
+                "location": location,
+                "frame_gen": self._update_frame_gen(location),
+            })
+        except OSError as exc:
+            logger.error("Failed to notify the listener: %s", exc)
+
+    @staticmethod
+    def _get_stop_reason(event):
+        if isinstance(event, getattr(gdb, "BreakpointEvent", ())):
+            return "breakpoint"
+        if isinstance(event, getattr(gdb, "SignalEvent", ())):
+            return "signal"
+        return "stop"
+
+    def _update_frame_gen(self, location):
+        """Bump the frame generation if the location has changed."""
+        # Another stop at the same line is still worth jumping to
+        frame_key = (self.stop_count, tuple(location))
+        if frame_key != self.frame_key:
+            self.frame_key = frame_key
+            self.frame_gen += 1
+        return self.frame_gen
 
     def _get_reset_exited_or_ran(self):
         if self.exited_or_ran:
@@ -191,6 +544,121 @@ class NvimGdbInit(gdb.Command):
             return True
         return False
 
+    def _get_stop_snapshot(self, frame_gen="", fname="", breaks_gen=None):
+        """Collect what the plugin needs on a prompt in a single reply.
+
+        The location is only included if it changed since the generation
+        frame_gen known to the client.
+        """
+        snapshot = {"state": self.state}
+        if self.state == "stopped":
+            location = self._get_current_frame_location()
+            self._update_frame_gen(location)
+            if frame_gen != str(self.frame_gen):
+                snapshot["location"] = location
+        snapshot["frame_gen"] = self.frame_gen
+        if fname:
+            snapshot["breakpoints"] = self._get_breaks_since(
+                os.path.normpath(fname), breaks_gen)
+        return snapshot
+
+    def _get_breaks_since(self, fname, breaks_gen):
+        """Get breakpoints for the file unless the client has them already."""
+        if not self.has_breakpoint_events:
+            # Changes can't be tracked
+            return self._get_breaks(fname)
+        if breaks_gen == str(self.breaks_gen):
+            return {"_gen": self.breaks_gen, "_unchanged": True}
+        result = self._get_breaks(fname)
+        result["_gen"] = self.breaks_gen
+        return result
+
+    def _get_backtrace(self, offset, limit):
+        """Describe up to limit frames starting from the level offset.
+
+        Only the requested frames are unwound, so the first page
+        of a deep stack is available quickly.
+        """
+        frames = []
+        frame = None
+        level = 0
+        stack = self._get_stack_key()
+        try:
+            cursor = self.backtrace_cursor
+            if cursor and cursor[0] == stack \
+                    and cursor[1] <= offset and cursor[2].is_valid():
+                _, level, frame = cursor
+            else:
+                frame = gdb.newest_frame()
+            while frame is not None and level < offset:
+                frame = frame.older()
+                level += 1
+            while frame is not None and len(frames) < limit:
+                frames.append(self._describe_frame(frame, level))
+                frame = frame.older()
+                level += 1
+        except gdb.error as exc:
+            return {"frames": frames, "more": False, "stop": stack,
+                    "_error": str(exc)}
+        if frame is not None:
+            self.backtrace_cursor = (stack, level, frame)
+        return {"frames": frames, "more": frame is not None, "stop": stack}
+
+    def _get_stack_key(self):
+        """Identify the stack being paged: the stop and the selected thread."""
+        thread = gdb.selected_thread()
+        if thread is None:
+            return f"{self.stop_count}"
+        thread_num = getattr(thread, "global_num", thread.num)
+        return f"{self.stop_count}.{thread.inferior.num}.{thread_num}"
+
+    @staticmethod
+    def _describe_frame(frame, level):
+        desc = {
+            "level": level,
+            # Addresses may not fit into the precision of Lua numbers
+            "pc": "0x{:x}".format(frame.pc()),
+        }
+        name = frame.name()
+        if name:
+            desc["function"] = name
+        sal = frame.find_sal()
+        if sal.symtab:
+            desc["file"] = sal.symtab.fullname()
+            desc["line"] = sal.line
+        return desc
+
+    def _get_watches_since(self, watches_gen):
+        """Get the output of the watches changed after watches_gen.
+
+        All the watches are evaluated in one pass if the program could have
+        changed since the last evaluation: it has stopped, another frame
+        has been selected, the memory, registers or breakpoints have been
+        modified.
+        """
+        key = (self.stop_count, self.mutation_count, self.breaks_gen,
+               self._get_selected_frame())
+        is_stale = key != self.watches_key
+        self.watches_key = key
+        for watch in self.watches.values():
+            if not is_stale and watch[2]:
+                continue
+            output = self._handle_gdb_command(watch[0])
+            if output != watch[1] or not watch[2]:
+                self.watches_gen += 1
+                watch[1] = output
+                watch[2] = self.watches_gen
+        changed = {str(wid): watch[1] for wid, watch in self.watches.items()
+                   if watch[2] > watches_gen}
+        return {"gen": self.watches_gen, "watches": changed}
+
+    @staticmethod
+    def _get_selected_frame():
+        try:
+            return gdb.selected_frame()
+        except gdb.error:
+            return None
+
     def _get_current_frame_location(self):
         try:
             frame = gdb.selected_frame()
@@ -203,6 +671,128 @@ class NvimGdbInit(gdb.Command):
             pass
         return []
 
+    # -------------------------------------------------------------------------
+    # Inspector
+    # -------------------------------------------------------------------------
+
+    def _inspect(self, expr):
+        """Evaluate the expression into a bounded summary.
+
+        The children can be requested page by page with the handle
+        of the value.
+        """
+        try:
+            value = gdb.parse_and_eval(expr)
+        except gdb.error as exc:
+            return {"_error": str(exc)}
+        return self._describe_value(expr, value)
+
+    def _inspect_children(self, handle, offset, limit):
+        entry = self.inspected.get(handle)
+        if entry is None:
+            return {"_error": "The value is no longer available"}
+        value, name, children, position = entry
+        try:
+            indexable = self._is_indexable(value)
+            if children is not None and (offset == position or
+                                         offset > position and not indexable):
+                # Continue where the last page ended
+                for _ in itertools.islice(children, offset - position):
+                    pass
+            else:
+                children = self._iter_children(value, name, offset)
+            page = list(itertools.islice(children, limit + 1))
+            more = len(page) > limit
+            if more:
+                # Keep the extra child for the next page
+                children = itertools.chain(page[limit:], children)
+                page = page[:limit]
+            entry[2] = children
+            entry[3] = offset + len(page)
+            nodes = [self._describe_value(n, v) for n, v in page]
+        except Exception as exc:  # pylint: disable=broad-except
+            # The pretty-printers may raise anything
+            entry[2] = None
+            return {"_error": str(exc)}
+        return {"children": nodes, "more": more}
+
+    def _describe_value(self, name, value):
+        node = {"name": name}
+        try:
+            node["type"] = str(value.type)
+            node["value"] = self._summarize_value(value)
+            has_children = self._may_have_children(value)
+        except Exception as exc:  # pylint: disable=broad-except
+            # The pretty-printers may raise anything
+            node["value"] = "<{}>".format(exc)
+            return node
+        if has_children:
+            self.last_inspect_handle += 1
+            self.inspected[self.last_inspect_handle] = [value, name, None, 0]
+            node["handle"] = self.last_inspect_handle
+        return node
+
+    @staticmethod
+    def _summarize_value(value):
+        try:
+            text = value.format_string(max_elements=INSPECT_MAX_ELEMENTS,
+                                       max_depth=INSPECT_MAX_DEPTH)
+        except (AttributeError, TypeError):
+            # Older GDB: only the print settings limit the output
+            text = str(value)
+        if len(text) > INSPECT_MAX_SUMMARY:
+            text = text[:INSPECT_MAX_SUMMARY] + "..."
+        return text
+
+    @staticmethod
+    def _may_have_children(value):
+        printer = gdb.default_visualizer(value)
+        if printer is not None:
+            return hasattr(printer, "children")
+        type_ = value.type.strip_typedefs()
+        if type_.code == gdb.TYPE_CODE_PTR:
+            target = type_.target().strip_typedefs()
+            return target.code not in (gdb.TYPE_CODE_VOID, gdb.TYPE_CODE_FUNC) \
+                and int(value) != 0
+        return type_.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION,
+                              gdb.TYPE_CODE_ARRAY)
+
+    @classmethod
+    def _iter_children(cls, value, name, offset):
+        """Enumerate (name, value) of the children lazily from offset."""
+        if cls._is_indexable(value):
+            # Elements can be accessed directly
+            low, high = value.type.strip_typedefs().range()
+            return (("[{}]".format(i), value[i])
+                    for i in range(low + offset, high + 1))
+        # Skip to the requested page without formatting the values
+        return itertools.islice(cls._gen_children(value, name), offset, None)
+
+    @staticmethod
+    def _is_indexable(value):
+        return gdb.default_visualizer(value) is None \
+            and value.type.strip_typedefs().code == gdb.TYPE_CODE_ARRAY
+
+    @staticmethod
+    def _gen_children(value, name):
+        printer = gdb.default_visualizer(value)
+        if printer is not None:
+            for child_name, child in printer.children():
+                if not isinstance(child, gdb.Value):
+                    child = gdb.Value(child)
+                yield child_name, child
+            return
+        type_ = value.type.strip_typedefs()
+        if type_.code == gdb.TYPE_CODE_PTR:
+            yield "*" + name, value.dereference()
+        else:
+            for field in type_.fields():
+                if field.is_base_class:
+                    yield "<{}>".format(field.name), value.cast(field.type)
+                elif hasattr(field, "bitpos"):
+                    # Static members have no position
+                    yield field.name or "<anonymous>", value[field]
+
     # -------------------------------------------------------------------------
     # Breakpoints
     # -------------------------------------------------------------------------
@@ -213,25 +803,70 @@ class NvimGdbInit(gdb.Command):
         return self._enum_breaks_fallback()
 
     def _get_breaks(self, fname):
-        result = {}
         try:
-            for path, line, bid in self._get_breaks_provider():
-                if fname.endswith(os.path.normpath(path)):
-                    result.setdefault(line, []).append(bid)
+            self._ensure_breaks_index()
         except AttributeError:
             self.fallback_to_parsing = True
-            return self._get_breaks(fname)
+            self._ensure_breaks_index()
+
+        paths = [p for p in self.relative_break_paths if fname.endswith(p)]
+        if fname in self.breaks_index:
+            paths.append(fname)
+
+        result = {}
+        for path in paths:
+            for line, ids in self.breaks_index[path].items():
+                result.setdefault(line, []).extend(ids)
+        if len(paths) > 1:
+            for ids in result.values():
+                ids.sort(key=int)
         return result
 
+    def _ensure_breaks_index(self):
+        if self.breaks_index_valid:
+            return
+        self.breaks_index = {}
+        self.breaks_locations = {}
+        self.relative_break_paths = set()
+        for path, line, bid in self._get_breaks_provider():
+            self._add_to_breaks_index(path, line, bid)
+        # Without the events, the breakpoints have to be enumerated
+        # on every query.
+        self.breaks_index_valid = self.has_breakpoint_events
+
+    def _add_to_breaks_index(self, path, line, bid):
+        path = os.path.normpath(path)
+        ids = self.breaks_index.setdefault(path, {}).setdefault(line, [])
+        ids.append(bid)
+        ids.sort(key=int)
+        self.breaks_locations.setdefault(bid, []).append((path, line))
+        if not os.path.isabs(path):
+            self.relative_break_paths.add(path)
+
+    def _remove_from_breaks_index(self, bid):
+        for path, line in self.breaks_locations.pop(bid, []):
+            lines = self.breaks_index[path]
+            ids = lines[line]
+            ids.remove(bid)
+            if not ids:
+                del lines[line]
+            if not lines:
+                del self.breaks_index[path]
+                self.relative_break_paths.discard(path)
+
     def _enum_breaks(self):
         for bp in gdb.breakpoints() or []:
-            if not bp.is_valid() or not bp.enabled:
+            for path, line in self._enum_break_locations(bp):
+                yield path, line, bp.number
+
+    def _enum_break_locations(self, bp):
+        if not bp.is_valid() or not bp.enabled:
+            return
+        for loc in bp.locations:
+            if not loc.enabled or not loc.source:
                 continue
-            for loc in bp.locations:
-                if not loc.enabled or not loc.source:
-                    continue
-                filename, line = loc.source
-                yield (loc.fullname or filename), line, bp.number
+            filename, line = loc.source
+            yield (loc.fullname or filename), line
 
     def _enum_breaks_fallback(self):
         text = gdb.execute("info breakpoints", False, True)
@@ -248,6 +883,57 @@ class NvimGdbInit(gdb.Command):
             out.append(f"{path}:{line} breakpoint {bid}")
         return "\n".join(out)
 
+    @staticmethod
+    def _is_restorable(bp):
+        return (bp.is_valid() and bp.type == gdb.BP_BREAKPOINT
+                and not bp.temporary and bp.location)
+
+    def _list_breaks_since(self, stored_gen):
+        """Get the breakpoints to keep between the sessions unless
+        the client has stored them already.
+
+        The breakpoints are described with the locations as specified
+        by the user, so they can be set again even before the shared
+        libraries are loaded.
+        """
+        gen = f"{self.breaks_gen}.{self.breaks_created}"
+        if self.has_breakpoint_events and stored_gen == gen:
+            return {"_gen": gen, "_unchanged": True}
+        enabled = []
+        disabled = []
+        for bp in gdb.breakpoints() or []:
+            if self._is_restorable(bp):
+                (enabled if bp.enabled else disabled).append(bp.location)
+        progspace = gdb.current_progspace()
+        return {
+            "_gen": gen,
+            "executable": progspace.filename if progspace else None,
+            "breakpoints": enabled,
+            "disabled": disabled,
+        }
+
+    def _restore_breaks(self, stored):
+        """Set the stored breakpoints that aren't there yet."""
+        existing = {bp.location for bp in gdb.breakpoints() or []
+                    if self._is_restorable(bp)}
+        restored = 0
+        failed = []
+        for key, enabled in (("breakpoints", True), ("disabled", False)):
+            for location in stored.get(key) or []:
+                if location in existing:
+                    continue
+                try:
+                    bp = gdb.Breakpoint(location)
+                    if not enabled:
+                        bp.enabled = False
+                except RuntimeError as exc:
+                    logger.error("Can't restore %s: %s", location, exc)
+                    failed.append(location)
+                    continue
+                existing.add(location)
+                restored += 1
+        return {"restored": restored, "failed": failed}
+
 
 # -----------------------------------------------------------------------------
 # Register command
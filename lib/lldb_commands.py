@@ -1,15 +1,23 @@
 """The program injected into LLDB to provide a side channel
 to the plugin."""
 
+import itertools
 import json
 import lldb  # type: ignore
 import logging
 import os
 import re
+import select
 import socket
+import struct
 import sys
 import threading
 
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
 
 logger = logging.getLogger("lldb")
 logger.setLevel(logging.DEBUG)
@@ -19,16 +27,192 @@ fmt = "%(asctime)s [%(levelname)s]: %(message)s"
 lhandl.setFormatter(logging.Formatter(fmt))
 logger.addHandler(lhandl)
 
-
-def get_current_frame_location(debugger: lldb.SBDebugger):
-    target = debugger.GetSelectedTarget()
-    process = target.GetProcess()
-    thread = process.GetSelectedThread()
-    frame = thread.GetSelectedFrame()
-
+# Responses longer than this are split into several datagrams
+MAX_DATAGRAM = 60000
+SOCK_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Limits of the value summaries for the inspector
+INSPECT_MAX_SUMMARY = 1000
+
+# The side channel address prefix requesting a Unix-domain stream socket
+UNIX_PREFIX = "unix:"
+
+# Generations of the data sent to the plugin allow replying briefly
+# when nothing has changed since the last query.
+_generations = itertools.count(1)
+_frame_sent = (None, None)      # (gen, frame key)
+_breaks_sent = {}               # {fname -> (gen, breaks)}
+_stored_sent = (None, None)     # (gen, breakpoints to keep between sessions)
+
+# Locations of the restored breakpoints {bid -> "path:line"} to keep them
+# even if they haven't been resolved yet
+_restored_locations = {}
+
+# Values being inspected {handle -> SBValue} during the stop _inspected_stop
+_inspected = {}
+_inspected_stop = None
+_inspect_handles = itertools.count(1)
+
+
+class StateTracker:
+    """The debugger state collected from the broadcast events.
+
+    The process state is taken from the state-changed events, the location
+    of the selected frame is resolved once per stop and frame selection.
+    The breakpoint locations are indexed by file and line, only the changed
+    breakpoints are resolved again.  The events are queued by LLDB
+    in the listener and applied before answering a request: the state
+    is never older than the request.
+    """
+
+    # Breakpoint changes affecting the index
+    BREAK_EVENTS = lldb.eBreakpointEventTypeAdded \
+        | lldb.eBreakpointEventTypeLocationsAdded \
+        | lldb.eBreakpointEventTypeLocationsRemoved \
+        | lldb.eBreakpointEventTypeLocationsResolved \
+        | lldb.eBreakpointEventTypeEnabled \
+        | lldb.eBreakpointEventTypeDisabled
+
+    def __init__(self, debugger: lldb.SBDebugger):
+        self.debugger = debugger
+        self.listener = lldb.SBListener("nvim-gdb")
+        # Processes created later are subscribed to as well
+        self.listener.StartListeningForEventClass(
+            debugger, lldb.SBProcess.GetBroadcasterClassName(),
+            lldb.SBProcess.eBroadcastBitStateChanged)
+        self.listener.StartListeningForEventClass(
+            debugger, lldb.SBTarget.GetBroadcasterClassName(),
+            lldb.SBTarget.eBroadcastBitBreakpointChanged)
+        self.states = {}                    # {process unique id -> state}
+        self.location = (None, [])          # (frame key, location)
+        self.breaks_target = None           # target of the index
+        self.breaks = {}                    # {path -> {line -> [bid]}}
+        self.break_locations = {}           # {bid -> [(path, line)]}
+        self.lock = threading.Lock()
+
+    def update(self):
+        """Apply the events received since the last request."""
+        event = lldb.SBEvent()
+        while self.listener.GetNextEvent(event):
+            if lldb.SBProcess.EventIsProcessEvent(event):
+                self._on_process_event(event)
+            elif lldb.SBBreakpoint.EventIsBreakpointEvent(event):
+                self._on_breakpoint_event(event)
+
+    def _on_process_event(self, event):
+        process = lldb.SBProcess.GetProcessFromEvent(event)
+        state = lldb.SBProcess.GetStateFromEvent(event)
+        if state == lldb.eStateStopped \
+                and lldb.SBProcess.GetRestartedFromEvent(event):
+            # The process has been resumed automatically
+            state = lldb.eStateRunning
+        self.states[process.GetUniqueID()] = state
+
+    def _on_breakpoint_event(self, event):
+        bpt = lldb.SBBreakpoint.GetBreakpointFromEvent(event)
+        if self.breaks_target is None or bpt.GetTarget() != self.breaks_target:
+            # The index will be built from scratch when needed
+            return
+        event_type = lldb.SBBreakpoint.GetBreakpointEventTypeFromEvent(event)
+        if event_type & lldb.eBreakpointEventTypeRemoved:
+            self._unindex_break(str(bpt.GetID()))
+        elif event_type & self.BREAK_EVENTS:
+            self._index_break(bpt)
+
+    def _index_break(self, bpt: lldb.SBBreakpoint):
+        bid = str(bpt.GetID())
+        self._unindex_break(bid)
+        if not bpt.IsEnabled():
+            return
+        # Several addresses may belong to the same line
+        locations = list(dict.fromkeys(_enum_locations(bpt)))
+        for path, line in locations:
+            bids = self.breaks.setdefault(path, {}).setdefault(line, [])
+            if bid not in bids:
+                bids.append(bid)
+                bids.sort(key=int)
+        self.break_locations[bid] = locations
+
+    def _unindex_break(self, bid):
+        for path, line in self.break_locations.pop(bid, ()):
+            lines = self.breaks[path]
+            bids = lines[line]
+            if bid in bids:
+                bids.remove(bid)
+            if not bids:
+                del lines[line]
+            if not lines:
+                del self.breaks[path]
+
+    def _update_breaks(self):
+        """Bring the breakpoint index up to date."""
+        self.update()
+        target = self.debugger.GetSelectedTarget()
+        if self.breaks_target is not None and target == self.breaks_target:
+            return
+        # Another target has been selected: index all its breakpoints
+        self.breaks_target = target
+        self.breaks = {}
+        self.break_locations = {}
+        for bidx in range(target.GetNumBreakpoints()):
+            self._index_break(target.GetBreakpointAtIndex(bidx))
+
+    def get_breaks(self, fname):
+        """Get the enabled breakpoints {line -> [bid]} in the file."""
+        with self.lock:
+            self._update_breaks()
+            lines = self.breaks.get(fname, {})
+            return {line: list(bids) for line, bids in lines.items()}
+
+    def get_all_breaks(self):
+        """Get the enabled breakpoints [(path, line, bid)]."""
+        with self.lock:
+            self._update_breaks()
+            return [(path, line, bid)
+                    for path, lines in self.breaks.items()
+                    for line, bids in lines.items()
+                    for bid in bids]
+
+    def get_process_state(self):
+        with self.lock:
+            self.update()
+            process = self.debugger.GetSelectedTarget().GetProcess()
+            state = self.states.get(process.GetUniqueID())
+            if state is None:
+                # No events from this process yet
+                state = process.GetState()
+            return state
+
+    def get_frame_location(self):
+        """Get the frame key and the location of the selected frame."""
+        with self.lock:
+            process = self.debugger.GetSelectedTarget().GetProcess()
+            thread = process.GetSelectedThread()
+            frame = thread.GetSelectedFrame()
+            frame_key = (process.GetUniqueID(), process.GetStopID(),
+                         thread.GetThreadID(), frame.GetFrameID())
+            key, location = self.location
+            if key != frame_key:
+                location = _get_frame_location(frame)
+                self.location = (frame_key, location)
+            return frame_key, location
+
+
+_tracker = None
+
+
+def _get_tracker(debugger: lldb.SBDebugger):
+    global _tracker
+    if _tracker is None:
+        _tracker = StateTracker(debugger)
+    return _tracker
+
+
+def _get_frame_location(frame: lldb.SBFrame):
     if frame.IsValid():
-        symbol_context = frame.GetSymbolContext(lldb.eSymbolContextEverything)
-        line_entry = symbol_context.line_entry
+        # The line entry is enough, resolving the complete symbol context
+        # is expensive for large binaries.
+        line_entry = frame.GetLineEntry()
         if line_entry.IsValid():
             filespec = line_entry.GetFileSpec()
             filepath = os.path.join(filespec.GetDirectory(),
@@ -39,10 +223,29 @@ def get_current_frame_location(debugger: lldb.SBDebugger):
     return []
 
 
+def get_current_frame_location(debugger: lldb.SBDebugger):
+    _, location = _get_tracker(debugger).get_frame_location()
+    return location
+
+
+def get_current_frame_location_since(frame_gen,
+                                     debugger: lldb.SBDebugger):
+    """Get the location unless the client has seen it already."""
+    global _frame_sent
+    frame_key, location = _get_tracker(debugger).get_frame_location()
+    # Another stop at the same line is still worth jumping to
+    frame_key = frame_key + (tuple(location),)
+    gen, sent_key = _frame_sent
+    if frame_key != sent_key:
+        gen = next(_generations)
+        _frame_sent = (gen, frame_key)
+    if frame_gen == str(gen):
+        return {"gen": gen}
+    return {"gen": gen, "location": location}
+
+
 def get_process_state(debugger: lldb.SBDebugger):
-    target = debugger.GetSelectedTarget()
-    process = target.GetProcess()
-    state = process.GetState()
+    state = _get_tracker(debugger).get_process_state()
     if state == lldb.eStateRunning:
         return "running"
     elif state == lldb.eStateStopped:
@@ -50,68 +253,240 @@ def get_process_state(debugger: lldb.SBDebugger):
     return "other"
 
 
+def _enum_locations(bpt: lldb.SBBreakpoint):
+    """Get the source locations (path, line) of the breakpoint."""
+    for lidx in range(bpt.GetNumLocations()):
+        loc = bpt.GetLocationAtIndex(lidx)
+        lineentry = loc.GetAddress().GetLineEntry()
+        filespec = lineentry.GetFileSpec()
+        filename = filespec.GetFilename()
+        if not filename:
+            continue
+        path = os.path.normpath(os.path.join(filespec.GetDirectory(),
+                                             filename))
+        yield path, lineentry.GetLine()
+
+
 # Get list of enabled breakpoints for a given source file
-def _enum_breaks(debugger: lldb.SBDebugger):
-    # Ensure target is the actually selected one
-    target = debugger.GetSelectedTarget()
+def _get_breaks(fname, debugger: lldb.SBDebugger):
+    return _get_tracker(debugger).get_breaks(fname)
+
+
+def _get_breaks_since(fname, breaks_gen, debugger: lldb.SBDebugger):
+    """Get breakpoints for the file unless the client has them already."""
+    breaks = _get_breaks(fname, debugger)
+    gen, sent = _breaks_sent.get(fname, (None, None))
+    if breaks != sent:
+        gen = next(_generations)
+        _breaks_sent[fname] = (gen, breaks)
+    if breaks_gen == str(gen):
+        return {"_gen": gen, "_unchanged": True}
+    return dict(breaks, _gen=gen)
+
 
-    # Consider every breakpoint while skipping over the disabled ones
+def _get_stored_breaks(target: lldb.SBTarget):
+    """Get the locations "path:line" of the enabled and disabled breakpoints."""
+    enabled = []
+    disabled = []
     for bidx in range(target.GetNumBreakpoints()):
         bpt = target.GetBreakpointAtIndex(bidx)
-        if not bpt.IsEnabled():
+        if bpt.IsOneShot():
             continue
-        bid = str(bpt.GetID())
-
-        # Consider every location of a breakpoint
-        for lidx in range(bpt.GetNumLocations()):
-            loc = bpt.GetLocationAtIndex(lidx)
-            lineentry = loc.GetAddress().GetLineEntry()
-            filespec = lineentry.GetFileSpec()
-            filename = filespec.GetFilename()
-            if not filename:
-                continue
-            path = os.path.join(filespec.GetDirectory(), filename)
+        location = next(("%s:%d" % loc for loc in _enum_locations(bpt)),
+                        _restored_locations.get(bpt.GetID()))
+        if location is not None:
+            (enabled if bpt.IsEnabled() else disabled).append(location)
+    return enabled, disabled
 
-            yield path, lineentry.GetLine(), bid
 
+def _list_breaks_since(stored_gen, debugger: lldb.SBDebugger):
+    """Get the breakpoints to keep between the sessions unless the client
+    has stored them already."""
+    global _stored_sent
+    target = debugger.GetSelectedTarget()
+    enabled, disabled = _get_stored_breaks(target)
+    executable = target.GetExecutable()
+    stored = {
+        "executable": executable.fullpath if executable.IsValid() else None,
+        "breakpoints": enabled,
+        "disabled": disabled,
+    }
+    gen, sent = _stored_sent
+    if stored != sent:
+        gen = next(_generations)
+        _stored_sent = (gen, stored)
+    if stored_gen == str(gen):
+        return {"_gen": gen, "_unchanged": True}
+    return dict(stored, _gen=gen)
 
-# Get list of enabled breakpoints for a given source file
-def _get_breaks(fname, debugger: lldb.SBDebugger):
-    breaks = {}
-
-    for path, line, bid in _enum_breaks(debugger):
-        # See whether the breakpoint is in the file in question
-        if fname == os.path.normpath(path):
-            try:
-                breaks[line].append(bid)
-            except KeyError:
-                breaks[line] = [bid]
 
-    # Return the filtered breakpoints
-    return breaks
+def _restore_breaks(stored, debugger: lldb.SBDebugger):
+    """Set the stored breakpoints that aren't there yet."""
+    target = debugger.GetSelectedTarget()
+    enabled, disabled = _get_stored_breaks(target)
+    existing = set(enabled + disabled)
+    restored = 0
+    failed = []
+    for key, is_enabled in (("breakpoints", True), ("disabled", False)):
+        for location in stored.get(key) or []:
+            if location in existing:
+                continue
+            path, _, line = location.rpartition(":")
+            bpt = target.BreakpointCreateByLocation(path, int(line)) \
+                if path and line.isdigit() else None
+            if bpt is None or not bpt.IsValid():
+                failed.append(location)
+                continue
+            if not is_enabled:
+                bpt.SetEnabled(False)
+            _restored_locations[bpt.GetID()] = location
+            existing.add(location)
+            restored += 1
+    return {"restored": restored, "failed": failed}
 
 
 # Get list of all enabled breakpoints suitable for location list
 def _get_all_breaks(debugger: lldb.SBDebugger):
     breaks = []
 
-    for path, line, bid in _enum_breaks(debugger):
+    for path, line, bid in _get_tracker(debugger).get_all_breaks():
         breaks.append(f"{path}:{line} breakpoint {bid}")
 
     return "\n".join(breaks)
 
 
-def send_response(response, req_id, sock, addr):
-    response_msg = {
+def _get_inspected(debugger: lldb.SBDebugger):
+    """Get the values being inspected, forget them when the program moves."""
+    global _inspected, _inspected_stop
+    stop_id = debugger.GetSelectedTarget().GetProcess().GetStopID()
+    if stop_id != _inspected_stop:
+        _inspected = {}
+        _inspected_stop = stop_id
+    return _inspected
+
+
+def _inspect(expr, debugger: lldb.SBDebugger):
+    """Evaluate the expression into a bounded summary.
+
+    The children can be requested page by page with the handle
+    of the value.
+    """
+    frame = debugger.GetSelectedTarget().GetProcess() \
+        .GetSelectedThread().GetSelectedFrame()
+    # Variable paths don't need to run the expression evaluator
+    value = frame.GetValueForVariablePath(expr)
+    if not value.IsValid() or value.GetError().Fail():
+        value = frame.EvaluateExpression(expr)
+    if value.GetError().Fail():
+        return {"_error": value.GetError().GetCString()}
+    return _describe_value(expr, value, _get_inspected(debugger))
+
+
+def _inspect_children(handle, offset, limit, debugger: lldb.SBDebugger):
+    inspected = _get_inspected(debugger)
+    value = inspected.get(handle)
+    if value is None:
+        return {"_error": "The value is no longer available"}
+    # Don't count more children than necessary
+    count = value.GetNumChildren(offset + limit + 1)
+    children = []
+    for idx in range(offset, min(count, offset + limit)):
+        child = value.GetChildAtIndex(idx)
+        children.append(_describe_value(child.GetName() or f"[{idx}]", child,
+                                        inspected))
+    return {"children": children, "more": count > offset + limit}
+
+
+def _describe_value(name, value, inspected):
+    text = " ".join(filter(None, (value.GetValue(), value.GetSummary())))
+    if len(text) > INSPECT_MAX_SUMMARY:
+        text = text[:INSPECT_MAX_SUMMARY] + "..."
+    node = {"name": name, "type": value.GetTypeName() or "", "value": text}
+    if value.MightHaveChildren():
+        handle = next(_inspect_handles)
+        inspected[handle] = value
+        node["handle"] = handle
+    return node
+
+
+class DatagramPeer:
+    """The plugin reached over UDP, every message is a JSON datagram."""
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+
+    def send(self, message):
+        msg = json.dumps(message).encode("utf-8")
+        logger.debug("Sending response: %s", msg)
+        if len(msg) <= MAX_DATAGRAM:
+            self.sock.sendto(msg, 0, self.addr)
+            return
+        # Too big for a single datagram: send the message in chunks
+        # "#<req_id> <index> <count>\n<part of the message>" to be
+        # reassembled by the plugin.
+        chunks = [msg[i:i + MAX_DATAGRAM]
+                  for i in range(0, len(msg), MAX_DATAGRAM)]
+        for idx, chunk in enumerate(chunks):
+            header = f"#{message.get('request')} {idx} {len(chunks)}\n"
+            self.sock.sendto(header.encode("utf-8") + chunk, 0, self.addr)
+
+
+class StreamPeer:
+    """The plugin connected to the Unix-domain socket.
+
+    Every frame is prefixed with its length (4 bytes, big endian).
+    The requests are plain text, the messages to the plugin start with
+    a byte denoting the encoding: J for JSON, M for msgpack.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = b""
+        self.lock = threading.Lock()
+
+    def send(self, message):
+        if msgpack is not None:
+            payload = b"M" + msgpack.packb(_stringify_keys(message))
+        else:
+            payload = b"J" + json.dumps(message).encode("utf-8")
+        with self.lock:
+            self.conn.sendall(struct.pack(">I", len(payload)) + payload)
+
+    def recv(self, timeout=None):
+        """Receive the next frame, raise EOFError when disconnected."""
+        while True:
+            if len(self.buffer) >= 4:
+                size, = struct.unpack(">I", self.buffer[:4])
+                if len(self.buffer) >= 4 + size:
+                    frame = self.buffer[4:4 + size]
+                    self.buffer = self.buffer[4 + size:]
+                    return frame
+            if not select.select([self.conn], [], [], timeout)[0]:
+                raise socket.timeout()
+            data = self.conn.recv(65536)
+            if not data:
+                raise EOFError()
+            self.buffer += data
+
+
+def _stringify_keys(value):
+    """Make the keys strings as they would be in JSON."""
+    if isinstance(value, dict):
+        return {str(k): _stringify_keys(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stringify_keys(v) for v in value]
+    return value
+
+
+def send_response(response, req_id, peer):
+    peer.send({
         "request": req_id,
         "response": response
-    }
-    response_json = json.dumps(response_msg).encode("utf-8")
-    logger.debug("Sending response: %s", response_json)
-    sock.sendto(response_json, 0, addr)
+    })
 
 
-def _execute_command(command, req_id, sock, addr, debugger: lldb.SBDebugger):
+def _execute_command(command, debugger: lldb.SBDebugger):
     return_object = lldb.SBCommandReturnObject()
     debugger.GetCommandInterpreter().HandleCommand(
         command, return_object
@@ -121,83 +496,137 @@ def _execute_command(command, req_id, sock, addr, debugger: lldb.SBDebugger):
         result += return_object.GetError()
     if return_object.GetOutput():
         result += return_object.GetOutput()
-    send_response("" if result is None else result.strip(),
-                  req_id, sock, addr)
+    return "" if result is None else result.strip()
 
 
-def _backtrace(req_id, sock, addr, debugger: lldb.SBDebugger):
-    """This is for GdbLopenBacktrace, a custom frame format is required."""
-    try:
-        return_object = lldb.SBCommandReturnObject()
-        debugger.GetCommandInterpreter().HandleCommand(
-            "settings show frame-format", return_object
-        )
-        result = ""
-        if return_object.GetOutput():
-            result = return_object.GetOutput()
-        orig_frame_format = result[result.index('"')+1:-1]
-        debugger.GetCommandInterpreter().HandleCommand(
-            r"settings set frame-format frame #${frame.index}: ${frame.pc}"
-            r"{ ${module.file.basename}{\`${function.name-with-args}"
-            r"{${frame.no-debug}${function.pc-offset}}}}"
-            r"{ at \032\032${line.file.fullpath}:${line.number}}"
-            r"{${function.is-optimized} [opt]}\n",
-            return_object
-        )
-        _execute_command("bt", req_id, sock, addr, debugger)
-    finally:
-        debugger.GetCommandInterpreter().HandleCommand(
-            f"settings set frame-format {orig_frame_format}",
-            return_object
-        )
+def _get_backtrace(offset, limit, debugger: lldb.SBDebugger):
+    """Describe up to limit frames starting from the level offset.
 
-
-def _server(server_address: str, debugger: lldb.SBDebugger):
+    LLDB unwinds the stack lazily, only the requested frames are unwound.
+    """
+    process = debugger.GetSelectedTarget().GetProcess()
+    thread = process.GetSelectedThread()
+    frames = []
+    for idx in range(offset, offset + limit):
+        frame = thread.GetFrameAtIndex(idx)
+        if not frame.IsValid():
+            break
+        frames.append(_describe_frame(frame))
+    more = thread.GetFrameAtIndex(offset + limit).IsValid() \
+        if len(frames) == limit else False
+    return {"frames": frames, "more": more, "stop": process.GetStopID()}
+
+
+def _describe_frame(frame: lldb.SBFrame):
+    desc = {
+        "level": frame.GetFrameID(),
+        # Addresses may not fit into the precision of Lua numbers
+        "pc": f"0x{frame.GetPC():x}",
+    }
+    name = frame.GetDisplayFunctionName() or frame.GetFunctionName()
+    if name:
+        desc["function"] = name
+    location = _get_frame_location(frame)
+    if location:
+        desc["file"], desc["line"] = location
+    return desc
+
+
+def _backtrace(debugger: lldb.SBDebugger):
+    """This is for GdbLopenBacktrace, the lines should match errorformat."""
+    thread = debugger.GetSelectedTarget().GetProcess().GetSelectedThread()
+    lines = []
+    for desc in _get_backtrace(0, thread.GetNumFrames(), debugger)["frames"]:
+        line = f"frame #{desc['level']}: {desc['pc']}"
+        if "function" in desc:
+            line += f" {desc['function']}"
+        if "file" in desc:
+            line += f" at {desc['file']}:{desc['line']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _handle_request(command: str, peer, debugger: lldb.SBDebugger):
+    logger.debug("Got command: %s", command)
+    parts = re.split(r"\s+", command)
+    req_id = int(parts[0])
+    request = parts[1]
+    # pylint: disable=broad-except
+    try:
+        if request == "batch":
+            # The sub-requests "<request> <args>" come as a JSON array,
+            # their results are sent back in one response.
+            requests = json.loads(command.split(None, 2)[2])
+            result = [_get_response(re.split(r"\s+", sub), debugger)
+                      for sub in requests]
+        elif request == "breakpoints-restore":
+            # The JSON is taken as is to keep the runs of spaces
+            # in the locations.
+            result = _restore_breaks(json.loads(command.split(None, 2)[2]),
+                                     debugger)
+        else:
+            result = _get_response(parts[1:], debugger)
+    except Exception as ex:
+        logger.error("Exception: %s", ex)
+        return
+    send_response(result, req_id, peer)
+
+
+def _get_response(command, debugger: lldb.SBDebugger):
+    request = command[0]
+    args = command[1:]
+    if request == "info-breakpoints":
+        fname = args[0]
+        if len(args) > 1:
+            return _get_breaks_since(os.path.normpath(fname), args[1],
+                                     debugger)
+        return _get_breaks(os.path.normpath(fname), debugger)
+    if request == "get-process-state":
+        return get_process_state(debugger)
+    if request == "get-current-frame-location":
+        if args and args[0]:
+            return get_current_frame_location_since(args[0], debugger)
+        return get_current_frame_location(debugger)
+    if request == "get-backtrace":
+        return _get_backtrace(int(args[0]), int(args[1]), debugger)
+    if request == "inspect":
+        return _inspect(" ".join(args), debugger)
+    if request == "inspect-children":
+        return _inspect_children(int(args[0]), int(args[1]), int(args[2]),
+                                 debugger)
+    if request == "breakpoints-list":
+        return _list_breaks_since(args[0] if args else None, debugger)
+    if request == "handle-command":
+        if args[0] == 'nvim-gdb-info-breakpoints':
+            # Fake a command info-breakpoins for GdbLopenBreakpoins
+            return _get_all_breaks(debugger)
+        if args[0] == 'bt':
+            return _backtrace(debugger)
+        command_to_handle = " ".join(args)
+        if sys.version_info.major < 3:
+            command_to_handle = command_to_handle.encode("ascii")
+        return _execute_command(command_to_handle, debugger)
+    return None
+
+
+def _serve_datagrams(server_address: str, debugger: lldb.SBDebugger):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(('127.0.0.1', 0))
+    try:
+        # Let large chunked responses be queued at once
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCK_BUFFER_SIZE)
+    except OSError:
+        pass
     _, port = sock.getsockname()
     with open(server_address, 'w') as f:
         f.write(f"{port}")
     logger.info("Start listening for commands at port %d", port)
 
-    # debugger = lldb.SBDebugger_FindDebuggerWithID(debugger_id)
-
     try:
         while True:
             data, addr = sock.recvfrom(65536)
-            command = data.decode("utf-8")
-            logger.debug("Got command: %s", command)
-            command = re.split(r"\s+", command)
-            req_id = int(command[0])
-            request = command[1]
-            args = command[2:]
-            if request == "info-breakpoints":
-                fname = args[0]
-                send_response(_get_breaks(os.path.normpath(fname), debugger),
-                              req_id, sock, addr)
-            elif request == "get-process-state":
-                send_response(get_process_state(debugger), req_id, sock, addr)
-            elif request == "get-current-frame-location":
-                send_response(get_current_frame_location(debugger),
-                              req_id, sock, addr)
-            elif request == "handle-command":
-                # pylint: disable=broad-except
-                try:
-                    if args[0] == 'nvim-gdb-info-breakpoints':
-                        # Fake a command info-breakpoins for GdbLopenBreakpoins
-                        send_response(_get_all_breaks(debugger),
-                                      req_id, sock, addr)
-                        return
-                    if args[0] == 'bt':
-                        _backtrace(req_id, sock, addr, debugger)
-                        return
-                    command_to_handle = " ".join(args)
-                    if sys.version_info.major < 3:
-                        command_to_handle = command_to_handle.encode("ascii")
-                    _execute_command(command_to_handle, req_id, sock, addr,
-                                     debugger)
-                except Exception as ex:
-                    logger.error("Exception: %s", ex)
+            _handle_request(data.decode("utf-8"), DatagramPeer(sock, addr),
+                            debugger)
     finally:
         logger.info("Stop listening for commands")
         try:
@@ -206,8 +635,47 @@ def _server(server_address: str, debugger: lldb.SBDebugger):
             pass
 
 
+def _serve_stream(path: str, debugger: lldb.SBDebugger):
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(path)
+    # The plugin can connect as soon as the socket is listening
+    srv.listen(1)
+    logger.info("Start listening for commands at %s", path)
+
+    try:
+        while True:
+            conn, _ = srv.accept()
+            peer = StreamPeer(conn)
+            try:
+                while True:
+                    _handle_request(peer.recv().decode("utf-8"), peer,
+                                    debugger)
+            except (EOFError, OSError) as ex:
+                logger.info("Disconnected: %s", ex)
+            finally:
+                conn.close()
+    finally:
+        logger.info("Stop listening for commands")
+        srv.close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _server(server_address: str, debugger: lldb.SBDebugger):
+    if server_address.startswith(UNIX_PREFIX):
+        _serve_stream(server_address[len(UNIX_PREFIX):], debugger)
+    else:
+        _serve_datagrams(server_address, debugger)
+
+
 def init(debugger: lldb.SBDebugger, command: str, _3, _4):
     """Entry point."""
     server_address = command
-    thrd = threading.Thread(target=_server, args=(server_address, debugger))
+    # Start collecting the events before the process is launched
+    _get_tracker(debugger)
+    # Don't keep LLDB from exiting
+    thrd = threading.Thread(target=_server, args=(server_address, debugger),
+                            daemon=True)
     thrd.start()
@@ -0,0 +1,116 @@
+"""The program injected into pdb to provide a side channel
+to the plugin.
+
+Usage: python pdb_commands.py <port file> [pdb arguments]
+
+The debugger is started as with "python -m pdb [pdb arguments]",
+the port of the side channel is written to the port file.
+"""
+
+import bdb
+import itertools
+import json
+import logging
+import os
+import pdb
+import re
+import socket
+import sys
+import threading
+
+
+logger = logging.getLogger("pdb")
+logger.setLevel(logging.DEBUG)
+lhandl = logging.NullHandler() if not os.environ.get('CI') \
+    else logging.FileHandler("pdb_commands.log", encoding='utf-8')
+fmt = "%(asctime)s [%(levelname)s]: %(message)s"
+lhandl.setFormatter(logging.Formatter(fmt))
+logger.addHandler(lhandl)
+
+# Generations of the data sent to the plugin allow replying briefly
+# when nothing has changed since the last query.
+_generations = itertools.count(1)
+_breaks_sent = {}               # {fname -> (gen, breaks)}
+
+
+def _canonic(fname):
+    """Normalize the path the same way bdb does for the breakpoints."""
+    return os.path.normcase(os.path.abspath(fname))
+
+
+# Get list of enabled breakpoints for a given source file
+def _get_breaks(fname):
+    fname = _canonic(fname)
+    breaks = {}
+    # The breakpoints are read while the debugger is waiting for input,
+    # take a copy in case the user is changing them meanwhile.
+    for bpt in list(bdb.Breakpoint.bpbynumber):
+        if bpt is None or not bpt.enabled or bpt.file != fname:
+            continue
+        breaks.setdefault(str(bpt.line), []).append(str(bpt.number))
+    return breaks
+
+
+def _get_breaks_since(fname, breaks_gen):
+    """Get breakpoints for the file unless the client has them already."""
+    breaks = _get_breaks(fname)
+    gen, sent = _breaks_sent.get(fname, (None, None))
+    if breaks != sent:
+        gen = next(_generations)
+        _breaks_sent[fname] = (gen, breaks)
+    if breaks_gen == str(gen):
+        return {"_gen": gen, "_unchanged": True}
+    return dict(breaks, _gen=gen)
+
+
+def _get_response(command):
+    request = command[0]
+    args = command[1:]
+    if request == "info-breakpoints":
+        return _get_breaks_since(args[0], args[1] if len(args) > 1 else None)
+    return None
+
+
+def _handle_request(command, sock, addr):
+    logger.debug("Got command: %s", command)
+    parts = re.split(r"\s+", command)
+    req_id = int(parts[0])
+    # pylint: disable=broad-except
+    try:
+        response = _get_response(parts[1:])
+    except Exception as ex:
+        logger.error("Exception: %s", ex)
+        return
+    msg = json.dumps({"request": req_id, "response": response})
+    sock.sendto(msg.encode("utf-8"), 0, addr)
+
+
+def _server(server_address):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    _, port = sock.getsockname()
+    with open(server_address, 'w') as f:
+        f.write(f"{port}")
+    logger.info("Start listening for commands at port %d", port)
+
+    while True:
+        data, addr = sock.recvfrom(65536)
+        _handle_request(data.decode("utf-8"), sock, addr)
+
+
+def main():
+    """Entry point."""
+    server_address = sys.argv.pop(1)
+    # The thread isn't traced by the debugger, it only reads the state
+    # of the breakpoints shared by all the debugger instances.
+    thrd = threading.Thread(target=_server, args=(server_address,),
+                            daemon=True)
+    thrd.start()
+    pdb.main()
+
+
+if __name__ == '__main__':
+    # pdb clears the namespace of __main__ to run the script there,
+    # the server should keep working with its own module.
+    import pdb_commands  # pylint: disable=import-self
+    pdb_commands.main()
@@ -4,7 +4,17 @@ local log = require'nvimgdb.log'
 local is_windows = uv.os_uname().sysname:find('Windows') ~= nil
 local cmd_nl = is_windows and '\r\n' or '\n'
 
+-- Responses longer than this are split into several datagrams
+local MAX_DATAGRAM = 60000
+-- Time to wait for the debugger output in milliseconds
+local REQUEST_TIMEOUT = 500
+-- Maximum count of requests executed with one command line
+local MAX_BATCH = 8
+-- Length of the output to keep for finding the prompt split between the chunks
+local PROMPT_WINDOW = 256
+
 ---@alias Request {req_id: integer, command: string, addr: Address}
+---@alias BatchFormat {separator: string, marker_command: string, marker_output: string}
 ---@alias Address {ip: string, port: integer}
 
 ---@class ProxyImpl
@@ -18,8 +28,18 @@ local cmd_nl = is_windows and '\r\n' or '\n'
 ---@field private request_queue table<integer, {request: string, addr: Address}> the queue of outstanding requests
 ---@field private request_queue_head integer the point of taking from the queue
 ---@field private request_queue_tail integer the point of putting to the queue
----@field private current_request Request the request currently being executed
----@field private buffer string the stdout output collected for the current request so far
+---@field private batch BatchFormat? how to execute several commands at once, nil if not supported
+---@field private marker_seq integer sequential number of the last batch marker
+---@field private current_requests Request[]? the requests currently being executed
+---@field private current_command string? the command line typed into the debugger
+---@field private markers string[]? the output preceding the response of every request in the batch
+---@field private raw_output string[] the stdout output collected for the current requests so far
+---@field private output string[] the collected output with the control sequences removed
+---@field private output_tail string the end of the output to look for the prompt in
+---@field private pending_escape string incomplete control sequence at the end of the output
+---@field private helper_addr string? path to the file with the port of the helper serving the requests in the debugger
+---@field private helper_port integer? udp port of the helper
+---@field private helper_client Address? the requester to relay the helper responses to
 local ProxyImpl = { }
 ProxyImpl.__index = ProxyImpl
 
@@ -28,12 +48,17 @@ arg[0] = nil
 
 ---Constructor
 ---@param prompt string prompt pattern
+---@param batch BatchFormat? how to execute several commands in one line:
+---the commands are joined with the separator, the response of every command
+---is preceded by the output of the marker command
 ---@return ProxyImpl
-function ProxyImpl.new(prompt)
-  log.info({"ProxyImpl.new", promp = prompt, arg = arg})
+function ProxyImpl.new(prompt, batch)
+  log.info({"ProxyImpl.new", promp = prompt, batch = batch, arg = arg})
   local self = {}
   setmetatable(self, ProxyImpl)
   self.prompt = prompt
+  self.batch = batch
+  self.marker_seq = 0
 
   self.stdin = uv.new_tty(0, true)            -- 0 represents stdin file descriptor
   local result, error_msg = self.stdin:set_mode(1)  -- uv.TTY_MODE_RAW
@@ -49,11 +74,18 @@ function ProxyImpl.new(prompt)
   self.request_queue = {}
   self.request_queue_head = 1
   self.request_queue_tail = 1
-  self.current_request = nil
-  self.buffer = ""
+  self.current_requests = nil
+  self:reset_output()
   return self
 end
 
+---Let a helper in the debugger process answer the requests other than handle-command.
+---@param helper_addr string path to the file the helper writes its udp port to
+function ProxyImpl:set_helper(helper_addr)
+  log.debug({"ProxyImpl:set_helper", helper_addr = helper_addr})
+  self.helper_addr = helper_addr
+end
+
 ---Start operation
 function ProxyImpl:start()
   log.debug({"ProxyImpl:start"})
@@ -161,6 +193,18 @@ function ProxyImpl:start_socket()
     log.debug({"recv request", err = err, data = data, addr = addr})
     assert(not err, err)
     if data then
+      if self.helper_port ~= nil and addr.port == self.helper_port then
+        -- A response from the helper
+        self.sock:send(data, self.helper_client.ip, self.helper_client.port, function(send_err)
+          assert(not send_err, send_err)
+        end)
+        return
+      end
+      if data:match('^%d+ ([a-z-]+)') ~= 'handle-command' then
+        -- Typing into the debugger is only necessary to execute commands
+        self:forward_request(data, addr)
+        return
+      end
       self.request_queue[self.request_queue_tail] = {request = data, addr = addr}
       self.request_queue_tail = self.request_queue_tail + 1
       -- If the user doesn't type anymore, can process the request immediately,
@@ -174,31 +218,37 @@ function ProxyImpl:start_socket()
   end)
 end
 
+---Pass a request to the helper, reply with nothing if there is no helper.
+---@private
+---@param data string the request
+---@param addr Address the request origin
+function ProxyImpl:forward_request(data, addr)
+  if self.helper_port == nil and self.helper_addr ~= nil then
+    -- The helper is started along with the debugger, check whether it's ready
+    local f = io.open(self.helper_addr, 'r')
+    if f ~= nil then
+      self.helper_port = tonumber(f:read('*l'))
+      f:close()
+    end
+  end
+  if self.helper_port == nil then
+    self:send_response(assert(tonumber(data:match('^%d+'))), nil, addr)
+    return
+  end
+  self.helper_client = addr
+  self.sock:send(data, '127.0.0.1', self.helper_port, function(err)
+    assert(not err, err)
+  end)
+end
+
 ---Process debugger output: either print on the screen or capture as a response to a request
 ---@private
 ---@param data1 string part 1 (""|"\n")
 ---@param data2 string part 2
 function ProxyImpl:on_stdout(data1, data2)
   log.debug({"ProxyImpl:on_stdout", data1 = data1, data2 = data2})
-  if self.current_request ~= nil then
-    self.buffer = self.buffer .. data1 .. data2
-    -- First substitute cursor movement with new lines: \27[16;9H
-    local plain_buffer = self.buffer:gsub('%[%d+;%d+H', '\n')
-    -- Get rid of the other CSEQ
-    plain_buffer = plain_buffer:gsub('%[[^a-zA-Z]*[a-zA-Z]', '')
-    local start_index = plain_buffer:find(self.prompt)
-    if start_index then
-      local request = self.current_request
-      self.current_request = nil
-      local response = plain_buffer:sub(#request.command + 1, start_index):match('^%s*(.-)%s*$')
-      log.info({"Collected response", response = response})
-      self.request_timer:stop()
-      self:send_response(request.req_id, response, request.addr)
-      self.buffer = ''
-      -- Resume taking user input
-      self:start_stdin()
-      self:process_request()
-    end
+  if self.current_requests ~= nil then
+    self:collect_output(data1 .. data2)
   else
     io.stdout:write(data1, data2)
   end
@@ -219,39 +269,178 @@ function ProxyImpl:on_stdout(data1, data2)
   end
 end
 
----Check if there's an outstanding request and start executing it
+---Forget the output collected for the previous requests
+---@private
+function ProxyImpl:reset_output()
+  self.raw_output = {}
+  self.output = {}
+  self.output_tail = ''
+  self.pending_escape = ''
+end
+
+---Accumulate the output of the current requests until the prompt appears.
+---Only the new data is cleaned and searched, so long outputs aren't rescanned.
+---@private
+---@param data string the next chunk of the output
+function ProxyImpl:collect_output(data)
+  -- The debugger is still responding, give it more time
+  self:start_request_timer()
+  table.insert(self.raw_output, data)
+  data = self.pending_escape .. data
+  -- A control sequence may be split between the chunks, process it next time
+  local escape_start = data:find('\27%[?[%d;?]*$')
+  if escape_start ~= nil then
+    self.pending_escape = data:sub(escape_start)
+    data = data:sub(1, escape_start - 1)
+  else
+    self.pending_escape = ''
+  end
+  -- First substitute cursor movement with new lines: \27[16;9H
+  data = data:gsub('\27%[%d+;%d+H', '\n')
+  -- Get rid of the other CSEQ
+  data = data:gsub('\27%[[^a-zA-Z]*[a-zA-Z]', '')
+  table.insert(self.output, data)
+
+  local window = self.output_tail .. data
+  local start_index = window:find(self.prompt)
+  if start_index == nil then
+    self.output_tail = window:sub(-PROMPT_WINDOW)
+    return
+  end
+  local output = table.concat(self.output)
+  self:complete_requests(output:sub(1, #output - #window + start_index))
+end
+
+---Split the output into the responses and send them.
+---@private
+---@param output string the output of the command line up to the prompt
+function ProxyImpl:complete_requests(output)
+  local requests = self.current_requests
+  local command = self.current_command
+  local markers = self.markers
+  self.current_requests = nil
+  self.current_command = nil
+  self.markers = nil
+  self.request_timer:stop()
+  self:reset_output()
+
+  if markers == nil then
+    -- Skip the echoed command, the rest of the previous prompt may precede it
+    local echo_start = output:find('%S') or 1
+    local response = output:sub(echo_start + #command):match('^%s*(.-)%s*$')
+    log.info({"Collected response", response = response})
+    self:send_response(requests[1].req_id, response, requests[1].addr)
+  else
+    -- Find all the markers in one pass, every response follows its marker
+    local pos = 1
+    local bounds = {}
+    for i, marker in ipairs(markers) do
+      local marker_start, marker_end = output:find(marker, pos, true)
+      if marker_start == nil then
+        break
+      end
+      bounds[i] = {marker_start, marker_end}
+      pos = marker_end + 1
+    end
+    for i, request in ipairs(requests) do
+      local response = "Timed out"
+      if bounds[i] ~= nil then
+        local next_start = bounds[i + 1] ~= nil and bounds[i + 1][1] or #output + 1
+        response = output:sub(bounds[i][2] + 1, next_start - 1):match('^%s*(.-)%s*$')
+      end
+      log.info({"Collected response", req_id = request.req_id, response = response})
+      self:send_response(request.req_id, response, request.addr)
+    end
+  end
+  -- Resume taking user input
+  self:start_stdin()
+  self:process_request()
+end
+
+---(Re)start the deadline for the current requests
+---@private
+function ProxyImpl:start_request_timer()
+  self.request_timer:stop()
+  self.request_timer:start(REQUEST_TIMEOUT, 0, vim.schedule_wrap(function()
+    self:on_request_timeout()
+  end))
+end
+
+---Give up waiting for the prompt, show the output collected so far.
+---@private
+function ProxyImpl:on_request_timeout()
+  local requests = self.current_requests
+  if requests == nil then
+    return
+  end
+  self.request_timer:stop()
+  for _, request in ipairs(requests) do
+    self:send_response(request.req_id, "Timed out", request.addr)
+  end
+  self.current_requests = nil
+  self.current_command = nil
+  self.markers = nil
+  io.stdout:write(table.concat(self.raw_output))
+  self:reset_output()
+  -- Resume taking user input
+  self:start_stdin()
+  self:process_request()
+end
+
+---Check whether a command can be executed along with the others in one line
+---@private
+---@param cmd string debugger command
+---@return boolean
+function ProxyImpl:can_batch(cmd)
+  return self.batch ~= nil and cmd:find(self.batch.separator, 1, true) == nil
+end
+
+---Check if there are outstanding requests and start executing them.
+---Several requests are executed with one command line if the debugger allows.
 ---@private
 ---@return boolean false if there's an outstanding request, but it can't be scheduled at the moment
 function ProxyImpl:process_request()
   log.debug({"ProxyImpl:process_request"})
-  if self.current_request ~= nil then
+  if self.current_requests ~= nil then
     return false
   end
   if self.request_queue_tail == self.request_queue_head then
     return true
   end
-  local command = self.request_queue[self.request_queue_head]
-  self.request_queue[self.request_queue_head] = nil
-  self.request_queue_head = self.request_queue_head + 1
-  local req_id, _, cmd = command.request:match('(%d+) ([a-z-]+) (.+)')
-  self.current_request = {req_id = assert(tonumber(req_id)), command = cmd, addr = command.addr}
+  local requests = {}
+  while self.request_queue_head < self.request_queue_tail and #requests < MAX_BATCH do
+    local queued = self.request_queue[self.request_queue_head]
+    local req_id, _, cmd = queued.request:match('(%d+) ([a-z-]+) (.+)')
+    if #requests > 0 and not (self:can_batch(cmd) and self:can_batch(requests[1].command)) then
+      break
+    end
+    self.request_queue[self.request_queue_head] = nil
+    self.request_queue_head = self.request_queue_head + 1
+    requests[#requests + 1] = {req_id = assert(tonumber(req_id)), command = cmd, addr = queued.addr}
+  end
+
+  local command = requests[1].command
+  self.markers = nil
+  if #requests > 1 then
+    -- marker1 sep cmd1 sep marker2 sep cmd2 ...
+    local parts = {}
+    self.markers = {}
+    for i, request in ipairs(requests) do
+      self.marker_seq = self.marker_seq + 1
+      parts[#parts + 1] = self.batch.marker_command:format(self.marker_seq)
+      parts[#parts + 1] = request.command
+      self.markers[i] = self.batch.marker_output:format(self.marker_seq)
+    end
+    command = table.concat(parts, self.batch.separator)
+  end
+  self.current_requests = requests
+  self.current_command = command
   -- Going to execute a command, suppress user input
   self.stdin:read_stop()
-  log.info({"Send request", cmd = cmd})
+  log.info({"Send request", cmd = command})
   -- \r\n for win32
-  vim.fn.chansend(self.job_id, cmd .. cmd_nl)
-  self.request_timer:start(500, 0, vim.schedule_wrap(function()
-    self.request_timer:stop()
-    self:send_response(req_id, "Timed out", command.addr)
-    self.current_request = nil
-    if self.buffer ~= nil then
-      self:on_stdout(self.buffer, '')
-      self.buffer = nil
-    end
-    -- Resume taking user input
-    self:start_stdin()
-    self:process_request()
-  end))
+  vim.fn.chansend(self.job_id, command .. cmd_nl)
+  self:start_request_timer()
   return true
 end
 
@@ -263,9 +452,22 @@ end
 function ProxyImpl:send_response(req_id, response, addr)
   log.debug({"ProxyImpl:send_response", req_id = req_id, response = response, addr = addr})
   local data = vim.fn.json_encode({request = req_id, response = response})
-  self.sock:send(data, addr.ip, addr.port, function(err)
+  local on_sent = function(err)
     assert(not err, err)
-  end)
+  end
+  if #data <= MAX_DATAGRAM then
+    self.sock:send(data, addr.ip, addr.port, on_sent)
+    return
+  end
+  -- Too big for a single datagram: send the message in chunks
+  -- "#<req_id> <index> <count>\n<part of the message>" to be
+  -- reassembled by the plugin.
+  local count = math.ceil(#data / MAX_DATAGRAM)
+  for idx = 0, count - 1 do
+    local chunk = data:sub(idx * MAX_DATAGRAM + 1, (idx + 1) * MAX_DATAGRAM)
+    local header = string.format("#%d %d %d\n", req_id, idx, count)
+    self.sock:send(header .. chunk, addr.ip, addr.port, on_sent)
+  end
 end
 
 return ProxyImpl
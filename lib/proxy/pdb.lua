@@ -7,6 +7,34 @@ local log = require'nvimgdb.log'
 log.set_filename('pdb.log')
 local ProxyImpl = require'impl'
 
-local proxy = ProxyImpl.new('[\n\r]%(Pdb%+*%) *')
+-- The helper writes its port next to the port of the proxy
+local helper_addr = arg[1] == '-a' and arg[2] .. '.pdb' or nil
+
+-- Several commands can be executed at once separated with ;;
+-- The marker is printed as 'nvimgdb-<n>', unlike the echoed command
+-- thanks to the concatenation of the string literals.
+local proxy = ProxyImpl.new('[\n\r]%(Pdb%+*%) *', {
+  separator = ';;',
+  marker_command = "p 'nvimgdb' '-%d'",
+  marker_output = "'nvimgdb-%d'",
+})
+
+-- Run "python -m pdb ..." with the helper instead to let it answer
+-- the requests in the debugger process: python pdb_commands.py <port file> ...
+local helper = uv.fs_realpath(dir .. '/../pdb_commands.py')
+-- Only the interpreter options are considered, not the script arguments
+local i = 2
+while helper_addr ~= nil and helper ~= nil and arg[i] ~= nil and arg[i]:sub(1, 1) == '-' do
+  if arg[i] == '-m' then
+    if arg[i + 1] == 'pdb' then
+      arg[i] = helper
+      arg[i + 1] = helper_addr
+      proxy:set_helper(helper_addr)
+    end
+    break
+  end
+  i = i + 1
+end
+
 proxy:start()
 vim.wait(10^9, function() return false end)
@@ -1,20 +1,86 @@
 #!/usr/bin/env python3
 
 import asyncio
+import hashlib
+import json
+import os
 import sys
 import shlex
 import re
+import signal
+import subprocess
+import tempfile
+import time
 
 # rr replay refuses to run outside of a pty. But it allows
 # attaching a gdb remotely.
 
+USAGE = """Usage: rr-replay.py [options] [gdb arguments]
 
-async def run_gdb(cmd):
+Options:
+  --goto EVENT   start the replay at the given event instead of the beginning
+  --trace DIR    replay the given trace instead of the latest one
+  --pool         keep the replay server alive after gdb exits and reuse it
+                 in the following sessions in the same directory
+  --pool-stop    stop the replay server kept for the directory
+"""
+
+# The replay servers kept alive between the sessions
+POOL_DIR = os.path.join(os.environ.get("XDG_RUNTIME_DIR")
+                        or tempfile.gettempdir(), "nvim-gdb-rr")
+# Time to wait for a pooled server to advertise its port in seconds
+POOL_START_TIMEOUT = 600
+
+HEADER_REGEX = re.compile(b'Launch \\w+ with$')
+
+
+def parse_args(argv):
+    """Split the arguments into the options of the script and gdb."""
+    opts = {"goto": None, "trace": None, "pool": False, "pool_stop": False}
+    gdb_args = []
+    args = iter(argv)
+    for arg in args:
+        if arg in ("--goto", "--trace"):
+            opts[arg[2:]] = next(args, None)
+        elif arg.startswith("--goto=") or arg.startswith("--trace="):
+            key, value = arg[2:].split("=", 1)
+            opts[key] = value
+        elif arg == "--pool":
+            opts["pool"] = True
+        elif arg == "--pool-stop":
+            opts["pool_stop"] = True
+        elif arg in ("-h", "--help"):
+            print(USAGE)
+            sys.exit(0)
+        else:
+            gdb_args.append(arg)
+    return opts, gdb_args
+
+
+def get_rr_cmd(opts):
+    """Compose `rr replay` selecting a random TCP port for GDB."""
+    cmd = ["rr", "replay", "-s0"]
+    if opts["pool"]:
+        # Let the next gdb connect after this one has gone
+        cmd.append("--keep-listening")
+    if opts["goto"] is not None:
+        cmd += ["--goto", opts["goto"]]
+    if opts["trace"] is not None:
+        cmd.append(opts["trace"])
+    return cmd
+
+
+def insert_gdb_args(cmd, gdb_args):
     parts = shlex.split(cmd)
-    gdb_idx = parts.index('gdb')
-    if gdb_idx != -1:
-        parts = parts[:gdb_idx+1] + sys.argv[1:] + parts[gdb_idx+1:]
-    gdb_proc = await asyncio.create_subprocess_exec(*parts)
+    if 'gdb' in parts:
+        gdb_idx = parts.index('gdb')
+        parts = parts[:gdb_idx+1] + gdb_args + parts[gdb_idx+1:]
+    return parts
+
+
+async def run_gdb(cmd, gdb_args):
+    gdb_proc = await asyncio.create_subprocess_exec(
+        *insert_gdb_args(cmd, gdb_args))
     await gdb_proc.communicate()
     return gdb_proc.returncode
 
@@ -27,17 +93,15 @@ async def continue_rr(rr_proc):
     return await rr_proc.wait()
 
 
-async def run(cmd):
+async def run(cmd, gdb_args):
     # First run the command `rr replay`
-    rr_proc = await asyncio.create_subprocess_shell(
-        cmd,
+    rr_proc = await asyncio.create_subprocess_exec(
+        *cmd,
         stderr=asyncio.subprocess.PIPE)
 
-    header_regex = re.compile(b'Launch \\w+ with$')
-
     # Check it launched
     header = await rr_proc.stderr.readline()
-    if not header_regex.match(header):
+    if not HEADER_REGEX.match(header):
         rest = await rr_proc.stderr.read()
         raise RuntimeError(f"Unexpected: {header.decode()}{rest.decode()}")
 
@@ -46,8 +110,110 @@ async def run(cmd):
 
     # Continue to running both rr and gdb
     return await asyncio.gather(continue_rr(rr_proc),
-                                run_gdb(gdb_cmd.decode()))
+                                run_gdb(gdb_cmd.decode(), gdb_args))
+
+
+def get_pool_path(cmd):
+    """The state of the replay server for the directory and the trace."""
+    key = json.dumps([os.getcwd(), cmd]).encode("utf-8")
+    name = hashlib.sha1(key).hexdigest()[:16]
+    return os.path.join(POOL_DIR, name)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def load_server(path):
+    """Get the gdb command of the running server, None if there isn't one."""
+    try:
+        with open(path + ".json", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not is_alive(state["pid"]):
+        return None
+    return state
+
+
+def start_server(cmd, path):
+    """Start `rr replay` in the background and wait for its gdb command."""
+    os.makedirs(POOL_DIR, exist_ok=True)
+    log_path = path + ".log"
+    with open(log_path, "wb") as log:
+        # The server outlives the session: detach it from the terminal,
+        # its output goes to the log.
+        rr_proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=log,
+                                   stderr=log, start_new_session=True)
+    try:
+        return wait_server(rr_proc, log_path, path)
+    except BaseException:
+        # No state has been written to stop the detached server later
+        try:
+            os.killpg(rr_proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        raise
+
+
+def wait_server(rr_proc, log_path, path):
+    """Wait for the gdb command of `rr replay` relaying its log meanwhile."""
+    output = b""
+    deadline = time.monotonic() + POOL_START_TIMEOUT
+    while time.monotonic() < deadline:
+        with open(log_path, "rb") as log:
+            log.seek(len(output))
+            chunk = log.read()
+        if chunk:
+            # Replaying up to the event may take a while, show the progress
+            sys.stderr.buffer.write(chunk)
+            sys.stderr.flush()
+            output += chunk
+        lines = output.splitlines()
+        for idx, line in enumerate(lines[:-1]):
+            if HEADER_REGEX.match(line):
+                state = {"pid": rr_proc.pid, "gdb": lines[idx + 1].decode()}
+                with open(path + ".json", "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                return state
+        if rr_proc.poll() is not None:
+            break
+        time.sleep(0.1)
+    raise RuntimeError(f"Unexpected: {output.decode(errors='replace')}")
+
+
+def stop_server(path):
+    state = load_server(path)
+    if state is not None:
+        os.killpg(state["pid"], signal.SIGTERM)
+    for suffix in (".json", ".log"):
+        try:
+            os.unlink(path + suffix)
+        except OSError:
+            pass
+
+
+def main():
+    opts, gdb_args = parse_args(sys.argv[1:])
+    if not opts["pool"] and not opts["pool_stop"]:
+        asyncio.run(run(get_rr_cmd(opts), gdb_args))
+        return
+    cmd = get_rr_cmd(dict(opts, pool=True))
+    path = get_pool_path(cmd)
+    if opts["pool_stop"]:
+        stop_server(path)
+        return
+    # Reconnect to the replay server kept since the previous session
+    state = load_server(path) or start_server(cmd, path)
+    print(f"Connecting to the rr replay server {state['pid']}",
+          file=sys.stderr)
+    sys.exit(asyncio.run(run_gdb(state["gdb"], gdb_args)))
 
 
-# Run `rr replay` selecting a random TCP port for GDB
-asyncio.run(run("rr replay -s0"))
+main()
@@ -208,6 +208,9 @@ function NvimGdb.global_init()
   vim.api.nvim_create_user_command('GdbCreateWatch',
     function(a) NvimGdb.here:create_watch(a.args, a.mods) end,
     {nargs = 1, force = true, desc = 'Create a window watching an expression'})
+  vim.api.nvim_create_user_command('GdbInspect',
+    function(a) NvimGdb.here:inspect(a.args, a.mods) end,
+    {nargs = 1, force = true, desc = 'Create a window to browse the value of an expression'})
   vim.api.nvim_create_user_command('Gdb',
     function(a) NvimGdb.here:send(a.args) end,
     {nargs = "+", force = true, desc = 'Execute debugger command'})
@@ -262,7 +265,8 @@ function NvimGdb.global_init()
       "NvimGdbBreak",
       "NvimGdbContinue",
       "NvimGdbStart",
-      "NvimGdbCleanup"
+      "NvimGdbCleanup",
+      "NvimGdbFlood"
   }
   local nvimgdb_internal_auid = vim.api.nvim_create_augroup("NvimGdbInternal", {clear = true})
   for _, event in ipairs(custom_events) do
@@ -301,6 +305,7 @@ function NvimGdb.global_cleanup()
   vim.api.nvim_del_user_command('GdbEvalWord')
   vim.api.nvim_del_user_command('GdbEvalRange')
   vim.api.nvim_del_user_command('GdbCreateWatch')
+  vim.api.nvim_del_user_command('GdbInspect')
   vim.api.nvim_del_user_command('Gdb')
   vim.api.nvim_del_user_command('GdbLopenBacktrace')
   vim.api.nvim_del_user_command('GdbLopenBreakpoints')
@@ -323,8 +328,8 @@ function NvimGdb.setup()
       {nargs = "+", complete = "shellcmd", force = true, desc = 'Start ' .. backend .. ' debugging'})
   end
   vim.api.nvim_create_user_command('GdbStartRR',
-    function() spawn('gdb', {'rr-replay.py'}) end,
-    {force = true, desc = 'Start rr debugging'})
+    function(a) spawn('gdb', {'rr-replay.py', unpack(a.fargs)}) end,
+    {nargs = "*", force = true, desc = 'Start rr debugging'})
 
   vim.api.nvim_set_keymap('c', '<c-e>', "<C-\\>ev:lua.require'nvimgdb.cmake'.select_executable()<cr>", { noremap = true, silent = true })
 
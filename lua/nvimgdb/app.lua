@@ -15,6 +15,9 @@ local NvimGdb = require'nvimgdb'
 ---@field private win Win jump window manager
 ---@field private parser ParserImpl debugger output parser
 ---@field private tabpage_created boolean indicates whether the tabpage was created and needs to be closed during cleanup
+---@field private server_watches table<string, number> buffers of the watches evaluated by the side channel by watch identifier
+---@field private server_watches_gen any? generation of the watch outputs shown
+---@field private server_watches_augid number? autocmd group refreshing the watches evaluated by the side channel
 local App = {}
 App.__index = App
 
@@ -29,6 +32,10 @@ function App.new(backend_name, client_cmd)
   -- destructors to be executed during cleanup()
   self.destructors = {}
 
+  self.server_watches = {}
+  self.server_watches_gen = nil
+  self.server_watches_augid = nil
+
   self.config = require'nvimgdb.config'.new()
 
   -- The last executed debugger command for testing
@@ -69,7 +76,8 @@ function App.new(backend_name, client_cmd)
   self.proxy = require'nvimgdb.proxy'.new(self.client)
 
   -- Initialize breakpoint tracking
-  self.breakpoint = require'nvimgdb.breakpoint'.new(self.config, self.proxy, self.backend.query_breakpoints)
+  self.breakpoint = require'nvimgdb.breakpoint'.new(self.config, self.proxy,
+    self.backend.query_breakpoints, self.backend.query_breakpoints_many)
 
   -- Initialize the keymaps subsystem
   self.keymaps = require'nvimgdb.keymaps'.new(self.config)
@@ -80,8 +88,14 @@ function App.new(backend_name, client_cmd)
   -- Initialize the windowing subsystem
   self.win = require'nvimgdb.win'.new(self.config, self.keymaps, self.cursor, self.client, self.breakpoint, start_win, edited_buf)
 
+  -- Initialize the breakpoint store if requested
+  local breakpoint_store = nil
+  if self.config:get('persist_breakpoints') and self.backend.supports_persistent_breakpoints then
+    breakpoint_store = require'nvimgdb.breakpoint_store'.new(self.config, self.proxy, self.backend)
+  end
+
   -- Initialize the parser
-  local parser_actions = require'nvimgdb.parser_actions'.new(self.cursor, self.win)
+  local parser_actions = require'nvimgdb.parser_actions'.new(self.cursor, self.win, self.breakpoint, breakpoint_store)
   self.parser = self.backend.create_parser(parser_actions, self.proxy)
 
   return self
@@ -238,19 +252,30 @@ function App:create_watch(cmd, mods)
   end
   self.destructors[augroup_name] = destr
 
-  vim.api.nvim_create_autocmd({"User"}, {
-    pattern = "NvimGdbQuery",
-    group = augid,
-    callback = function()
-      coroutine.resume(coroutine.create(function()
-        local response = NvimGdb.here:custom_command_async(cmd)
-        -- The buffer may have been unloaded already
-        if vim.api.nvim_buf_is_loaded(buf) then
-          vim.api.nvim_buf_set_lines(buf, 0, -1, 0, vim.fn.split(response, '\r*\n'))
-        end
-      end))
+  -- Identifier of the watch if evaluated by the side channel
+  local watch_id = nil
+
+  coroutine.resume(coroutine.create(function()
+    watch_id = self.backend.register_watch(self.proxy, cmd)
+    if watch_id ~= nil then
+      self:_add_server_watch(watch_id, buf)
+      return
     end
-  })
+    -- Otherwise, execute the command every time the debugger is queried
+    vim.api.nvim_create_autocmd({"User"}, {
+      pattern = "NvimGdbQuery",
+      group = augid,
+      callback = function()
+        coroutine.resume(coroutine.create(function()
+          local response = NvimGdb.here:custom_command_async(cmd)
+          -- The buffer may have been unloaded already
+          if vim.api.nvim_buf_is_loaded(buf) then
+            vim.api.nvim_buf_set_lines(buf, 0, -1, 0, vim.fn.split(response, '\r*\n'))
+          end
+        end))
+      end
+    })
+  end))
 
   -- Destroy the autowatch automatically when the window is gone.
   vim.api.nvim_create_autocmd({"BufWinLeave"}, {
@@ -259,6 +284,9 @@ function App:create_watch(cmd, mods)
     callback = function()
       destr()
       self.destructors[augroup_name] = nil
+      if watch_id ~= nil then
+        self:_remove_server_watch(watch_id)
+      end
     end
   })
 
@@ -267,6 +295,88 @@ function App:create_watch(cmd, mods)
   vim.api.nvim_command("wincmd l")
 end
 
+---Start showing the output of a watch evaluated by the side channel.
+---All such watches are refreshed with a single query.
+---@param id any watch identifier
+---@param buf number buffer to show the output in
+function App:_add_server_watch(id, buf)
+  log.debug({"App:_add_server_watch", id = id, buf = buf})
+  self.server_watches[tostring(id)] = buf
+  if self.server_watches_augid ~= nil then
+    return
+  end
+  local augroup_name = "NvimGdbTab" .. vim.api.nvim_get_current_tabpage() .. "_watches"
+  local augid = vim.api.nvim_create_augroup(augroup_name, {clear = true})
+  self.server_watches_augid = augid
+  vim.api.nvim_create_autocmd({"User"}, {
+    pattern = "NvimGdbQuery",
+    group = augid,
+    callback = function()
+      coroutine.resume(coroutine.create(function()
+        self:_update_server_watches()
+      end))
+    end
+  })
+  self.destructors[augroup_name] = function()
+    vim.api.nvim_del_augroup_by_id(augid)
+  end
+end
+
+---Stop evaluating a watch in the side channel.
+---@param id any watch identifier
+function App:_remove_server_watch(id)
+  log.debug({"App:_remove_server_watch", id = id})
+  self.server_watches[tostring(id)] = nil
+  coroutine.resume(coroutine.create(function()
+    self.backend.unregister_watch(self.proxy, id)
+  end))
+end
+
+---Show the output of the watches that has changed since the last time.
+---@async
+function App:_update_server_watches()
+  log.debug({"App:_update_server_watches"})
+  local watches, gen = self.backend.query_watches(self.proxy, self.server_watches_gen)
+  if watches == nil then
+    return
+  end
+  self.server_watches_gen = gen
+  for id, output in pairs(watches) do
+    local buf = self.server_watches[id]
+    -- The buffer may have been unloaded already
+    if buf ~= nil and vim.api.nvim_buf_is_loaded(buf) then
+      vim.api.nvim_buf_set_lines(buf, 0, -1, 0, vim.fn.split(output, '\r*\n'))
+    end
+  end
+end
+
+---Create a window to browse the value of an expression.
+---The children of the value are expanded on demand with <CR>.
+---@param expr string debugger expression to inspect
+---@param mods string? command modifiers like 'leftabove'
+function App:inspect(expr, mods)
+  log.debug({"App:inspect", expr = expr, mods = mods})
+  if not mods or mods == '' then
+    mods = 'vert'
+  end
+  vim.api.nvim_command(mods .. " new | setlocal buftype=nofile bufhidden=wipe noswapfile nomodifiable")
+  self.keymaps:dispatch_set()
+  local buf = vim.api.nvim_get_current_buf()
+  pcall(vim.api.nvim_buf_set_name, buf, 'GdbInspect ' .. expr)
+
+  -- Wipe the buffer when the session is over as the values are no longer available
+  self.destructors["NvimGdbInspect" .. buf] = function()
+    if vim.api.nvim_buf_is_valid(buf) then
+      vim.api.nvim_buf_delete(buf, {force = true})
+    end
+  end
+
+  local inspector = require'nvimgdb.inspector'.new(self.backend, self.proxy, buf)
+  coroutine.resume(coroutine.create(function()
+    inspector:load(expr)
+  end))
+end
+
 ---Toggle breakpoint in the cursor line
 function App:breakpoint_toggle()
   log.debug({"App:breakpoint_toggle"})
@@ -307,6 +417,10 @@ function App:on_tab_enter()
   if self.parser:is_paused() then
     self.cursor:show()
   end
+  -- The breakpoints haven't been followed while in the other tabpage
+  coroutine.resume(coroutine.create(function()
+    self.win:query_breakpoints()
+  end))
   -- Just in case that OnBufEnter isn't fired. Thus, multiple on_buf_enter() calls may occur.
   self:on_buf_enter()
 end
@@ -327,9 +441,9 @@ function App:on_buf_enter()
   -- Apply keymaps to the jump window only.
   if vim.bo.filetype ~= 'nvimgdb' and self.win:is_jump_window_active() then
     self.keymaps:dispatch_set()
-    -- Ensure breakpoints are shown if are queried dynamically
+    -- Ensure breakpoints are shown, the new files are queried
     coroutine.resume(coroutine.create(function()
-      self.win:query_breakpoints()
+      self.win:show_breakpoints()
     end))
   end
 end
@@ -363,7 +477,8 @@ function App:lopen(kind, mods)
   log.debug({"App:lopen", kind = kind, mods = mods})
   local cmd = ''
   if kind == App.lopen_kind.backtrace then
-    cmd = self.backend:translate_command('bt')
+    self.win:lopen_backtrace(self.backend:translate_command('bt'), mods)
+    return
   elseif kind == App.lopen_kind.breakpoints then
     cmd = self.backend:translate_command('info breakpoints')
   else
@@ -373,6 +488,16 @@ function App:lopen(kind, mods)
   self.win:lopen(cmd, mods)
 end
 
+---Get a page of the backtrace frames
+---@async
+---@param offset number level of the first frame
+---@param limit number maximum count of frames
+---@return BacktracePage? page of the backtrace, nil if not supported by the backend
+function App:query_backtrace(offset, limit)
+  log.debug({"App:query_backtrace", offset = offset, limit = limit})
+  return self.backend.query_backtrace(self.proxy, offset, limit)
+end
+
 ---Split command output into lines for llist
 ---@async
 ---@param cmd string debugger command to execute
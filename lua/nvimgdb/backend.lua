@@ -1,5 +1,7 @@
 -- vim: set et ts=2 sw=2:
 
+local log = require'nvimgdb.log'
+
 ---@class Backend
 local C = {}
 C.__index = C
@@ -17,13 +19,172 @@ end
 ---@async
 ---@param fname string full path to the source
 ---@param proxy Proxy connection to the side channel
----@return FileBreakpoints collection of actual breakpoints
-function C.query_breakpoints(fname, proxy)
+---@param gen any? generation of the breakpoints known for the file
+---@return FileBreakpoints? collection of actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints if supported by the side channel
+function C.query_breakpoints(fname, proxy, gen)
   local _ = fname
   local _ = proxy
+  local _ = gen
   return assert(nil, "Not implemented")
 end
 
+---Check the breakpoints reported by the side channel.
+---@param breaks any response from the proxy
+---@return FileBreakpoints? collection of actual breakpoints, nil if unchanged
+---@return any? generation of the breakpoints
+function C.filter_breakpoints(breaks)
+  if type(breaks) ~= 'table' or next(breaks) == nil then
+    return {}
+  end
+  -- We expect the proxies to send breakpoints for a given file
+  -- as a map of lines to array of breakpoint ids set in those lines.
+  local err = breaks._error
+  if err ~= nil then
+    log.error("Can't get breakpoints: " .. err)
+    return {}
+  end
+  local gen = breaks._gen
+  if breaks._unchanged then
+    return nil, gen
+  end
+  breaks._gen = nil
+  return breaks, gen
+end
+
+---@class BacktraceFrame
+---@field level number frame level, 0 for the innermost frame
+---@field pc string program counter in hex
+---@field function string? function name if known
+---@field file string? full path to the source if known
+---@field line number? line in the source if known
+
+---@class BacktracePage
+---@field frames BacktraceFrame[] frames starting from the requested level
+---@field more boolean true if there are older frames
+---@field stop any identifier of the stop the frames belong to
+
+---Get a page of the backtrace if the side channel can describe the frames.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param offset number level of the first frame
+---@param limit number maximum count of frames
+---@return BacktracePage? page of the backtrace, nil if not supported
+function C.query_backtrace(proxy, offset, limit)
+  local _ = proxy
+  local _ = offset
+  local _ = limit
+  return nil
+end
+
+---Register a debugger command to be evaluated by the side channel
+---whenever the program state may have changed.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param cmd string debugger command to watch
+---@return any? watch identifier, nil if not supported
+function C.register_watch(proxy, cmd)
+  local _ = proxy
+  local _ = cmd
+  return nil
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param id any watch identifier returned by register_watch()
+function C.unregister_watch(proxy, id)
+  local _ = proxy
+  local _ = id
+end
+
+---Get the output of the watches changed since the generation gen.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param gen any? generation of the watch outputs known already
+---@return table<string, string>? output of the changed watches by watch identifier
+---@return any? generation of the watch outputs
+function C.query_watches(proxy, gen)
+  local _ = proxy
+  local _ = gen
+  return nil
+end
+
+---Evaluate an expression into a bounded summary for the inspector.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param expr string expression to evaluate
+---@return InspectorNode? description of the value, nil if failed
+---@return string? error message
+function C.inspect(proxy, expr)
+  local _ = proxy
+  local _ = expr
+  return nil, "Not supported by the backend"
+end
+
+---Get a page of the children of an inspected value.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param handle any identifier of the value
+---@param offset number index of the first child
+---@param limit number maximum count of children
+---@return InspectorChildren? page of the children, nil if failed
+---@return string? error message
+function C.inspect_children(proxy, handle, offset, limit)
+  local _ = proxy
+  local _ = handle
+  local _ = offset
+  local _ = limit
+  return nil, "Not supported by the backend"
+end
+
+---@class StoredBreakpoints breakpoints kept between the debugging sessions
+---@field breakpoints string[] locations of the enabled breakpoints
+---@field disabled string[] locations of the disabled breakpoints
+
+---@class BreakpointListing: StoredBreakpoints
+---@field executable string? full path to the program being debugged
+
+---Check the breakpoints listed by the side channel to keep them between the sessions.
+---@param listing any response from the proxy to breakpoints-list
+---@param gen any? generation of the breakpoints listed last time
+---@return BreakpointListing? actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.filter_breakpoint_listing(listing, gen)
+  if type(listing) ~= 'table' or listing._gen == nil or listing._unchanged then
+    return nil, gen
+  end
+  return listing, listing._gen
+end
+
+---Get all the breakpoints to keep them between the debugging sessions.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param gen any? generation of the breakpoints listed last time
+---@return BreakpointListing? actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.list_breakpoints(proxy, gen)
+  local _ = proxy
+  return nil, gen
+end
+
+---Set the breakpoints kept from the previous sessions, the existing ones are skipped.
+---@async
+---@param proxy Proxy connection to the side channel
+---@param stored StoredBreakpoints breakpoints to set
+---@return number count of the breakpoints set
+---@return string[]? locations of the breakpoints that couldn't be set
+function C.restore_breakpoints(proxy, stored)
+  local _ = proxy
+  local _ = stored
+  return 0, nil
+end
+
+---@type boolean true if the side channel can list and restore the breakpoints
+C.supports_persistent_breakpoints = false
+
+---@type boolean true if the side channel can be served over a Unix-domain socket
+C.supports_unix_side_channel = false
+
 ---@alias CommandMap table<string, string>
 ---@type CommandMap map from generic commands to specific commands
 C.command_map = {}
@@ -46,7 +207,8 @@ end
 
 ---@param client_cmd string[] original debugger command
 ---@param tmp_dir string path to the session state directory
----@param proxy_addr string full path to the file with the udp port in the session state directory
+---@param proxy_addr string full path to the file with the udp port in the session state directory,
+---                          or "unix:<path>" to the Unix-domain socket
 ---@return string[] command to launch the debugger with termopen()
 function C.get_launch_cmd(client_cmd, tmp_dir, proxy_addr)
   local _ = client_cmd
@@ -67,14 +67,31 @@ end
 ---@param proxy Proxy connection to the side channel
 ---@return FileBreakpoints collection of actual breakpoints
 function C.query_breakpoints(fname, proxy)
-  log.info("Query breakpoints for " .. fname)
+  return C.query_breakpoints_many({fname}, proxy, {})[1]
+end
+
+---@async
+---@param fnames string[] full paths to the sources
+---@param proxy Proxy connection to the side channel
+---@param gens table<number, any> not supported by BashDB
+---@return table<number, FileBreakpoints> collections of actual breakpoints
+---@return table<number, any> no generations
+function C.query_breakpoints_many(fnames, proxy, gens)
+  local _ = gens
+  log.info({"Query breakpoints for", fnames})
+  local all_breaks = {}
+  local real_paths = {}
+  for i, fname in ipairs(fnames) do
+    all_breaks[i] = {}
+    real_paths[i] = vim.loop.fs_realpath(fname)
+  end
+  -- The breakpoints of all the files are listed at once
   local response = proxy:query('handle-command info breakpoints')
   if response == nil or type(response) ~= 'string' or response == "" then
-    return {}
+    return all_breaks, {}
   end
 
-  -- Select lines in the current file with enabled breakpoints.
-  local breaks = {}
+  -- Select lines in the given files with enabled breakpoints.
   for line in response:gmatch("[^\r\n]+") do
     local fields = {}
     for field in line:gmatch("[^%s]+") do
@@ -83,19 +100,23 @@ function C.query_breakpoints(fname, proxy)
     if fields[4] == 'y' then    -- Is enabled?
       local bpfname, lnum = fields[#fields]:match("^([^:]+):(%d+)$")  -- file.cpp:line
       if bpfname ~= nil then
-        if bpfname == fname or vim.loop.fs_realpath(fname) == vim.loop.fs_realpath(bpfname) then
-          local br_id = fields[1]
-          local list = breaks[lnum]
-          if list == nil then
-            breaks[lnum] = {br_id}
-          else
-            list[#list + 1] = br_id
+        local bp_real_path = vim.loop.fs_realpath(bpfname)
+        for i, fname in ipairs(fnames) do
+          if bpfname == fname or (bp_real_path ~= nil and real_paths[i] == bp_real_path) then
+            local breaks = all_breaks[i]
+            local br_id = fields[1]
+            local list = breaks[lnum]
+            if list == nil then
+              breaks[lnum] = {br_id}
+            else
+              list[#list + 1] = br_id
+            end
           end
         end
       end
     end
   end
-  return breaks
+  return all_breaks, {}
 end
 
 ---@type CommandMap
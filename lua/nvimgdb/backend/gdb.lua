@@ -29,38 +29,86 @@ function C.create_parser(actions, proxy)
   local self = setmetatable({}, P)
   self:_init(actions)
 
-  P.prev_fname = nil
-  P.prev_line = nil
+  P.frame_gen = nil
+  P.is_listening = false
+
+  ---Jump to the new location pushed by the proxy as soon as the debugger stops
+  ---@param event table notification from the proxy
+  function P:_on_stop_event(event)
+    log.debug({"P:_on_stop_event", event = event})
+    if event.frame_gen ~= nil then
+      self.frame_gen = event.frame_gen
+    end
+    local location = event.location or {}
+    if #location == 2 then
+      self.actions:jump_to_source(location[1], location[2])
+    end
+  end
+
+  function P:_paused_continue()
+    -- The cursor is going to be hidden, the next stop should show it
+    -- even if the location doesn't change.
+    self.frame_gen = nil
+    return ParserImpl._paused_continue(self)
+  end
 
   function P:query_paused()
     log.debug({"P:query_paused"})
     coroutine.resume(coroutine.create(function()
-      local process_state = proxy:query('get-process-state')
+      if not self.is_listening then
+        -- Let the proxy push the locations on stop instead of waiting
+        -- for the prompt to appear in the terminal.
+        self.is_listening = proxy:query('register-listener') == true
+      end
+      -- Fetch the state, the location and the breakpoints for the file
+      -- in the jump window in one round trip. The generations of the data
+      -- seen last allow the proxy to omit whatever hasn't changed.
+      local shown_file, breaks_gen = self.actions:get_shown_file()
+      local request = 'get-stop-snapshot ' .. (self.frame_gen or '-')
+      if shown_file ~= nil then
+        request = request .. ' ' .. shown_file .. ' ' .. (breaks_gen or '-')
+      end
+      local snapshot, listed
+      local is_stored, stored_gen = self.actions:get_stored_gen()
+      if is_stored then
+        -- The stored breakpoints are listed only if they have changed
+        local responses = proxy:query_many({request, 'breakpoints-list ' .. (stored_gen or '-')})
+        snapshot, listed = responses[1], responses[2]
+      else
+        snapshot = proxy:query(request)
+      end
+      snapshot = type(snapshot) == 'table' and snapshot or {}
+      local process_state = snapshot.state
       log.debug({"process state", process_state})
+      if snapshot.frame_gen ~= nil then
+        self.frame_gen = snapshot.frame_gen
+      end
       if process_state == 'stopped' then
-        local location = proxy:query('get-current-frame-location')
+        -- The location is only sent if it has changed since the last time
+        local location = snapshot.location or {}
         log.debug({"current frame location", location})
         if #location == 2 then
           local fname = location[1]
           local line = location[2]
-          -- The "exited or ran" check is stateful, call it every time
-          -- before any other check to ensure the state is reset.
-          if proxy:query('has-exited-or-ran')
-              or (fname ~= self.prev_fname or line ~= self.prev_line)
-          then
-            self.prev_line = line
-            self.prev_fname = fname
-            self.actions:jump_to_source(fname, line)
-          end
+          self.actions:jump_to_source(fname, line)
         end
       end
-      self.actions:query_breakpoints()
+      local prefetched = nil
+      if shown_file ~= nil and snapshot.breakpoints ~= nil then
+        local breaks, gen = C.filter_breakpoints(snapshot.breakpoints)
+        prefetched = {fname = shown_file, breaks = breaks, gen = gen}
+      end
+      self.actions:query_breakpoints(prefetched, listed)
       self.state = process_state == 'running' and self.running or self.paused
     end))
     -- Don't change the state yet
     return self.state
   end
 
+  proxy:on_event('stop', function(event)
+    self:_on_stop_event(event)
+  end)
+
   local re_prompt = '$'
   self.add_trans(self.paused, '[\r\n]Continuing%.', self._paused_continue)
   self.add_trans(self.paused, '[\r\n]Starting program:', self._paused_continue)
@@ -75,23 +123,156 @@ end
 ---@async
 ---@param fname string full path to the source
 ---@param proxy Proxy connection to the side channel
----@return FileBreakpoints collection of actual breakpoints
-function C.query_breakpoints(fname, proxy)
+---@param gen any? generation of the breakpoints known for the file
+---@return FileBreakpoints? collection of actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.query_breakpoints(fname, proxy, gen)
   log.info("Query breakpoints for " .. fname)
-  local breaks = proxy:query('info-breakpoints ' .. fname)
-  if breaks == nil or next(breaks) == nil then
-    return {}
-  end
-  -- We expect the proxies to send breakpoints for a given file
-  -- as a map of lines to array of breakpoint ids set in those lines.
-  local err = breaks._error
-  if err ~= nil then
-    log.error("Can't get breakpoints: " .. err)
-    return {}
-  end
-  return breaks
+  local request = 'info-breakpoints ' .. fname
+  if gen ~= nil then
+    request = request .. ' ' .. gen
+  end
+  return C.filter_breakpoints(proxy:query(request))
+end
+
+---@async
+---@param fnames string[] full paths to the sources
+---@param proxy Proxy connection to the side channel
+---@param gens table<number, any> generations of the breakpoints known for the files
+---@return table<number, FileBreakpoints?> collections of actual breakpoints, nil if unchanged since the gen
+---@return table<number, any> generations of the breakpoints
+function C.query_breakpoints_many(fnames, proxy, gens)
+  log.info({"Query breakpoints for", fnames})
+  local requests = {}
+  for i, fname in ipairs(fnames) do
+    requests[i] = 'info-breakpoints ' .. fname
+    if gens[i] ~= nil then
+      requests[i] = requests[i] .. ' ' .. gens[i]
+    end
+  end
+  local responses = proxy:query_many(requests)
+  local breaks = {}
+  local new_gens = {}
+  for i = 1, #fnames do
+    breaks[i], new_gens[i] = C.filter_breakpoints(responses[i])
+  end
+  return breaks, new_gens
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param offset number level of the first frame
+---@param limit number maximum count of frames
+---@return BacktracePage? page of the backtrace, nil if failed
+function C.query_backtrace(proxy, offset, limit)
+  local page = proxy:query(string.format('get-backtrace %d %d', offset, limit))
+  if type(page) ~= 'table' or page.frames == nil then
+    return nil
+  end
+  if page._error ~= nil then
+    log.warn({"Backtrace is incomplete", page._error})
+  end
+  return page
+end
+
+-- The watch identifiers are chosen here rather than by the side channel,
+-- so that a registration with the lost response can be repeated safely.
+local last_watch_id = 0
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param cmd string debugger command to watch
+---@return any? watch identifier, nil if failed
+function C.register_watch(proxy, cmd)
+  last_watch_id = last_watch_id + 1
+  local id = last_watch_id
+  if proxy:query('register-watch ' .. id .. ' ' .. cmd) ~= true then
+    -- Don't leave the watch behind if it has been registered after all
+    proxy:query('unregister-watch ' .. id)
+    return nil
+  end
+  return id
 end
 
+---@async
+---@param proxy Proxy connection to the side channel
+---@param id any watch identifier returned by register_watch()
+function C.unregister_watch(proxy, id)
+  proxy:query('unregister-watch ' .. id)
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param gen any? generation of the watch outputs known already
+---@return table<string, string>? output of the changed watches by watch identifier
+---@return any? generation of the watch outputs
+function C.query_watches(proxy, gen)
+  local response = proxy:query('get-watches ' .. (gen or 0))
+  if type(response) ~= 'table' or response.watches == nil then
+    return nil
+  end
+  return response.watches, response.gen
+end
+
+---@param response any inspector response from the side channel
+---@return table? response if successful
+---@return string? error message
+local function check_inspected(response)
+  if type(response) ~= 'table' or next(response) == nil then
+    return nil, "No response"
+  end
+  if response._error ~= nil then
+    return nil, response._error
+  end
+  return response
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param expr string expression to evaluate
+---@return InspectorNode? description of the value, nil if failed
+---@return string? error message
+function C.inspect(proxy, expr)
+  return check_inspected(proxy:query('inspect ' .. expr))
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param handle any identifier of the value
+---@param offset number index of the first child
+---@param limit number maximum count of children
+---@return InspectorChildren? page of the children, nil if failed
+---@return string? error message
+function C.inspect_children(proxy, handle, offset, limit)
+  return check_inspected(proxy:query(string.format('inspect-children %d %d %d', handle, offset, limit)))
+end
+
+C.supports_unix_side_channel = true
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param gen any? generation of the breakpoints listed last time
+---@return BreakpointListing? actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.list_breakpoints(proxy, gen)
+  return C.filter_breakpoint_listing(proxy:query('breakpoints-list ' .. (gen or '-')), gen)
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param stored StoredBreakpoints breakpoints to set
+---@return number count of the breakpoints set
+---@return string[]? locations of the breakpoints that couldn't be set
+function C.restore_breakpoints(proxy, stored)
+  local result = proxy:query('breakpoints-restore ' .. vim.json.encode(stored))
+  if type(result) ~= 'table' or result.restored == nil then
+    return 0, nil
+  end
+  return result.restored, result.failed
+end
+
+C.supports_persistent_breakpoints = true
+
 ---@type CommandMap
 C.command_map = {
   delete_breakpoints = 'delete',
@@ -29,13 +29,37 @@ function C.create_parser(actions, proxy)
   local self = setmetatable({}, P)
   self:_init(actions)
 
+  P.frame_gen = nil
+
   function P:query_paused()
     coroutine.resume(coroutine.create(function()
-      local process_state = proxy:query('get-process-state')
+      -- Fetch the state, the location and the breakpoints for the file
+      -- in the jump window in one round trip. The location is only sent
+      -- if it has changed since the last time.
+      local shown_file, breaks_gen = self.actions:get_shown_file()
+      local requests = {
+        'get-process-state',
+        'get-current-frame-location ' .. (self.frame_gen or '-'),
+      }
+      if shown_file ~= nil then
+        requests[3] = 'info-breakpoints ' .. shown_file .. ' ' .. (breaks_gen or '-')
+      end
+      -- The stored breakpoints are listed only if they have changed
+      local is_stored, stored_gen = self.actions:get_stored_gen()
+      local stored_idx = #requests + 1
+      if is_stored then
+        requests[stored_idx] = 'breakpoints-list ' .. (stored_gen or '-')
+      end
+      local responses = proxy:query_many(requests)
+      local process_state = responses[1]
       log.debug({"process state", process_state})
       if process_state == 'stopped' then
-        -- A frame and thread are selected when the process gets stopped
-        local location = proxy:query('get-current-frame-location')
+        -- A frame and thread are selected when the process gets stopped.
+        local response = type(responses[2]) == 'table' and responses[2] or {}
+        if response.gen ~= nil then
+          self.frame_gen = response.gen
+        end
+        local location = response.location or {}
         log.debug({"current frame location", location})
         if #location == 2 then
           local fname = location[1]
@@ -43,7 +67,12 @@ function C.create_parser(actions, proxy)
           self.actions:jump_to_source(fname, line)
         end
       end
-      self.actions:query_breakpoints()
+      local prefetched = nil
+      if shown_file ~= nil and responses[3] ~= nil then
+        local breaks, gen = C.filter_breakpoints(responses[3])
+        prefetched = {fname = shown_file, breaks = breaks, gen = gen}
+      end
+      self.actions:query_breakpoints(prefetched, responses[stored_idx])
       self.state = process_state == 'running' and self.running or self.paused
     end))
     -- Don't change the state yet
@@ -66,23 +95,107 @@ end
 ---@async
 ---@param fname string full path to the source
 ---@param proxy Proxy connection to the side channel
----@return FileBreakpoints collection of actual breakpoints
-function C.query_breakpoints(fname, proxy)
+---@param gen any? generation of the breakpoints known for the file
+---@return FileBreakpoints? collection of actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.query_breakpoints(fname, proxy, gen)
   log.info("Query breakpoints for " .. fname)
-  local breaks = proxy:query('info-breakpoints ' .. fname)
-  if breaks == nil or next(breaks) == nil then
-    return {}
+  return C.filter_breakpoints(proxy:query('info-breakpoints ' .. fname .. ' ' .. (gen or '-')))
+end
+
+---@async
+---@param fnames string[] full paths to the sources
+---@param proxy Proxy connection to the side channel
+---@param gens table<number, any> generations of the breakpoints known for the files
+---@return table<number, FileBreakpoints?> collections of actual breakpoints, nil if unchanged since the gen
+---@return table<number, any> generations of the breakpoints
+function C.query_breakpoints_many(fnames, proxy, gens)
+  log.info({"Query breakpoints for", fnames})
+  local requests = {}
+  for i, fname in ipairs(fnames) do
+    requests[i] = 'info-breakpoints ' .. fname .. ' ' .. (gens[i] or '-')
   end
-  -- We expect the proxies to send breakpoints for a given file
-  -- as a map of lines to array of breakpoint ids set in those lines.
-  local err = breaks._error
-  if err ~= nil then
-    log.error("Can't get breakpoints: " .. err)
-    return {}
+  local responses = proxy:query_many(requests)
+  local breaks = {}
+  local new_gens = {}
+  for i = 1, #fnames do
+    breaks[i], new_gens[i] = C.filter_breakpoints(responses[i])
   end
-  return breaks
+  return breaks, new_gens
 end
 
+---@async
+---@param proxy Proxy connection to the side channel
+---@param offset number level of the first frame
+---@param limit number maximum count of frames
+---@return BacktracePage? page of the backtrace, nil if failed
+function C.query_backtrace(proxy, offset, limit)
+  local page = proxy:query(string.format('get-backtrace %d %d', offset, limit))
+  if type(page) ~= 'table' or page.frames == nil then
+    return nil
+  end
+  return page
+end
+
+---@param response any inspector response from the side channel
+---@return table? response if successful
+---@return string? error message
+local function check_inspected(response)
+  if type(response) ~= 'table' or next(response) == nil then
+    return nil, "No response"
+  end
+  if response._error ~= nil then
+    return nil, response._error
+  end
+  return response
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param expr string expression to evaluate
+---@return InspectorNode? description of the value, nil if failed
+---@return string? error message
+function C.inspect(proxy, expr)
+  return check_inspected(proxy:query('inspect ' .. expr))
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param handle any identifier of the value
+---@param offset number index of the first child
+---@param limit number maximum count of children
+---@return InspectorChildren? page of the children, nil if failed
+---@return string? error message
+function C.inspect_children(proxy, handle, offset, limit)
+  return check_inspected(proxy:query(string.format('inspect-children %d %d %d', handle, offset, limit)))
+end
+
+C.supports_unix_side_channel = true
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param gen any? generation of the breakpoints listed last time
+---@return BreakpointListing? actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints
+function C.list_breakpoints(proxy, gen)
+  return C.filter_breakpoint_listing(proxy:query('breakpoints-list ' .. (gen or '-')), gen)
+end
+
+---@async
+---@param proxy Proxy connection to the side channel
+---@param stored StoredBreakpoints breakpoints to set
+---@return number count of the breakpoints set
+---@return string[]? locations of the breakpoints that couldn't be set
+function C.restore_breakpoints(proxy, stored)
+  local result = proxy:query('breakpoints-restore ' .. vim.json.encode(stored))
+  if type(result) ~= 'table' or result.restored == nil then
+    return 0, nil
+  end
+  return result.restored, result.failed
+end
+
+C.supports_persistent_breakpoints = true
+
 ---@type CommandMap
 C.command_map = {
   delete_breakpoints = 'breakpoint delete',
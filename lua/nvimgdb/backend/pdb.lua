@@ -68,11 +68,20 @@ end
 ---@async
 ---@param fname string full path to the source
 ---@param proxy Proxy connection to the side channel
----@return FileBreakpoints collection of actual breakpoints
-function C.query_breakpoints(fname, proxy)
+---@param gen any? generation of the breakpoints known for the file
+---@return FileBreakpoints? collection of actual breakpoints, nil if unchanged since gen
+---@return any? generation of the breakpoints if known by the helper
+function C.query_breakpoints(fname, proxy, gen)
   -- Query actual breakpoints for the given file.
   log.info("Query breakpoints for " .. fname)
 
+  -- The helper in the debugger process reads the breakpoints directly
+  local breaks = proxy:query('info-breakpoints ' .. fname .. ' ' .. (gen or '-'))
+  if type(breaks) == 'table' and breaks._gen ~= nil then
+    return C.filter_breakpoints(breaks)
+  end
+
+  -- Otherwise, list the breakpoints in the terminal
   local response = proxy:query('handle-command break')
   if response == nil or type(response) ~= 'string' or response == '' then
     return {}
@@ -4,14 +4,25 @@
 local log = require'nvimgdb.log'
 
 ---@alias FileBreakpoints table<number, string[]>    # breakpoint collection for a file {line -> [id]}
----@alias QueryBreakpoints function(fname: string, proxy: Proxy): FileBreakpoints  # Function to obtain a breakpoint collection
+---@alias QueryBreakpoints function(fname: string, proxy: Proxy, gen: any?): FileBreakpoints?, any?  # Function to obtain a breakpoint collection
+---@alias QueryBreakpointsMany function(fnames: string[], proxy: Proxy, gens: table<number, any>): table<number, FileBreakpoints?>, table<number, any>  # Function to obtain breakpoint collections for several files at once
+
+-- The breakpoint signs are extmarks in this namespace
+local ns = vim.api.nvim_create_namespace('NvimGdbBreakpoints')
+
+---@class BreakpointMark extmark showing breakpoints in a line
+---@field public id number extmark identifier
+---@field public idx number index of the sign GdbBreakpoint<idx> shown
 
 ---@class Breakpoint breakpoint signs handler
 ---@field private config Config resolved configuration
 ---@field private proxy Proxy connection to the side channel
 ---@field private query_impl QueryBreakpoints function to query breakpoints for a given file
+---@field private query_many_impl QueryBreakpointsMany? function to query breakpoints for several files in one go
+---@field private tabpage number tabpage of the debugging session
 ---@field private breaks table<string, FileBreakpoints> discovered breakpoints so far: {file -> {line -> [id]}}
----@field private max_sign_id number biggest sign identifier for the breakpoints in use
+---@field private gens table<string, any> generations of the discovered breakpoints reported by the side channel {file -> gen}
+---@field private placed table<number, table<string, BreakpointMark>> signs shown in the buffers {buf -> {line -> mark}}
 local Breakpoint = {}
 Breakpoint.__index = Breakpoint
 
@@ -19,75 +30,254 @@ Breakpoint.__index = Breakpoint
 ---@param config Config resolved configuration
 ---@param proxy Proxy @connection to the side channel
 ---@param query_impl QueryBreakpoints @function to query breakpoints
+---@param query_many_impl QueryBreakpointsMany? @function to query breakpoints for several files
 ---@return Breakpoint @new instance
-function Breakpoint.new(config, proxy, query_impl)
-  log.debug({"Breakpoint.new", query_impl = query_impl})
+function Breakpoint.new(config, proxy, query_impl, query_many_impl)
+  log.debug({"Breakpoint.new", query_impl = query_impl, query_many_impl = query_many_impl})
   local self = setmetatable({}, Breakpoint)
   self.config = config
   self.proxy = proxy
   self.query_impl = query_impl
+  self.query_many_impl = query_many_impl
+  self.tabpage = vim.api.nvim_get_current_tabpage()
   self.breaks = {}
-  self.max_sign_id = 0
+  self.gens = {}
+  self.placed = {}
   return self
 end
 
+---Get the source file of a buffer able to show breakpoints.
+---@param buf number buffer number
+---@return string? full path to the file, nil if not a loaded source buffer
+local function get_buf_file(buf)
+  if not vim.api.nvim_buf_is_loaded(buf) or vim.bo[buf].buftype ~= '' then
+    return nil
+  end
+  local fname = vim.api.nvim_buf_get_name(buf)
+  -- If no file name or a weird name with spaces, ignore it (to avoid
+  -- misinterpretation)
+  if fname == '' or fname:find(' ') ~= nil then
+    return nil
+  end
+  return fname
+end
+
 ---Clear all breakpoint signs in all buffers
 function Breakpoint:clear_signs()
   log.debug({"Breakpoint:clear_signs"})
-  -- Clear all breakpoint signs.
-  for i = 5000, self.max_sign_id do
-    vim.fn.sign_unplace('NvimGdb', {id = i})
+  for buf, _ in pairs(self.placed) do
+    if vim.api.nvim_buf_is_valid(buf) then
+      vim.api.nvim_buf_clear_namespace(buf, ns, 0, -1)
+    end
   end
-  self.max_sign_id = 0
+  self.placed = {}
 end
 
----Set a breakpoint sign in the given buffer
----@param buf number @buffer number
-function Breakpoint:_set_signs(buf)
-  log.debug({"Breakpoint:_set_signs", buf = buf})
-  if buf ~= -1 then
-    local sign_id = 5000 - 1
-    -- Breakpoints need full path to the buffer (at least in lldb)
-    local bpath = vim.fn.expand('#' .. tostring(buf) .. ':p')
-
-    local function _get_sign_name(idx)
-      local max_count = #self.config:get('sign_breakpoint')
-      if idx > max_count then
-        idx = max_count
-      end
-      return "GdbBreakpoint" .. tostring(idx)
+---Get the extmark options to show the signs like GdbBreakpoint<idx>.
+---The signs may have been redefined by the user, so they are looked up once per rendering.
+---@return fun(idx: number): table options of the extmark
+function Breakpoint:_get_sign_options()
+  local priority = self.config:get('sign_breakpoint_priority')
+  local cache = {}
+  return function(idx)
+    local opts = cache[idx]
+    if opts == nil then
+      local def = vim.fn.sign_getdefined('GdbBreakpoint' .. idx)[1] or {}
+      opts = {
+        sign_text = def.text or self.config:get('sign_breakpoint')[idx],
+        sign_hl_group = def.texthl,
+        number_hl_group = def.numhl,
+        line_hl_group = def.linehl,
+        priority = priority,
+      }
+      cache[idx] = opts
+    end
+    return opts
+  end
+end
+
+---Bring the signs in the buffer in line with the known breakpoints.
+---Only the lines whose breakpoints have changed are touched.
+---@param buf number buffer number
+---@param fname string full path to the file in the buffer
+---@param get_options fun(idx: number): table options of the extmarks
+---@return boolean true if the signs have been updated
+function Breakpoint:_render(buf, fname, get_options)
+  local placed = self.placed[buf] or {}
+  local for_file = self.breaks[fname] or {}
+  local changed = false
+
+  -- Remove the signs of the deleted breakpoints
+  for line, mark in pairs(placed) do
+    if for_file[line] == nil then
+      vim.api.nvim_buf_del_extmark(buf, ns, mark.id)
+      placed[line] = nil
+      changed = true
     end
+  end
 
-    local priority = self.config:get('sign_breakpoint_priority')
-    local for_file = self.breaks[bpath]
-    if for_file ~= nil then
-      for line, ids in pairs(for_file) do
-        if type(line) == "string" then
-          sign_id = sign_id + 1
-          local sign_name = _get_sign_name(#ids)
-          vim.fn.sign_place(sign_id, 'NvimGdb', sign_name, buf,
-            {lnum = line, priority = priority})
+  -- Show the new breakpoints and update the counts
+  local max_count = #self.config:get('sign_breakpoint')
+  for line, ids in pairs(for_file) do
+    if type(line) == "string" then
+      local idx = math.min(#ids, max_count)
+      local mark = placed[line]
+      if mark == nil or mark.idx ~= idx then
+        local opts = vim.tbl_extend('force', get_options(idx), {id = mark and mark.id or nil})
+        -- The line may be beyond the end of the buffer if the file has been changed
+        local ok, id = pcall(vim.api.nvim_buf_set_extmark, buf, ns, tonumber(line) - 1, 0, opts)
+        if ok then
+          placed[line] = {id = id, idx = idx}
+          changed = true
         end
       end
-      self.max_sign_id = sign_id
     end
   end
+
+  self.placed[buf] = next(placed) ~= nil and placed or nil
+  return changed
+end
+
+---Show the known breakpoints in every loaded buffer.
+---The buffers may be shown by other debugging sessions too, so nothing is
+---rendered while the tabpage of this session isn't current.
+---@return boolean true if the signs have been updated
+function Breakpoint:_render_all()
+  log.debug({"Breakpoint:_render_all"})
+  if vim.api.nvim_get_current_tabpage() ~= self.tabpage then
+    return false
+  end
+  -- Forget the signs of the unloaded buffers, they're gone with the text
+  for buf, _ in pairs(self.placed) do
+    if not vim.api.nvim_buf_is_loaded(buf) then
+      self.placed[buf] = nil
+    end
+  end
+
+  local get_options = self:_get_sign_options()
+  local changed = false
+  for _, buf in ipairs(vim.api.nvim_list_bufs()) do
+    local fname = get_buf_file(buf)
+    if fname ~= nil and (self.breaks[fname] ~= nil or self.placed[buf] ~= nil) then
+      changed = self:_render(buf, fname, get_options) or changed
+    end
+  end
+  return changed
+end
+
+---Remember the breakpoints obtained for the given file.
+---@param fname string full path to the source code file
+---@param breaks FileBreakpoints? actual breakpoints in the file, nil if unchanged since the known generation
+---@param gen any? generation of the breakpoints reported by the side channel
+function Breakpoint:_store(fname, breaks, gen)
+  if breaks == nil then
+    if self.breaks[fname] ~= nil then
+      -- Nothing has changed since the known generation
+      return
+    end
+    -- Nothing to reuse, ask for the complete set next time
+    breaks = {}
+    gen = nil
+  end
+  self.breaks[fname] = breaks
+  self.gens[fname] = gen
 end
 
 ---Query actual breakpoints for the given file.
----@param buf_num number buffer number
+---@async
 ---@param fname string full path to the source code file
-function Breakpoint:query(buf_num, fname)
-  log.info({"Breakpoint:query(", buf_num = buf_num, fname = fname})
-  self.breaks[fname] = self.query_impl(fname, self.proxy)
-  self:clear_signs()
-  self:_set_signs(buf_num)
+---@return boolean true if the signs have been updated
+function Breakpoint:query(fname)
+  log.info({"Breakpoint:query", fname = fname})
+  self:_store(fname, self.query_impl(fname, self.proxy, self.gens[fname]))
+  return self:_render_all()
+end
+
+---Query actual breakpoints for all the files loaded in the buffers,
+---or only for the visible ones if they can't be queried at once.
+---@async
+---@param prefetched PrefetchedBreakpoints? breakpoints already obtained from the side channel
+---@return boolean true if the signs have been updated
+function Breakpoint:query_all(prefetched)
+  log.info({"Breakpoint:query_all", prefetched = prefetched})
+  local fnames = {}
+  local seen = {}
+  if prefetched ~= nil then
+    -- No need to ask again
+    self:_store(prefetched.fname, prefetched.breaks, prefetched.gen)
+    seen[prefetched.fname] = true
+  end
+  local bufs
+  if self.query_many_impl ~= nil then
+    bufs = vim.api.nvim_list_bufs()
+  else
+    -- Every file costs a round trip: only the visible ones are queried,
+    -- the rest will be queried by show() when entered.
+    bufs = {}
+    for _, win in ipairs(vim.api.nvim_tabpage_list_wins(self.tabpage)) do
+      bufs[#bufs + 1] = vim.api.nvim_win_get_buf(win)
+    end
+  end
+  for _, buf in ipairs(bufs) do
+    local fname = get_buf_file(buf)
+    if fname ~= nil and not seen[fname] then
+      seen[fname] = true
+      fnames[#fnames + 1] = fname
+    end
+  end
+  -- The files not queried won't be kept up to date, forget them
+  for fname, _ in pairs(self.breaks) do
+    if not seen[fname] then
+      self.breaks[fname] = nil
+      self.gens[fname] = nil
+    end
+  end
+
+  if #fnames > 0 then
+    local gens = {}
+    for i, fname in ipairs(fnames) do
+      gens[i] = self.gens[fname]
+    end
+    local breaks = {}
+    local new_gens = {}
+    if self.query_many_impl ~= nil then
+      breaks, new_gens = self.query_many_impl(fnames, self.proxy, gens)
+    else
+      for i, fname in ipairs(fnames) do
+        breaks[i], new_gens[i] = self.query_impl(fname, self.proxy, gens[i])
+      end
+    end
+    for i, fname in ipairs(fnames) do
+      self:_store(fname, breaks[i], new_gens[i])
+    end
+  end
+  return self:_render_all()
+end
+
+---Show the known breakpoints, query them if the file hasn't been seen yet.
+---@async
+---@param fname string? full path to the source code file just shown
+---@return boolean true if the signs have been updated
+function Breakpoint:show(fname)
+  log.debug({"Breakpoint:show", fname = fname})
+  if fname ~= nil and self.breaks[fname] == nil then
+    return self:query(fname)
+  end
+  return self:_render_all()
+end
+
+---Get the generation of the breakpoints known for the given file.
+---@param fname string full path to the source code file
+---@return any? generation reported by the side channel
+function Breakpoint:get_gen(fname)
+  return self.gens[fname]
 end
 
 ---Reset all known breakpoints and their signs.
 function Breakpoint:reset_signs()
   log.debug({"Breakpoint:reset_signs"})
   self.breaks = {}
+  self.gens = {}
   self:clear_signs()
 end
 
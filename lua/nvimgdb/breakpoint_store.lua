@@ -0,0 +1,228 @@
+-- Keep the breakpoints between the debugging sessions.
+-- vim: set et ts=2 sw=2:
+
+local log = require'nvimgdb.log'
+local utils = require'nvimgdb.utils'
+
+-- The requests are kept below the size of a datagram
+local MAX_REQUEST_SIZE = 32768
+
+---@class BreakpointStore breakpoints stored per project and executable
+---@field private proxy Proxy connection to the side channel
+---@field private backend Backend debugger specifics
+---@field private dir string directory with the stored breakpoints
+---@field private project string working directory of the session
+---@field private executable string? program the breakpoints have been restored for
+---@field private gen any? generation of the breakpoints stored last
+---@field private saved string? content of the file written last
+---@field private pending {[1]: string, [2]: string}[] stored locations not listed by the debugger yet: [location, key]
+local BreakpointStore = {}
+BreakpointStore.__index = BreakpointStore
+
+---Constructor
+---@param config Config resolved configuration
+---@param proxy Proxy connection to the side channel
+---@param backend Backend debugger specifics
+---@return BreakpointStore new instance
+function BreakpointStore.new(config, proxy, backend)
+  log.debug({"BreakpointStore.new"})
+  local self = setmetatable({}, BreakpointStore)
+  self.proxy = proxy
+  self.backend = backend
+  local dir = config:get('persist_breakpoints')
+  if type(dir) ~= 'string' then
+    dir = utils.path_join(vim.fn.stdpath('data'), 'nvimgdb', 'breakpoints')
+  end
+  self.dir = dir
+  self.project = vim.fn.getcwd()
+  self.executable = nil
+  self.gen = nil
+  self.saved = nil
+  self.pending = {}
+  return self
+end
+
+---Get the file with the breakpoints of the executable in the project.
+---@param executable string full path to the program
+---@return string path to the file
+function BreakpointStore:_get_path(executable)
+  local key = vim.fn.sha256(self.project .. '\n' .. executable):sub(1, 32)
+  return utils.path_join(self.dir, key .. '.json')
+end
+
+---Read the breakpoints stored for the executable.
+---@param executable string full path to the program
+---@return StoredBreakpoints? breakpoints, nil if nothing stored
+function BreakpointStore:_load(executable)
+  local file = io.open(self:_get_path(executable), 'r')
+  if file == nil then
+    return nil
+  end
+  local content = file:read('*a')
+  file:close()
+  local ok, stored = pcall(vim.json.decode, content)
+  if not ok or type(stored) ~= 'table' then
+    log.error({"Can't read the stored breakpoints", executable = executable, err = stored})
+    return nil
+  end
+  self.saved = content
+  return stored
+end
+
+---Write the breakpoints of the executable unless they're stored already.
+---@param listing BreakpointListing actual breakpoints
+function BreakpointStore:_save(listing)
+  local path = self:_get_path(listing.executable)
+  if #listing.breakpoints == 0 and #listing.disabled == 0 then
+    if self.saved ~= nil then
+      os.remove(path)
+      self.saved = nil
+    end
+    return
+  end
+  local content = vim.json.encode({
+    project = self.project,
+    executable = listing.executable,
+    breakpoints = listing.breakpoints,
+    disabled = listing.disabled,
+  })
+  if content == self.saved then
+    return
+  end
+  vim.fn.mkdir(self.dir, 'p')
+  local file = io.open(path, 'w')
+  if file == nil then
+    log.error({"Can't store the breakpoints", path = path})
+    return
+  end
+  file:write(content)
+  file:close()
+  self.saved = content
+end
+
+---Add the stored locations that the debugger hasn't listed since the restoring.
+---They may be unresolved yet or the restoring may have failed, but the user
+---hasn't deleted them, so they must stay in the store.
+---@param listing BreakpointListing actual breakpoints
+---@return BreakpointListing breakpoints to store
+function BreakpointStore:_add_pending(listing)
+  if #self.pending == 0 then
+    return listing
+  end
+  local listed = {}
+  local result = {executable = listing.executable}
+  for _, key in ipairs({'breakpoints', 'disabled'}) do
+    result[key] = {}
+    for _, location in ipairs(listing[key] or {}) do
+      listed[location] = true
+      table.insert(result[key], location)
+    end
+  end
+  local pending = {}
+  for _, entry in ipairs(self.pending) do
+    -- Once listed, the location is up to the debugger and the user
+    if not listed[entry[1]] then
+      pending[#pending + 1] = entry
+      table.insert(result[entry[2]], entry[1])
+    end
+  end
+  self.pending = pending
+  return result
+end
+
+---Set the stored breakpoints in the debugger.
+---The locations are sent in as few requests as fit into a datagram.
+---@async
+---@param stored StoredBreakpoints breakpoints to restore
+---@return number count of the breakpoints set
+function BreakpointStore:_restore(stored)
+  local count = 0
+  local chunk = {}
+  local size = 0
+
+  local function flush()
+    if next(chunk) ~= nil then
+      local restored, failed = self.backend.restore_breakpoints(self.proxy, chunk)
+      count = count + restored
+      if failed ~= nil and #failed > 0 then
+        log.warn({"Can't restore breakpoints", failed})
+      end
+    end
+    chunk = {}
+    size = 0
+  end
+
+  for _, key in ipairs({'breakpoints', 'disabled'}) do
+    for _, location in ipairs(stored[key] or {}) do
+      if size + #location > MAX_REQUEST_SIZE then
+        flush()
+      end
+      local list = chunk[key]
+      if list == nil then
+        list = {}
+        chunk[key] = list
+      end
+      list[#list + 1] = location
+      size = size + #location + 3
+    end
+  end
+  flush()
+  return count
+end
+
+---Get the generation of the breakpoints stored last to list them only if changed.
+---@return any? generation reported by the side channel
+function BreakpointStore:get_gen()
+  return self.gen
+end
+
+---Bring the stored breakpoints and the debugger in sync: restore them
+---once the executable is known, and then save whenever they change.
+---@async
+---@param listed any? response to breakpoints-list since get_gen() received along with other data
+---@return boolean true if some breakpoints have been restored
+function BreakpointStore:sync(listed)
+  log.debug({"BreakpointStore:sync", listed = listed})
+  local listing, gen
+  if listed ~= nil then
+    listing, gen = self.backend.filter_breakpoint_listing(listed, self.gen)
+  else
+    listing, gen = self.backend.list_breakpoints(self.proxy, self.gen)
+  end
+  if listing == nil then
+    -- Nothing has changed
+    return false
+  end
+  local executable = listing.executable
+  if type(executable) ~= 'string' or executable == '' then
+    -- Nothing to associate the breakpoints with yet
+    return false
+  end
+
+  if executable ~= self.executable then
+    -- A new program: the breakpoints stored for it come first
+    self.executable = executable
+    self.saved = nil
+    self.pending = {}
+    local stored = self:_load(executable)
+    if stored ~= nil then
+      for _, key in ipairs({'breakpoints', 'disabled'}) do
+        for _, location in ipairs(stored[key] or {}) do
+          self.pending[#self.pending + 1] = {location, key}
+        end
+      end
+      local count = self:_restore(stored)
+      log.info({"Restored breakpoints", executable = executable, count = count})
+      -- The listing predates the restoring, it mustn't replace the store
+      -- even if the restoring has failed. List anew on the next prompt.
+      self.gen = nil
+      return count > 0
+    end
+  end
+
+  self.gen = gen
+  self:_save(self:_add_pending(listing))
+  return false
+end
+
+return BreakpointStore
@@ -12,7 +12,7 @@ local utils = require'nvimgdb.utils'
 ---@field private is_active boolean true if the debugger has been launched
 ---@field private has_interacted boolean true if the debugger was interactive
 ---@field private tmp_dir string temporary directory for the proxy address
----@field private proxy_addr string path to the file with proxy port
+---@field private proxy_addr string path to the file with proxy port or "unix:<path>" to the socket
 ---@field private command string[] complete command to launch the debugger (including proxy)
 ---@field private client_buf number terminal buffer handler
 ---@field private buf_hidden_auid number autocmd id of the BufHidden handler
@@ -37,6 +37,10 @@ function Client.new(config, backend, client_cmd)
   -- Create a temporary unique directory for all the sockets.
   self.tmp_dir = uv.fs_mkdtemp(uv.os_tmpdir() .. '/nvimgdb-XXXXXX')
   self.proxy_addr = utils.path_join(self.tmp_dir, 'port')
+  if config:get('side_channel') == 'unix' and backend.supports_unix_side_channel
+    and not utils.is_windows then
+    self.proxy_addr = 'unix:' .. utils.path_join(self.tmp_dir, 'sock')
+  end
 
   -- Prepare the debugger command to run
   self.command = backend.get_launch_cmd(client_cmd, self.tmp_dir, self.proxy_addr)
@@ -32,6 +32,8 @@ local default = {
   set_scroll_off      = 5,
   jump_bottom_gdb_buf = true,
   sticky_dbg_buf      = true,
+  side_channel        = 'udp',             -- 'unix' for a Unix-domain socket if supported by the backend
+  persist_breakpoints = false,             -- true or a directory to keep the breakpoints between the sessions
 }
 
 ---Turn a string into a funcref looking up a Vim function.
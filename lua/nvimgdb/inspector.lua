@@ -0,0 +1,188 @@
+-- Browsing structured values page by page.
+-- vim: set et ts=2 sw=2:
+
+local log = require'nvimgdb.log'
+
+-- Count of children to query at once
+local PAGE_SIZE = 50
+
+---@class InspectorNode value described by the side channel
+---@field name string expression or child name
+---@field type string? type of the value
+---@field value string? bounded summary of the value
+---@field handle any? identifier to query the children, nil if there are none
+
+---@class InspectorChildren page of the children
+---@field children InspectorNode[] the children starting from the requested offset
+---@field more boolean true if there are more children
+
+---@class InspectorRow line in the inspector buffer
+---@field depth number nesting level
+---@field node InspectorNode? value shown in the line
+---@field expanded boolean? true if the children are shown below
+---@field more {handle: any, offset: number}? the next page to load if the line is a placeholder
+
+---@class Inspector value browser in a buffer
+---@field private backend Backend debugger backend
+---@field private proxy Proxy connection to the side channel
+---@field private buf number buffer to show the value in
+---@field private rows InspectorRow[] description of the buffer lines
+---@field private is_busy boolean true while waiting for the side channel
+local Inspector = {}
+Inspector.__index = Inspector
+
+---Constructor
+---@param backend Backend debugger backend
+---@param proxy Proxy connection to the side channel
+---@param buf number buffer to show the value in
+---@return Inspector new instance
+function Inspector.new(backend, proxy, buf)
+  log.debug({"Inspector.new", buf = buf})
+  local self = setmetatable({}, Inspector)
+  self.backend = backend
+  self.proxy = proxy
+  self.buf = buf
+  self.rows = {}
+  self.is_busy = false
+
+  vim.keymap.set('n', '<cr>', function()
+    self:activate(vim.fn.line('.'))
+  end, {buffer = buf, silent = true, desc = 'Expand/collapse the value or load more children'})
+  return self
+end
+
+---@param row InspectorRow
+---@return string text of the line
+local function format_row(row)
+  local indent = string.rep('  ', row.depth)
+  if row.more ~= nil then
+    return indent .. '  ...'
+  end
+  local node = row.node
+  local marker = '  '
+  if node.handle ~= nil then
+    marker = row.expanded and '- ' or '+ '
+  end
+  local text = indent .. marker .. node.name
+  if node.value ~= nil then
+    text = text .. ' = ' .. node.value:gsub('[\r\n]+', ' ')
+  end
+  return text
+end
+
+---Replace the rows first..last with the new ones.
+---@param first number index of the first row to replace
+---@param last number index of the last row to replace, first - 1 to insert
+---@param rows InspectorRow[] the new rows
+function Inspector:_replace(first, last, rows)
+  local new_rows = {}
+  for i = 1, first - 1 do
+    new_rows[#new_rows + 1] = self.rows[i]
+  end
+  local lines = {}
+  for _, row in ipairs(rows) do
+    new_rows[#new_rows + 1] = row
+    lines[#lines + 1] = format_row(row)
+  end
+  for i = last + 1, #self.rows do
+    new_rows[#new_rows + 1] = self.rows[i]
+  end
+  local was_empty = #self.rows == 0
+  self.rows = new_rows
+
+  -- The buffer may have been unloaded already
+  if not vim.api.nvim_buf_is_loaded(self.buf) then
+    return
+  end
+  vim.bo[self.buf].modifiable = true
+  if was_empty then
+    vim.api.nvim_buf_set_lines(self.buf, 0, -1, false, lines)
+  else
+    vim.api.nvim_buf_set_lines(self.buf, first - 1, last, false, lines)
+  end
+  vim.bo[self.buf].modifiable = false
+end
+
+---Show the value of the expression.
+---@async
+---@param expr string expression to evaluate
+function Inspector:load(expr)
+  log.debug({"Inspector:load", expr = expr})
+  local node, err = self.backend.inspect(self.proxy, expr)
+  if node == nil then
+    node = {name = expr, value = '<' .. (err or 'unavailable') .. '>'}
+  end
+  self:_replace(1, #self.rows, {{depth = 0, node = node, expanded = false}})
+end
+
+---Expand or collapse the value in the line, or load the next page of children.
+---@param lnum number line number in the buffer
+function Inspector:activate(lnum)
+  log.debug({"Inspector:activate", lnum = lnum})
+  local row = self.rows[lnum]
+  if row == nil or self.is_busy then
+    return
+  end
+  if row.more ~= nil then
+    self:_load_page(lnum, 1, row.depth, row.more.handle, row.more.offset)
+  elseif row.node.handle ~= nil then
+    if row.expanded then
+      -- Drop all the descendants
+      local last = lnum
+      while self.rows[last + 1] ~= nil and self.rows[last + 1].depth > row.depth do
+        last = last + 1
+      end
+      row.expanded = false
+      self:_replace(lnum, last, {row})
+    else
+      row.expanded = true
+      self:_replace(lnum, lnum, {row})
+      self:_load_page(lnum + 1, 0, row.depth + 1, row.node.handle, 0)
+    end
+  end
+end
+
+---Query a page of children and put them in place of count rows from pos.
+---@param pos number index of the first row to replace
+---@param count number count of rows to replace, 0 to insert
+---@param depth number nesting level of the children
+---@param handle any identifier of the parent value
+---@param offset number index of the first child to query
+function Inspector:_load_page(pos, count, depth, handle, offset)
+  self.is_busy = true
+  local function load()
+    local page, err = self.backend.inspect_children(self.proxy, handle, offset, PAGE_SIZE)
+    local rows = {}
+    if page == nil then
+      rows[1] = {depth = depth, node = {name = '<' .. (err or 'unavailable') .. '>'}}
+    else
+      for _, child in ipairs(page.children) do
+        rows[#rows + 1] = {depth = depth, node = child, expanded = false}
+      end
+      if page.more then
+        rows[#rows + 1] = {depth = depth, more = {handle = handle, offset = offset + #page.children}}
+      end
+    end
+    self:_replace(pos, pos + count - 1, rows)
+  end
+  local function on_error(err)
+    -- Don't leave the inspector busy forever
+    self.is_busy = false
+    log.error({"Inspector:_load_page", err = err})
+    vim.notify("Failed to load the children: " .. tostring(err), vim.log.levels.ERROR)
+  end
+  local ok, err = coroutine.resume(coroutine.create(function()
+    -- The coroutine may also fail after having been resumed by the proxy
+    local loaded, load_err = pcall(load)
+    if not loaded then
+      on_error(load_err)
+      return
+    end
+    self.is_busy = false
+  end))
+  if not ok then
+    on_error(err)
+  end
+end
+
+return Inspector
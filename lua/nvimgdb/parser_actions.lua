@@ -6,18 +6,24 @@ local log = require 'nvimgdb.log'
 ---@class ParserActions @parser callbacks handler
 ---@field private cursor Cursor @current line sign handler
 ---@field private win Win @jump window manager
+---@field private breakpoint Breakpoint @breakpoint sign manager
+---@field private breakpoint_store BreakpointStore? @breakpoints kept between the sessions
 local ParserActions = {}
 ParserActions.__index = ParserActions
 
 ---Constructor
 ---@param cursor Cursor
 ---@param win Win
+---@param breakpoint Breakpoint
+---@param breakpoint_store BreakpointStore?
 ---@return ParserActions
-function ParserActions.new(cursor, win)
+function ParserActions.new(cursor, win, breakpoint, breakpoint_store)
   log.debug({"ParserActions.new"})
   local self = setmetatable({}, ParserActions)
   self.cursor = cursor
   self.win = win
+  self.breakpoint = breakpoint
+  self.breakpoint_store = breakpoint_store
   return self
 end
 
@@ -37,13 +43,47 @@ function ParserActions:jump_to_source(fname, line)
   vim.api.nvim_command("doautocmd User NvimGdbBreak")
 end
 
+---Get the file displayed in the jump window.
+---@return string? full path to the source file if breakpoints can be queried for it
+---@return any? generation of the breakpoints known for the file
+function ParserActions:get_shown_file()
+  log.debug({"ParserActions:get_shown_file"})
+  local _, fname = self.win:get_jump_file()
+  if fname == nil then
+    return nil, nil
+  end
+  return fname, self.breakpoint:get_gen(fname)
+end
+
+---Check whether the breakpoints are kept between the sessions.
+---@return boolean true if the breakpoints are stored
+---@return any? generation of the breakpoints stored last
+function ParserActions:get_stored_gen()
+  if self.breakpoint_store == nil then
+    return false, nil
+  end
+  return true, self.breakpoint_store:get_gen()
+end
+
 ---It's high time to query actual breakpoints.
 ---@async
-function ParserActions:query_breakpoints()
-  log.debug({"ParserActions:query_breakpoints"})
-  self.win:query_breakpoints()
+---@param prefetched PrefetchedBreakpoints? breakpoints already obtained from the side channel
+---@param listed any? response to breakpoints-list since get_stored_gen() obtained along with them
+function ParserActions:query_breakpoints(prefetched, listed)
+  log.debug({"ParserActions:query_breakpoints", prefetched = prefetched, listed = listed})
+  if self.breakpoint_store ~= nil and self.breakpoint_store:sync(listed) then
+    -- The restored breakpoints are shown with the rest in one go
+    prefetched = nil
+  end
+  self.win:query_breakpoints(prefetched)
   -- Execute the rest of custom commands
   vim.api.nvim_command("doautocmd User NvimGdbQuery")
 end
 
+---The output has started or stopped flooding, see ParserImpl:is_flooding().
+function ParserActions:output_flood_changed()
+  log.debug({"ParserActions:output_flood_changed"})
+  vim.api.nvim_command("doautocmd User NvimGdbFlood")
+end
+
 return ParserActions
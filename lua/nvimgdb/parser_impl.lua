@@ -3,15 +3,40 @@
 
 local log = require'nvimgdb.log'
 
+-- Only the tail of the unparsed output is kept: the transitions are looked
+-- for in the latest lines, the rest is the program output.
+local BUFFER_WINDOW = 65536
+-- Longest match expected: the search is resumed this far behind the
+-- position where it stopped last time not to miss a match split by chunks.
+local MATCH_LOOKBEHIND = 4096
+-- The debugger may not have finished printing yet: parse this many
+-- milliseconds after the output arrived.
+local PARSE_DELAY = 50
+-- Output faster than this (bytes per millisecond) is a flood from the program
+local FLOOD_RATE = 512
+-- The rate must stay high for this many parsings in a row to start a flood,
+-- so that a single large reply of the debugger doesn't, and must drop below
+-- the half of FLOOD_RATE to end it.
+local FLOOD_PARSINGS = 10
+-- During a flood, parsing is deferred longer and the output scanned already
+-- is dropped: the state can't change until the program stops.
+local FLOOD_DELAY = 250
+
 ---@class ParserImpl base parser implementation
 ---@field protected actions ParserActions parser callbacks
 ---@field protected running ParserState running state transitions
 ---@field protected paused ParserState paused state transitions
 ---@field protected state ParserState current state (either running or paused)
----@field private buffer string debugger output collected so far
+---@field private buffer string tail of the debugger output not consumed by the transitions
+---@field private scanned table<ParserTransition, number> buffer position each matcher has found nothing up to
+---@field private pending_escape string incomplete control sequence at the end of the last chunk
 ---@field private byte_count number monotonously increasing processed byte counter
----@field private parsing_progress number[] ordered byte counters to ensure parsing in the right order
----@field private timers table<unknown, boolean> scheduled timers
+---@field private timer unknown? the timer to parse the output after a delay, nil after cleanup
+---@field private parse_mark number? byte count up to which the output can be parsed when the timer fires, nil if idle
+---@field private rate_mark number byte count at the previous parsing to measure the output rate
+---@field private rate_time number time of the previous parsing in milliseconds
+---@field private fast_parsings number count of the parsings in a row with the output rate above FLOOD_RATE
+---@field private flooding boolean true if the output is coming too fast to be parsed timely
 ---@field private output_is_still boolean true if no new output when parsing is delayed
 local ParserImpl = {}
 ParserImpl.__index = ParserImpl
@@ -26,20 +51,26 @@ function ParserImpl:_init(actions)
   -- Current state (either self.running or self.paused)
   self.state = self.paused
   self.buffer = '\n'
+  self.scanned = {}
+  self.pending_escape = ''
   self.byte_count = 1
-  self.parsing_progress = {}
-  self.timers = {}
+  self.timer = vim.loop.new_timer()
+  self.parse_mark = nil
+  self.rate_mark = self.byte_count
+  self.rate_time = vim.loop.now()
+  self.fast_parsings = 0
+  self.flooding = false
   self.output_is_still = false
 end
 
 ---Destructor
 function ParserImpl:cleanup()
-  -- Stop the remaining timers
-  for timer, _ in pairs(self.timers) do
-    timer:stop()
-    timer:close()
+  if self.timer ~= nil then
+    self.timer:stop()
+    self.timer:close()
+    self.timer = nil
   end
-  self.timers = {}
+  self.parse_mark = nil
 end
 
 ---@alias ParserState ParserTransition[]
@@ -133,36 +164,71 @@ end
 function ParserImpl:feed(lines)
   log.debug({"ParserImpl:feed", line = lines})
   self.output_is_still = false
+  local parts = {self.pending_escape}
   local nl = ''
   for i, line in ipairs(lines) do
     if i == 1 and line == '' then
       nl = '\n'
     end
-    -- Filter out control sequences
-    line = line:gsub('\x1B[@-_][0-?]*[ -/]*[@-~]', '')
-
-    self.buffer = self.buffer .. nl .. line
-    self.byte_count = self.byte_count + #nl + #line
+    parts[#parts + 1] = nl
+    parts[#parts + 1] = line
     nl = '\n'
-    log.debug({"buffer", self.buffer})
-  end
-  self.parsing_progress[#self.parsing_progress + 1] = self.byte_count
-  self:_delay_parsing(50, self.byte_count)
-end
-
----@param delay_ms number number of milliseconds to wait before parsing
----@param byte_count number byte mark to allow parsing up to when the delay elapses
-function ParserImpl:_delay_parsing(delay_ms, byte_count)
-  log.debug({"ParserImpl:_delay_parsing", delay_ms = delay_ms, byte_count = byte_count})
-  local timer = vim.loop.new_timer()
-  self.timers[timer] = true
-  timer:start(delay_ms, 0, vim.schedule_wrap(function()
-    if self.timers[timer] ~= nil then
-      self.timers[timer] = nil
-      timer:stop()
-      timer:close()
-      self:delay_elapsed(byte_count)
+  end
+  -- Filter out control sequences in the whole chunk at once, they never
+  -- span lines. A sequence cut by the end of the chunk is completed by the next one.
+  local chunk = table.concat(parts):gsub('\x1B[@-_][0-?]*[ -/]*[@-~]', '')
+  self.pending_escape = ''
+  local esc = chunk:find('\x1B[^\x1B]*$')
+  if esc ~= nil and #chunk - esc < 16 then
+    local tail = chunk:sub(esc)
+    if tail == '\x1B' or tail:find('^\x1B[@-_][0-?]*[ -/]*$') then
+      self.pending_escape = tail
+      chunk = chunk:sub(1, esc - 1)
+    end
+  end
+
+  self.buffer = self.buffer .. chunk
+  self.byte_count = self.byte_count + #chunk
+  log.debug({"chunk", chunk})
+  self:_trim(BUFFER_WINDOW)
+  -- The output arriving before the timer fires is coalesced
+  if self.parse_mark == nil then
+    self:_delay_parsing()
+  end
+end
+
+---Keep only the tail of the buffer.
+---@param size number count of bytes to keep at most
+function ParserImpl:_trim(size)
+  if #self.buffer > size then
+    local cut = #self.buffer - size
+    self.buffer = self.buffer:sub(cut + 1)
+    for mf, pos in pairs(self.scanned) do
+      self.scanned[mf] = pos - cut
     end
+  end
+end
+
+---Drop the output that all the matchers of the current state have scanned already.
+---The lookbehind is kept not to miss a match split by chunks.
+function ParserImpl:_trim_scanned()
+  local scanned = #self.buffer + 1
+  for _, mf in ipairs(self.state) do
+    scanned = math.min(scanned, self.scanned[mf] or 1)
+  end
+  self:_trim(#self.buffer + 1 - scanned + MATCH_LOOKBEHIND)
+end
+
+---Arm the timer to parse the output received so far.
+function ParserImpl:_delay_parsing()
+  if self.timer == nil then
+    return
+  end
+  local delay_ms = self.flooding and FLOOD_DELAY or PARSE_DELAY
+  log.debug({"ParserImpl:_delay_parsing", delay_ms = delay_ms, byte_count = self.byte_count})
+  self.parse_mark = self.byte_count
+  self.timer:start(delay_ms, 0, vim.schedule_wrap(function()
+    self:delay_elapsed()
   end))
 end
 
@@ -180,13 +246,18 @@ function ParserImpl:_search(ignore_tail_bytes)
   end
   -- If there is a matcher matching the line, call its handler.
   for _, mf in ipairs(self.state) do
-    local b, e, m1, m2 = self.buffer:find(mf.matcher)
-    if b ~= nil then
+    -- Skip the output already scanned by the matcher
+    local init = math.max(1, (self.scanned[mf] or 1) - MATCH_LOOKBEHIND)
+    local b, e, m1, m2 = self.buffer:find(mf.matcher, init)
+    if b == nil then
+      self.scanned[mf] = #self.buffer + 1
+    else
       if #self.buffer - e < ignore_tail_bytes then
         -- Wait a bit longer, the next timer is pending
         return false
       end
       self.buffer = self.buffer:sub(e + 1)
+      self.scanned = {}
       log.debug("prev state: " .. self:_get_state_name())
       self.state = mf.handler(self, m1, m2)
       log.info("new state: " .. self:_get_state_name())
@@ -197,21 +268,46 @@ function ParserImpl:_search(ignore_tail_bytes)
 end
 
 ---Grace period elapsed, can search for a transition from the current state.
----@param byte_count number byte mark up to which can search
-function ParserImpl:delay_elapsed(byte_count)
+function ParserImpl:delay_elapsed()
+  local byte_count = self.parse_mark
   log.debug({"ParserImpl:delay_elapsed", byte_count = byte_count})
-  if self.parsing_progress[1] ~= byte_count then
-    -- Another parsing is already in progress, return to this mark later
-    self:_delay_parsing(1, byte_count)
+  if byte_count == nil then
+    -- Cleaned up already
     return
   end
-  -- Detect whether new input has been received before the previous
-  -- delay elapsed.
+  self.parse_mark = nil
+
+  local now = vim.loop.now()
+  local rate = (self.byte_count - self.rate_mark) / math.max(1, now - self.rate_time)
+  self.rate_mark = self.byte_count
+  self.rate_time = now
+  self.fast_parsings = rate > FLOOD_RATE and self.fast_parsings + 1 or 0
+  if self.flooding then
+    self:_set_flooding(rate > FLOOD_RATE / 2)
+  else
+    self:_set_flooding(self.fast_parsings >= FLOOD_PARSINGS)
+  end
+
+  -- Detect whether new input has been received before the delay elapsed.
   local ignore_tail_bytes = self.byte_count - byte_count
   while self:_search(ignore_tail_bytes) do
   end
-  -- Pop the current mark allowing parsing the next chunk
-  table.remove(self.parsing_progress, 1)
+  if self.flooding then
+    self:_trim_scanned()
+  end
+  if ignore_tail_bytes > 0 then
+    -- Return to the fresh output later
+    self:_delay_parsing()
+  end
+end
+
+---@param flooding boolean new flood mode
+function ParserImpl:_set_flooding(flooding)
+  if flooding ~= self.flooding then
+    log.info({"ParserImpl:_set_flooding", flooding = flooding})
+    self.flooding = flooding
+    self.actions:output_flood_changed()
+  end
 end
 
 ---Return true if the output has paused for a while
@@ -220,4 +316,11 @@ function ParserImpl:is_still()
   return self.output_is_still
 end
 
+---Return true if the program output is too fast to be parsed timely,
+---and the parsing is throttled.
+---@return boolean true if the output is flooding
+function ParserImpl:is_flooding()
+  return self.flooding
+end
+
 return ParserImpl
@@ -4,14 +4,61 @@
 local log = require'nvimgdb.log'
 local uv = vim.loop
 
+-- Time to wait for a response (or its next chunk) in milliseconds
+-- until the latency of the request kind has been observed
+local RESPONSE_TIMEOUT = 500
+-- Bounds of the timeouts adapted to the observed latency
+local MIN_TIMEOUT = 100
+local MAX_TIMEOUT = 5000
+-- Times to resend a request that doesn't change anything in the debugger
+-- if the datagram seems to be lost, the timeout doubles every time.
+local MAX_RETRIES = 2
+-- Requests that can be safely repeated
+local IDEMPOTENT_REQUESTS = {
+  ['info-breakpoints'] = true,
+  ['get-process-state'] = true,
+  ['get-current-frame-location'] = true,
+  ['get-backtrace'] = true,
+  ['inspect-children'] = true,
+  ['get-watches'] = true,
+  ['breakpoints-list'] = true,
+  ['register-watch'] = true,
+}
+
+---@class ProxyRequest request waiting for the response
+---@field co thread coroutine to resume with the response
+---@field data string the request as sent
+---@field kind string request kind to track the latency of
+---@field can_retry boolean true if the request can be resent
+---@field retries number count of times the request has been resent
+---@field timeout number current timeout in milliseconds
+---@field sent_time number time of the first sending
+---@field deadline number time to give up waiting or resend
+---@field chunks string[]? received chunks of a large response
+---@field chunks_received number? count of the received chunks
+
+---@class ProxyLatency smoothed latency of a request kind
+---@field srtt number smoothed round trip time in milliseconds
+---@field rttvar number round trip time variation
+
 ---@class Proxy proxy to the side channel
 ---@field private client Client debugger terminal job
----@field private proxy_addr string path to the file with proxy port
----@field private sock any UDP socket used to communicate with the proxy
+---@field private proxy_addr string path to the file with proxy port or "unix:<path>" to the socket
+---@field private socket_path string? path to the Unix-domain socket if used instead of UDP
+---@field private sock any UDP socket or pipe used to communicate with the proxy
 ---@field private server_port number UDP port of the proxy
+---@field private is_connected boolean true if the pipe has been connected
+---@field private is_connecting boolean true while the pipe is being connected
+---@field private pieces string[] data received from the pipe not processed yet
+---@field private pieces_size number total length of the pieces
+---@field private frame_size number? size of the frame being received from the pipe
 ---@field private request_id number sequential request number
----@field private responses table<number, any> received responses
+---@field private responses table<number, ProxyRequest> requests waiting for the responses
 ---@field private responses_size number count of responses being waited
+---@field private timer any the timer shared by all the requests, fires at the earliest deadline
+---@field private timer_due number? time the timer is armed for
+---@field private latency table<string, ProxyLatency> observed latency of the request kinds
+---@field private event_handlers table<string, function> handlers of the notifications pushed by the proxy
 local Proxy = {}
 Proxy.__index = Proxy
 
@@ -23,9 +70,21 @@ function Proxy.new(client)
   local self = setmetatable({}, Proxy)
   self.client = client
   self.proxy_addr = client:get_proxy_addr()
+  self.socket_path = self.proxy_addr:match('^unix:(.+)$')
 
-  self.sock = assert(uv.new_udp())
-  assert(self.sock:bind("127.0.0.1", 0))
+  if self.socket_path ~= nil then
+    self.sock = assert(uv.new_pipe(false))
+    self.is_connected = false
+    self.is_connecting = false
+    self.pieces = {}
+    self.pieces_size = 0
+    self.frame_size = nil
+  else
+    self.sock = assert(uv.new_udp())
+    assert(self.sock:bind("127.0.0.1", 0))
+    -- Large responses arrive in bursts of chunks, don't let them be dropped
+    pcall(uv.recv_buffer_size, self.sock, 4 * 1024 * 1024)
+  end
   -- Will connect to the socket later, when the first query is needed
   -- to be issued.
   self.server_port = nil
@@ -33,6 +92,10 @@ function Proxy.new(client)
   self.request_id = 0
   self.responses = {}
   self.responses_size = 0
+  self.timer = assert(uv.new_timer())
+  self.timer_due = nil
+  self.latency = {}
+  self.event_handlers = {}
 
   return self
 end
@@ -48,34 +111,319 @@ function Proxy:cleanup()
     self.sock:close()
     self.sock = nil
   end
+  if self.timer ~= nil then
+    self.timer:stop()
+    self.timer:close()
+    self.timer = nil
+  end
+  -- Don't leave the requesters waiting forever
+  for request_id, _ in pairs(self.responses) do
+    self:_fail(request_id, true)
+  end
+end
+
+---@return number count of the requests waiting for the responses
+function Proxy:get_pending_count()
+  return self.responses_size
 end
 
+---@param request string
+---@return string kind of the request to track the latency of
+local function get_request_kind(request)
+  local kind = request:match('^%S+') or ''
+  if kind == 'handle-command' then
+    -- Debugger commands vary, distinguish at least by the first word
+    local cmd = request:match('^%S+%s+(%S+)')
+    if cmd ~= nil then
+      kind = kind .. ' ' .. cmd
+    end
+  end
+  return kind
+end
+
+---Get the time to wait for a response to the request kind.
+---@param kind string request kind
+---@param can_retry boolean true if the request will be resent on timeout
+---@return number timeout in milliseconds
+function Proxy:_get_timeout(kind, can_retry)
+  local latency = self.latency[kind]
+  if latency == nil then
+    return RESPONSE_TIMEOUT
+  end
+  local timeout = latency.srtt + 4 * latency.rttvar
+  -- Don't give up on the requests that can't be repeated too early
+  timeout = math.max(timeout, can_retry and MIN_TIMEOUT or RESPONSE_TIMEOUT)
+  return math.min(timeout, MAX_TIMEOUT)
+end
+
+---Account the round trip time of a request kind like TCP does (RFC 6298).
+---@param kind string request kind
+---@param sample number round trip time in milliseconds
+function Proxy:_update_latency(kind, sample)
+  local latency = self.latency[kind]
+  if latency == nil then
+    self.latency[kind] = {srtt = sample, rttvar = sample / 2}
+    return
+  end
+  latency.rttvar = 0.75 * latency.rttvar + 0.25 * math.abs(latency.srtt - sample)
+  latency.srtt = 0.875 * latency.srtt + 0.125 * sample
+end
+
+---Arm the shared timer for the earliest deadline of the pending requests.
+function Proxy:_arm_timer()
+  if self.timer == nil then
+    return
+  end
+  local due = nil
+  for _, context in pairs(self.responses) do
+    if due == nil or context.deadline < due then
+      due = context.deadline
+    end
+  end
+  if due == self.timer_due then
+    return
+  end
+  self.timer:stop()
+  self.timer_due = due
+  if due ~= nil then
+    self.timer:start(math.max(0, due - uv.now()), 0, function() self:_on_timer() end)
+  end
+end
+
+---Resend or fail the requests whose deadlines have passed.
+function Proxy:_on_timer()
+  self.timer_due = nil
+  local now = uv.now()
+  for request_id, context in pairs(self.responses) do
+    if context.deadline <= now then
+      -- Chunks of another reply to the same request mustn't be mixed in
+      if context.can_retry and context.retries < MAX_RETRIES and context.chunks == nil then
+        context.retries = context.retries + 1
+        context.timeout = math.min(context.timeout * 2, MAX_TIMEOUT)
+        context.deadline = now + context.timeout
+        log.warn({"Request timed out, resending", request_id = request_id, retries = context.retries})
+        if not self:_send(request_id, context.data) then
+          self:_fail(request_id, true)
+        end
+      else
+        log.warn({"Request timed out", request_id = request_id})
+        self:_fail(request_id, true)
+      end
+    end
+  end
+  self:_arm_timer()
+end
+
+---Complete the request with the response from the proxy.
+---@param response {request: number, response: any} message from the proxy
+---@param is_async boolean true to resume the requester, false to return the response
+---@return any response if not is_async
 function Proxy:respond(response, is_async)
-  local context = self.responses[response.request]
+  return self:_complete(response.request, response.response, is_async, true)
+end
+
+---Complete the request without a response.
+---@param request_id number
+---@param is_async boolean true to resume the requester, false to return the result
+---@return any empty result if not is_async
+function Proxy:_fail(request_id, is_async)
+  return self:_complete(request_id, {}, is_async, false)
+end
+
+---@param request_id number
+---@param result any response to the request
+---@param is_async boolean true to resume the requester, false to return the result
+---@param is_measured boolean true to account the round trip time
+---@return any result if not is_async
+function Proxy:_complete(request_id, result, is_async, is_measured)
+  local context = self.responses[request_id]
   if context ~= nil then
     self.responses_size = self.responses_size - 1
-    self.responses[response.request] = nil
-    context.timer:stop()
-    context.timer:close()
+    self.responses[request_id] = nil
+    if is_measured then
+      -- A resent request is measured since the first sending to let
+      -- the timeout grow if the debugger is slow rather than the datagram lost.
+      self:_update_latency(context.kind, uv.now() - context.sent_time)
+    end
+    if self.responses_size == 0 and self.timer ~= nil then
+      self.timer:stop()
+      self.timer_due = nil
+    end
     if is_async then
       vim.schedule(function()
-        coroutine.resume(context.co, response.response)
+        coroutine.resume(context.co, result)
       end)
     else
-      return response.response
+      return result
     end
   else
-    log.warn({"Unexpected/outdated response", response = response, is_async = is_async})
+    log.warn({"Unexpected/outdated response", request = request_id, response = result, is_async = is_async})
+  end
+end
+
+---Accumulate a chunk of a large response "#<req_id> <index> <count>\n<data>"
+---and process the response when all the chunks have been received.
+---@param data string datagram from the proxy
+function Proxy:_collect_chunk(data)
+  local header_end = data:find('\n', 1, true)
+  local req_id, idx, count
+  if header_end ~= nil then
+    req_id, idx, count = data:sub(2, header_end - 1):match('^(%d+) (%d+) (%d+)$')
+  end
+  if req_id == nil then
+    log.error({"Malformed response chunk", header = data:sub(1, 32)})
+    return
+  end
+  req_id, idx, count = tonumber(req_id), tonumber(idx), tonumber(count)
+  local context = self.responses[req_id]
+  if context == nil then
+    log.warn({"Unexpected/outdated response chunk", request = req_id, idx = idx})
+    return
+  end
+  if context.chunks == nil then
+    context.chunks = {}
+    context.chunks_received = 0
+  end
+  if context.chunks[idx + 1] == nil then
+    context.chunks[idx + 1] = data:sub(header_end + 1)
+    context.chunks_received = context.chunks_received + 1
+  end
+  if context.chunks_received < count then
+    -- Give the rest of the chunks time to arrive
+    context.deadline = uv.now() + context.timeout
+    self:_arm_timer()
+    return
+  end
+  self:respond(vim.json.decode(table.concat(context.chunks)), true)
+end
+
+---Route a message from the proxy: either a response or a notification
+---@param message table decoded message
+function Proxy:_dispatch(message)
+  if message.event ~= nil then
+    self:_notify(message)
+  else
+    self:respond(message, true)
   end
 end
 
+---Split the data received from the pipe into frames and process them.
+---Every frame is prefixed with its size (4 bytes, big endian), the first
+---byte of the frame denotes the encoding: J for JSON, M for msgpack.
+---@param data string received from the pipe
+function Proxy:_receive_stream(data)
+  table.insert(self.pieces, data)
+  self.pieces_size = self.pieces_size + #data
+  while true do
+    if self.frame_size == nil then
+      if self.pieces_size < 4 then
+        return
+      end
+      local buf = table.concat(self.pieces)
+      local b1, b2, b3, b4 = buf:byte(1, 4)
+      self.frame_size = ((b1 * 256 + b2) * 256 + b3) * 256 + b4
+      self.pieces = {buf:sub(5)}
+      self.pieces_size = #buf - 4
+    end
+    -- Avoid concatenating the pieces until the whole frame is available
+    if self.pieces_size < self.frame_size then
+      return
+    end
+    local buf = table.concat(self.pieces)
+    local frame = buf:sub(1, self.frame_size)
+    self.pieces = {buf:sub(self.frame_size + 1)}
+    self.pieces_size = #buf - self.frame_size
+    self.frame_size = nil
+
+    local payload = frame:sub(2)
+    if frame:sub(1, 1) == 'M' then
+      self:_dispatch(vim.mpack.decode(payload))
+    else
+      self:_dispatch(vim.json.decode(payload))
+    end
+  end
+end
+
+---Connect to the Unix-domain socket of the proxy.
+---@async
+---@return boolean true if connected -- the proxy is ready
+function Proxy:_connect_stream()
+  if self.is_connecting then
+    log.warn({self.socket_path, 'is being connected'})
+    return false
+  end
+  self.is_connecting = true
+  local co = coroutine.running()
+  self.sock:connect(self.socket_path, function(err)
+    vim.schedule(function()
+      coroutine.resume(co, err)
+    end)
+  end)
+  local err = coroutine.yield()
+  self.is_connecting = false
+  if self.sock == nil then
+    -- The session has been closed meanwhile
+    return false
+  end
+  if err ~= nil then
+    log.warn({self.socket_path, 'not available yet', err})
+    -- Start over with a fresh pipe next time
+    self.sock:close()
+    self.sock = assert(uv.new_pipe(false))
+    return false
+  end
+  local res, errmsg = self.sock:read_start(function(read_err, data)
+    if read_err ~= nil then
+      log.error({"Failed to receive response", read_err})
+    elseif data ~= nil then
+      self:_receive_stream(data)
+    else
+      log.info({"Proxy disconnected"})
+    end
+  end)
+  if res == nil then
+    log.error({"Failed to start receiving from proxy", errmsg})
+    return false
+  end
+  self.is_connected = true
+  return true
+end
+
+---Subscribe to the notifications pushed by the proxy.
+---The handler is called in the main loop.
+---@param event string name of the event, like 'stop'
+---@param handler function(event: table) callback to receive the event
+function Proxy:on_event(event, handler)
+  self.event_handlers[event] = handler
+end
+
+---Dispatch a notification to its handler
+---@param event table notification from the proxy
+function Proxy:_notify(event)
+  local handler = self.event_handlers[event.event]
+  if handler == nil then
+    log.warn({"Unexpected event", event = event})
+    return
+  end
+  vim.schedule(function()
+    -- The session could have been closed meanwhile
+    if self.sock ~= nil then
+      handler(event)
+    end
+  end)
+end
+
 ---Get the proxy port to prepare for communication
+---@async
 ---@return boolean true if the port is available -- the proxy is ready
 function Proxy:_ensure_connected()
   log.debug({"function Proxy:_ensure_connected()"})
-  if self.server_port ~= nil then
+  if self.server_port ~= nil or self.is_connected then
     return true
   end
+  if self.socket_path ~= nil then
+    return self:_connect_stream()
+  end
   local success, lines = pcall(io.lines, self.proxy_addr)
   if not success then
     log.warn({self.proxy_addr, 'not available yet', lines})
@@ -87,8 +435,11 @@ function Proxy:_ensure_connected()
     if err ~= nil then
       log.error({"Failed to receive response", err})
     elseif data ~= nil then
-      local response = vim.json.decode(data)
-      self:respond(response, true)
+      if data:sub(1, 1) == '#' then
+        self:_collect_chunk(data)
+        return
+      end
+      self:_dispatch(vim.json.decode(data))
     end
   end)
   if res == nil then
@@ -99,11 +450,49 @@ function Proxy:_ensure_connected()
   return true
 end
 
+---Send the request data to the proxy.
+---@param request_id number
+---@param data string request without the id
+---@return boolean true if sending has started
+function Proxy:_send(request_id, data)
+  local on_sent = function(err)
+    if err ~= nil then
+      log.warn({"Request failed", request_id = request_id, err = err})
+      self:_fail(request_id, true)
+      return
+    end
+  end
+  data = request_id .. " " .. data
+  local res, errmsg
+  if self.socket_path ~= nil then
+    local size = #data
+    local header = string.char(math.floor(size / 0x1000000) % 256, math.floor(size / 0x10000) % 256,
+      math.floor(size / 0x100) % 256, size % 256)
+    res, errmsg = self.sock:write(header .. data, on_sent)
+  else
+    res, errmsg = self.sock:send(data, '127.0.0.1', self.server_port, on_sent)
+  end
+  if res == nil then
+    log.error({"Failed to send to proxy", errmsg})
+    return false
+  end
+  return true
+end
+
 ---Send a request to the proxy and wait for the response.
 ---@async
 ---@param request string command to the debugger proxy
 ---@return any response from the debugger proxy
 function Proxy:query(request)
+  return self:_query(request, get_request_kind(request), IDEMPOTENT_REQUESTS[request:match('^%S+')] ~= nil)
+end
+
+---@async
+---@param request string command to the debugger proxy
+---@param kind string request kind to track the latency of
+---@param is_idempotent boolean true if the request can be safely repeated
+---@return any response from the debugger proxy
+function Proxy:_query(request, kind, is_idempotent)
   log.info({"Proxy:query", request = request})
 
   if not self.client:get_is_active() then
@@ -123,22 +512,6 @@ function Proxy:query(request)
     return nil
   end
 
-  if self.responses_size > 16 then
-    log.debug({"Cleaning obsolete responses count=", #self.responses})
-    local cleaned_responses = {}
-    local cleaned_responses_size = 0
-    local deadline_id = self.request_id - 16
-    for id, resp in pairs(self.responses) do
-      if id >= deadline_id then
-        cleaned_responses[id] = resp
-        cleaned_responses_size = cleaned_responses_size + 1
-      end
-    end
-    self.responses = cleaned_responses
-    self.responses_size = cleaned_responses_size
-    log.debug({"Responses after cleanup count=", self.responses_size})
-  end
-
   local request_id = self.request_id
   self.request_id = self.request_id + 1
 
@@ -147,29 +520,43 @@ function Proxy:query(request)
     log.error({"Proxy should be used from a coroutine!", trace = debug.traceback()})
   end
 
-  local timer = uv.new_timer()
-  timer:start(500, 0, function()
-    log.warn({"Request timed out", request_id = request_id})
-    self:respond({request = request_id, response = {}}, true)
-  end)
-
-  self.responses[request_id] = {co = co, timer = timer}
+  -- Datagrams may be lost, while the stream is reliable
+  local can_retry = is_idempotent and self.socket_path == nil
+  local timeout = self:_get_timeout(kind, can_retry)
+  local now = uv.now()
+  self.responses[request_id] = {
+    co = co, data = request, kind = kind, can_retry = can_retry, retries = 0,
+    timeout = timeout, sent_time = now, deadline = now + timeout,
+  }
   self.responses_size = self.responses_size + 1
+  self:_arm_timer()
 
-  local res, errmsg = self.sock:send(request_id .. " " .. request, '127.0.0.1', self.server_port, function(err)
-    if err ~= nil then
-      log.warn({"Request failed", request_id = request_id, err = err})
-      self:respond({request = request_id, response = {}}, true)
-      return
-    end
-  end)
-  if res == nil then
-    log.error({"Failed to send to proxy", errmsg})
-    return self:respond({request = request_id, response = {}}, false)
+  if not self:_send(request_id, request) then
+    return self:_fail(request_id, false)
   end
 
   local response = coroutine.yield()
   return response
 end
 
+---Send several requests to the proxy at once and wait for all the responses.
+---@async
+---@param requests string[] commands to the debugger proxy
+---@return any[] responses in the order of the requests, nil for the missing ones
+function Proxy:query_many(requests)
+  log.info({"Proxy:query_many", requests = requests})
+  if #requests == 0 then
+    return {}
+  end
+  local is_idempotent = true
+  for _, request in ipairs(requests) do
+    is_idempotent = is_idempotent and IDEMPOTENT_REQUESTS[request:match('^%S+')] ~= nil
+  end
+  local responses = self:_query('batch ' .. vim.json.encode(requests), 'batch', is_idempotent)
+  if type(responses) ~= 'table' then
+    return {}
+  end
+  return responses
+end
+
 return Proxy
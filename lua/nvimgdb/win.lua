@@ -3,6 +3,9 @@
 
 local log = require'nvimgdb.log'
 
+-- Count of backtrace frames to query at once
+local BACKTRACE_PAGE_SIZE = 200
+
 ---@class Win jump window management
 ---@field private config Config resolved configuration
 ---@field private keymaps Keymaps dynamic keymap manager
@@ -269,15 +272,13 @@ function Win:_open_file(cmd)
   return new_buffer
 end
 
----Show actual breakpoints in the current window.
----@async
-function Win:query_breakpoints()
-  log.debug({"Win:query_breakpoints"})
-  -- Just notify the client that the breakpoints are being queried
-  self.client:mark_has_interacted()
-
+---Get the source code file displayed in the jump window.
+---@return number? buffer number
+---@return string? full path to the file, nil if there is no file suitable for querying
+function Win:get_jump_file()
+  log.debug({"Win:get_jump_file"})
   if not self:_has_jump_win() then
-    return
+    return nil, nil
   end
 
   -- Get the source code buffer number
@@ -288,37 +289,178 @@ function Win:query_breakpoints()
 
   -- If no file name or a weird name with spaces, ignore it (to avoid
   -- misinterpretation)
-  if fname ~= '' and fname:find(' ') == nil then
-    -- Query the breakpoints for the shown file
-    self.breakpoint:query(buf_num, fname)
+  if fname == '' or fname:find(' ') ~= nil then
+    return buf_num, nil
+  end
+  return buf_num, fname
+end
+
+---@class PrefetchedBreakpoints breakpoints received along with other data
+---@field public fname string full path to the source code file
+---@field public breaks FileBreakpoints? breakpoints in the file, nil if unchanged
+---@field public gen any? generation of the breakpoints
+
+---Show actual breakpoints in all the loaded buffers.
+---@async
+---@param prefetched PrefetchedBreakpoints? breakpoints already obtained from the side channel
+function Win:query_breakpoints(prefetched)
+  log.debug({"Win:query_breakpoints", prefetched = prefetched})
+  -- The session isn't visible, the breakpoints will be queried on TabEnter
+  if not self:_has_jump_win() then
+    return
+  end
+  -- Just notify the client that the breakpoints are being queried
+  self.client:mark_has_interacted()
+
+  if self.breakpoint:query_all(prefetched) then
     vim.api.nvim_command("redraw")
   end
 end
 
+---Show the breakpoints in the file just entered in the jump window.
+---@async
+function Win:show_breakpoints()
+  log.debug({"Win:show_breakpoints"})
+  local _, fname = self:get_jump_file()
+  if self.breakpoint:show(fname) then
+    vim.api.nvim_command("redraw")
+  end
+end
+
+---Fill the location list of the jump window and open it.
+---@param mods string command modifiers like 'leftabove'
+---@param fill function() callback to populate the location list of the current window
+function Win:_lopen(mods, fill)
+  self:_with_saved_mode(function()
+    self:_with_saved_win(false, function()
+      self:_ensure_jump_window()
+      vim.api.nvim_win_call(self.jump_win, function()
+        fill()
+        vim.cmd(mods .. ' lopen')
+      end)
+    end)
+  end)
+end
+
+---Populate the location list with the output lines parsed with 'errorformat'.
+---@param llist string[] output of a debugger command
+---@param mods string command modifiers like 'leftabove'
+function Win:_lopen_lines(llist, mods)
+  self:_lopen(mods, function()
+    local efmmgr = require 'nvimgdb.efmmgr'
+    local backend = NvimGdb.here.backend
+    -- Setup 'errorformat' for the given backend. Do it locally because 'efm' can change be reset when editing files.
+    efmmgr.setup(backend.get_error_formats())
+    log.debug({llist = llist})
+    log.debug({efm = backend.get_error_formats()})
+    vim.fn.setloclist(0, {}, ' ', {lines = llist})
+    efmmgr.teardown()
+  end)
+end
+
 ---Populate the location list with the result of debugger cmd.
 ---@param cmd string debugger command to execute
 ---@param mods string command modifiers like 'leftabove'
 function Win:lopen(cmd, mods)
   log.debug({"Win:lopen", cmd = cmd, mods = mods})
   coroutine.resume(coroutine.create(function()
-    local llist = NvimGdb.here:get_for_llist(cmd)
-    self:_with_saved_mode(function()
-      self:_with_saved_win(false, function()
-        self:_ensure_jump_window()
-        vim.api.nvim_win_call(self.jump_win, function()
-          local efmmgr = require 'nvimgdb.efmmgr'
-          local backend = NvimGdb.here.backend
-          -- Setup 'errorformat' for the given backend. Do it locally because 'efm' can change be reset when editing files.
-          efmmgr.setup(backend.get_error_formats())
-          log.debug({llist = llist})
-          log.debug({efm = backend.get_error_formats()})
-          vim.fn.setloclist(0, {}, ' ', {lines = llist})
-          vim.cmd(mods .. ' lopen')
-          efmmgr.teardown()
-        end)
-      end)
+    self:_lopen_lines(NvimGdb.here:get_for_llist(cmd), mods)
+  end))
+end
+
+---Convert backtrace frames into location list items.
+---@param frames BacktraceFrame[]
+---@return table[] items for setloclist()
+local function backtrace_items(frames)
+  local items = {}
+  for _, frame in ipairs(frames) do
+    items[#items + 1] = {
+      filename = frame.file,
+      lnum = frame.line,
+      text = string.format('#%d %s in %s', frame.level, frame.pc, frame['function'] or '??'),
+    }
+  end
+  return items
+end
+
+---Populate the location list with the backtrace frames page by page.
+---The list is opened as soon as the first page is available, the older frames
+---are loaded when the cursor approaches the end of the list.
+---@param cmd string debugger command to fall back to if the frames can't be queried
+---@param mods string command modifiers like 'leftabove'
+function Win:lopen_backtrace(cmd, mods)
+  log.debug({"Win:lopen_backtrace", cmd = cmd, mods = mods})
+  local app = NvimGdb.here
+  coroutine.resume(coroutine.create(function()
+    local page = app:query_backtrace(0, BACKTRACE_PAGE_SIZE)
+    if page == nil then
+      self:_lopen_lines(app:get_for_llist(cmd), mods)
+      return
+    end
+    local list_id = nil
+    self:_lopen(mods, function()
+      vim.fn.setloclist(0, {}, ' ', {items = backtrace_items(page.frames), title = cmd})
+      list_id = vim.fn.getloclist(0, {id = 0}).id
     end)
+    local list_win = vim.fn.getloclist(self.jump_win, {winid = 0}).winid
+    if page.more and #page.frames > 0 and list_win ~= 0 then
+      self:_load_backtrace_on_scroll(app, list_id, list_win, page)
+    end
   end))
 end
 
+---Append the older backtrace frames when the cursor nears the end of the location list.
+---The stack may be huge or corrupted, so only the pages the user scrolls to are queried.
+---@param app App debugging session
+---@param list_id number identifier of the location list with the backtrace
+---@param list_win number window showing the location list
+---@param page BacktracePage last page loaded into the list
+function Win:_load_backtrace_on_scroll(app, list_id, list_win, page)
+  local augroup_name = "NvimGdbTab" .. vim.api.nvim_get_current_tabpage() .. "_backtrace"
+  local augid = vim.api.nvim_create_augroup(augroup_name, {clear = true})
+  local stop = page.stop
+  local next_level = page.frames[#page.frames].level + 1
+  local is_loading = false
+
+  local function is_obsolete()
+    return not vim.api.nvim_win_is_valid(self.jump_win)
+      or vim.fn.getloclist(self.jump_win, {id = 0}).id ~= list_id
+  end
+
+  local function load_page()
+    local next_page = app:query_backtrace(next_level, BACKTRACE_PAGE_SIZE)
+    if next_page == nil or next_page.stop ~= stop or is_obsolete() then
+      -- The program has moved on or the list has been replaced
+      pcall(vim.api.nvim_del_augroup_by_id, augid)
+      return
+    end
+    vim.fn.setloclist(self.jump_win, {}, 'a', {id = list_id, items = backtrace_items(next_page.frames)})
+    if not next_page.more or #next_page.frames == 0 then
+      pcall(vim.api.nvim_del_augroup_by_id, augid)
+      return
+    end
+    next_level = next_page.frames[#next_page.frames].level + 1
+  end
+
+  vim.api.nvim_create_autocmd("CursorMoved", {
+    group = augid,
+    buffer = vim.api.nvim_win_get_buf(list_win),
+    callback = function()
+      if is_loading or vim.api.nvim_get_current_win() ~= list_win then
+        return
+      end
+      -- Keep a screenful of frames ahead of the cursor
+      local ahead = vim.api.nvim_win_get_height(list_win)
+      if vim.fn.line('.') + ahead < vim.fn.line('$') then
+        return
+      end
+      is_loading = true
+      coroutine.resume(coroutine.create(function()
+        load_page()
+        is_loading = false
+      end))
+    end,
+  })
+end
+
 return Win
@@ -46,6 +46,25 @@ describe("generic", function()
       end)
     end)
 
+    if require('nvimgdb.backend.' .. backend.name).supports_unix_side_channel then
+      it(backend.name .. ' smoke over a Unix-domain socket', function()
+        vim.g.nvimgdb_side_channel = 'unix'
+        finally(function() vim.g.nvimgdb_side_channel = nil end)
+        conf.post_terminal_end(function()
+          eng.feed(backend.launch)
+          assert.is_true(eng.wait_paused())
+          eng.feed('<esc><c-w>w')
+          eng.feed(":e src/test.cpp\n")
+          eng.feed(':5<cr>')
+          eng.feed('<f8>')
+          assert.is_true(eng.wait_signs({brk = {[1] = {5}}}))
+
+          eng.exe("GdbRun")
+          assert.is_true(eng.wait_signs({cur = 'test.cpp:5', brk = {[1] = {5}}}))
+        end)
+      end)
+    end
+
     it(backend.name .. ' breaks', function()
       conf.post_terminal_end(function()
         eng.feed(backend.launch)
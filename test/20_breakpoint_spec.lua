@@ -83,6 +83,29 @@ describe("breakpoint", function()
       end)
     end)
 
+    it(backend.name .. ' breakpoints are kept between sessions', function()
+      local store_dir = uv.fs_mkdtemp(uv.os_tmpdir() .. '/nvimgdb-store-XXXXXX')
+      finally(function() vim.fn.delete(store_dir, 'rf') end)
+      vim.g.nvimgdb_config_override = {persist_breakpoints = store_dir}
+      conf.config_test(function()
+        eng.feed(backend.launch)
+        assert.is_true(eng.wait_paused())
+        eng.feed(backend.break_bar)
+        eng.feed("<esc>:wincmd w<cr>")
+        eng.feed(":e src/test.cpp\n")
+        eng.feed(":10<cr>")
+        eng.feed("<f8>")
+        assert.is_true(eng.wait_signs({brk = {[1] = {5, 10}}}))
+
+        -- The breakpoints are restored in the next session
+        eng.feed(":GdbDebugStop<cr>")
+        assert.is_true(eng.wait_signs({}))
+        eng.feed(backend.launch)
+        assert.is_true(eng.wait_paused())
+        assert.is_true(eng.wait_signs({brk = {[1] = {5, 10}}}))
+      end)
+    end)
+
     it(backend.name .. ' duplicate breakpoints are displayed distinctively', function()
       conf.post_terminal_end(function()
         eng.feed(backend.launch)
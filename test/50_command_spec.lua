@@ -159,6 +159,33 @@ describe("command", function()
       end)
     end)
 
+
+    it(backend.name .. ' inspect a value', function()
+      conf.post_terminal_end(function()
+        eng.feed(backend.launch)
+        assert.is_true(eng.wait_paused())
+        eng.feed(backend.tbreak_main)
+        eng.feed('run<cr>')
+        assert.is_true(eng.wait_paused())
+        eng.feed('<esc>')
+        eng.feed(':GdbInspect argv\n')
+        local function query()
+          return vim.fn.getbufline('GdbInspect argv', 1, '$')
+        end
+        assert.is_true(eng.wait_for(query, function(out)
+          return #out == 1 and out[1]:match('^%+ argv = ') ~= nil
+        end))
+        eng.feed('<cr>')
+        assert.is_true(eng.wait_for(query, function(out)
+          return #out == 2 and out[1]:match('^%- argv = ') ~= nil
+            and out[2]:match('^  . %*argv = ') ~= nil
+        end))
+        eng.feed('<cr>')
+        assert.is_true(eng.wait_for(query, function(out) return #out == 1 end))
+        eng.feed(':q\n')
+      end)
+    end)
+
   end)
 
 end)
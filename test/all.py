@@ -35,6 +35,11 @@ with tempfile.TemporaryDirectory() as tmp_dir:
     from prerequisites import Prerequisites
     Prerequisites()
 
+    print("Check the GDB side channel")
+    res = subprocess.run([sys.executable, "bench_gdb_commands.py", "--check"])
+    if res.returncode != 0:
+        raise RuntimeError("Side channel check failed")
+
     test_cmd = ["nvim", "-l", "run-tests.lua", ".", "--no-keep-going"]
     # Use the following command to see neovim screen
     # test_cmd = ["python", "nvim.py", "+luafile main.lua"]
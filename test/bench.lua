@@ -0,0 +1,212 @@
+-- Latency benchmark of the debugging sessions.
+-- Launched by bench.py, which passes the parameters in g:bench_arg
+-- and summarizes the samples written to the output file.
+
+local thr = require'thread'
+local eng = require'engine'
+local utils = require'nvimgdb.utils'
+
+local aout = utils.is_windows and 'a.exe' or 'a.out'
+
+-- How often the awaited condition is checked, milliseconds
+local POLL_MS = 1
+
+---@class BenchBackend
+---@field start string command to start debugging
+---@field launch string[] debugger commands to get into the main loop
+---@field loop table<string, boolean> locations of the main loop to step through
+---@field break_line number line in the main loop file to toggle the breakpoint in
+
+---@type table<string, BenchBackend>
+local backends = {
+  gdb = {
+    start = 'GdbStart gdb -q ' .. aout,
+    launch = {'break main', 'run'},
+    loop = {['test.cpp:17'] = true, ['test.cpp:18'] = true, ['test.cpp:19'] = true, ['test.cpp:20'] = true},
+    break_line = 5,
+  },
+  lldb = {
+    start = 'GdbStartLLDB lldb ' .. aout,
+    launch = {'breakpoint set -n main', 'process launch'},
+    loop = {['test.cpp:17'] = true, ['test.cpp:18'] = true, ['test.cpp:19'] = true, ['test.cpp:20'] = true},
+    break_line = 5,
+  },
+  pdb = {
+    start = 'GdbStartPDB python -m pdb main.py',
+    launch = {'break _main', 'cont'},
+    loop = {['main.py:15'] = true, ['main.py:16'] = true},
+    break_line = 5,
+  },
+}
+
+---Wait until the condition holds polling it often.
+---@param start_ms number time of the action being measured
+---@param cond fun(): boolean
+---@return number? elapsed milliseconds since start_ms, nil if timed out
+local function measure(start_ms, cond)
+  local deadline = start_ms + eng.common_timeout
+  while eng.get_time_ms() < deadline do
+    if cond() then
+      return eng.get_time_ms() - start_ms
+    end
+    thr.y(POLL_MS)
+  end
+  return nil
+end
+
+local function leave_terminal()
+  if vim.api.nvim_get_mode().mode == 't' then
+    eng.feed('<c-\\><c-n>', 0)
+  end
+end
+
+---@param backend BenchBackend
+---@return boolean true if the program stopped in the main loop
+local function start(backend)
+  vim.cmd(backend.start)
+  if not eng.wait_paused() then
+    return false
+  end
+  for _, cmd in ipairs(backend.launch) do
+    NvimGdb.here:send(cmd)
+    eng.wait_is_still()
+  end
+  leave_terminal()
+  return eng.wait_for(
+    function() return eng.get_signs().cur end,
+    function(cur) return backend.loop[cur] ~= nil end
+  ) == true
+end
+
+local function stop()
+  leave_terminal()
+  vim.cmd('GdbDebugStop')
+  thr.y(0)
+end
+
+---@param line number
+---@return boolean true if there is a breakpoint sign in the line
+local function has_breakpoint(line)
+  for _, lines in pairs(eng.get_signs().brk or {}) do
+    if vim.tbl_contains(lines, line) then
+      return true
+    end
+  end
+  return false
+end
+
+---Step over in the main loop once.
+---@param backend BenchBackend
+---@return number? latency
+local function bench_step(backend)
+  local cur = eng.get_signs().cur
+  if backend.loop[cur] == nil then
+    -- The loop is over, start anew to keep the conditions comparable
+    stop()
+    if not start(backend) then
+      return nil
+    end
+    cur = eng.get_signs().cur
+  end
+  local t0 = eng.get_time_ms()
+  vim.cmd('GdbNext')
+  local elapsed = measure(t0, function()
+    local new_cur = eng.get_signs().cur
+    return new_cur ~= nil and new_cur ~= cur
+  end)
+  eng.wait_is_still()
+  return elapsed
+end
+
+---Set and clear the breakpoint in the jump window.
+---@param backend BenchBackend
+---@return number? latency of setting
+---@return number? latency of clearing
+local function bench_breakpoint(backend)
+  vim.api.nvim_set_current_win(NvimGdb.here.win.jump_win)
+  vim.api.nvim_win_set_cursor(0, {backend.break_line, 0})
+  local t0 = eng.get_time_ms()
+  vim.cmd('GdbBreakpointToggle')
+  local set = measure(t0, function() return has_breakpoint(backend.break_line) end)
+  eng.wait_is_still()
+  t0 = eng.get_time_ms()
+  vim.cmd('GdbBreakpointToggle')
+  local clear = measure(t0, function() return not has_breakpoint(backend.break_line) end)
+  eng.wait_is_still()
+  return set, clear
+end
+
+---Load the backtrace into the location list of the jump window.
+---@return number? latency
+local function bench_lopen()
+  local jump_win = NvimGdb.here.win.jump_win
+  vim.api.nvim_set_current_win(jump_win)
+  vim.fn.setloclist(jump_win, {}, 'f')
+  local t0 = eng.get_time_ms()
+  vim.cmd('GdbLopenBacktrace')
+  local elapsed = measure(t0, function() return #vim.fn.getloclist(jump_win) > 0 end)
+  eng.wait_is_still()
+  if vim.api.nvim_win_is_valid(jump_win) then
+    vim.api.nvim_set_current_win(jump_win)
+    vim.cmd('lclose')
+  end
+  return elapsed
+end
+
+---@param samples table<string, number[]>
+---@param timeouts table<string, number>
+---@param scenario string
+---@param value number?
+local function record(samples, timeouts, scenario, value)
+  if value == nil then
+    timeouts[scenario] = (timeouts[scenario] or 0) + 1
+  else
+    table.insert(samples[scenario], value)
+  end
+end
+
+---Run all the scenarios with the backend.
+---@param name string
+---@param iterations number
+---@return table results
+local function bench_backend(name, iterations)
+  local backend = backends[name]
+  local samples = {step = {}, breakpoint = {}, lopen = {}}
+  local timeouts = vim.empty_dict()
+  if not start(backend) then
+    stop()
+    return {error = 'failed to start'}
+  end
+  for _ = 1, iterations do
+    record(samples, timeouts, 'step', bench_step(backend))
+    local set, clear = bench_breakpoint(backend)
+    record(samples, timeouts, 'breakpoint', set)
+    record(samples, timeouts, 'breakpoint', clear)
+    record(samples, timeouts, 'lopen', bench_lopen())
+  end
+  stop()
+  return {samples = samples, timeouts = timeouts}
+end
+
+local M = {}
+
+local function main()
+  local arg = vim.g.bench_arg
+  local results = {}
+  for _, name in ipairs(arg.backends) do
+    results[name] = bench_backend(name, arg.iterations)
+  end
+  local f = assert(io.open(arg.output, 'w'))
+  f:write(vim.fn.json_encode(results))
+  f:close()
+  M.thr:cleanup()
+  vim.cmd('qa!')
+end
+
+local function on_stuck()
+  print("Thread stuck")
+  M.thr:cleanup()
+  vim.cmd('cq!')
+end
+
+M.thr = thr.create(main, on_stuck)
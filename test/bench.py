@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Measure the latency of the plugin in real debugging sessions.
+
+Neovim is launched with nvim.py to have the SpyUI attached, bench.lua
+drives the debuggers on the test programs and times:
+
+  step        GdbNext until the cursor sign moves
+  breakpoint  GdbBreakpointToggle until the sign is shown or hidden
+  lopen       GdbLopenBacktrace until the location list is filled
+
+The percentiles are reported and optionally compared to a baseline
+stored earlier with --save.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+
+SCENARIOS = ("step", "breakpoint", "lopen")
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of the sorted samples."""
+    idx = max(0, -(-len(samples) * pct // 100) - 1)
+    return samples[idx]
+
+
+def get_backends():
+    """Backends available in this environment."""
+    if not os.path.exists("backends.txt"):
+        from prerequisites import Prerequisites
+        Prerequisites()
+    with open("backends.txt") as bf:
+        names = bf.read().split()
+    return [b for b in ("gdb", "lldb") if b in names] + ["pdb"]
+
+
+def run_nvim(backends, iterations):
+    """Run the scenarios in Neovim and get the raw samples."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, "bench.json")
+        arg = {"backends": backends, "iterations": iterations,
+               "output": output}
+        res = subprocess.run([
+            sys.executable, "nvim.py", "--embed", "--headless", "-n",
+            f"+let g:bench_arg=json_decode('{json.dumps(arg)}')",
+            "+luafile bench.lua"])
+        if res.returncode != 0 or not os.path.exists(output):
+            raise RuntimeError("Benchmark failed")
+        with open(output) as f:
+            return json.load(f)
+
+
+def summarize(results):
+    """Compute the statistics of every backend and scenario."""
+    summary = {}
+    for backend, result in results.items():
+        if "error" in result:
+            summary[backend] = {"error": result["error"]}
+            continue
+        stats = summary.setdefault(backend, {})
+        timeouts = result["timeouts"] or {}
+        for scenario in SCENARIOS:
+            samples = sorted(result["samples"][scenario])
+            entry = {"count": len(samples),
+                     "timeouts": timeouts.get(scenario, 0)}
+            if samples:
+                for pct in PERCENTILES:
+                    entry[f"p{pct}"] = round(percentile(samples, pct), 3)
+                entry["max"] = round(samples[-1], 3)
+            stats[scenario] = entry
+    return summary
+
+
+def report(summary):
+    columns = ["count", "timeouts"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    print(f"{'backend':8} {'scenario':11}"
+          + "".join(f"{c:>10}" for c in columns))
+    for backend, stats in summary.items():
+        if "error" in stats:
+            print(f"{backend:8} {stats['error']}")
+            continue
+        for scenario, entry in stats.items():
+            print(f"{backend:8} {scenario:11}"
+                  + "".join(f"{entry.get(c, '-'):>10}" for c in columns))
+
+
+def compare(summary, baseline, tolerance, slack_ms):
+    """Find the latencies that got worse than the baseline.
+
+    A percentile is considered regressed if it exceeds the baseline
+    by the relative tolerance and by the absolute slack at once.
+    """
+    regressions = []
+    for backend, stats in summary.items():
+        for scenario, entry in stats.items():
+            if not isinstance(entry, dict):
+                continue
+            base = baseline.get(backend, {}).get(scenario)
+            if base is None:
+                continue
+            if entry["timeouts"] > base.get("timeouts", 0):
+                regressions.append(f"{backend} {scenario}: timeouts "
+                                   f"{base.get('timeouts', 0)} -> "
+                                   f"{entry['timeouts']}")
+            for key in (f"p{p}" for p in PERCENTILES):
+                if key not in entry or key not in base:
+                    continue
+                value, ref = entry[key], base[key]
+                if value > ref * (1 + tolerance) and value > ref + slack_ms:
+                    regressions.append(f"{backend} {scenario}: {key} "
+                                       f"{ref}ms -> {value}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=50,
+                        help="iterations of every scenario")
+    parser.add_argument("-b", "--backend", action="append",
+                        help="backend to measure (all available by default)")
+    parser.add_argument("--baseline",
+                        help="JSON file with the statistics to compare to")
+    parser.add_argument("--save", help="store the statistics to the file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative growth of a percentile")
+    parser.add_argument("--slack", type=float, default=5.0,
+                        help="allowed absolute growth of a percentile, ms")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    backends = args.backend or get_backends()
+
+    summary = summarize(run_nvim(backends, args.iterations))
+    report(summary)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance, args.slack)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
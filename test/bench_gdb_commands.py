@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""Measure the side channel of lib/gdb_commands.py without GDB.
+
+The script is loaded against the fake gdb module from fake_gdb/ with
+a synthetic program: thousands of breakpoints and a deep stack. The
+requests are sent over UDP as the plugin does, the throughput and the
+latency of every kind of request are reported.
+
+With --check, the responses are verified instead to catch regressions
+in the side channel without a debugger installed.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "fake_gdb"))
+
+import gdb  # noqa: E402  pylint: disable=wrong-import-position
+from bench import compare, percentile  # noqa: E402  pylint: disable=wrong-import-position
+
+
+FILES = [f"/src/file{i}.c" for i in range(100)]
+PERCENTILES = (50, 90, 99)
+
+
+def start_side_channel(breakpoints, depth):
+    """Load gdb_commands.py, populate the program and start serving."""
+    path = os.path.join(TEST_DIR, "..", "lib", "gdb_commands.py")
+    spec = importlib.util.spec_from_file_location("gdb_commands", path)
+    spec.loader.exec_module(importlib.util.module_from_spec(spec))
+
+    quit_event = threading.Event()
+    threading.Thread(target=gdb.run_main_loop, args=(quit_event,),
+                     daemon=True).start()
+
+    def _populate():
+        for num in range(breakpoints):
+            gdb.add_breakpoint(FILES[num % len(FILES)], num // len(FILES) + 1)
+        gdb.stop([(f"func{level}", FILES[level % len(FILES)], level + 1)
+                  for level in range(depth)])
+        gdb.set_output("info frame", "Stack level 0, frame at 0x7ffc0:\n")
+        gdb.set_output("bt", "\n".join(f"#{level} func{level}"
+                                       for level in range(depth)))
+    gdb.run_in_main(_populate)
+
+    tmp_dir = tempfile.mkdtemp()
+    port_file = os.path.join(tmp_dir, "port")
+    gdb.Command.instances["nvim-gdb-init"].invoke(port_file, False)
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            with open(port_file) as f:
+                port = f.read()
+            if port:
+                return int(port), quit_event
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError("The side channel didn't start")
+        time.sleep(0.01)
+
+
+class Client:
+    """The plugin end of the side channel."""
+
+    def __init__(self, port):
+        self.addr = ("127.0.0.1", port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(5)
+        self.last_id = 0
+        self.chunks = {}
+        self.events = []
+
+    def send(self, request):
+        self.last_id += 1
+        self.sock.sendto(f"{self.last_id} {request}".encode("utf-8"),
+                         self.addr)
+        return self.last_id
+
+    def recv(self):
+        """Receive the next response, the pushed events are put aside."""
+        while True:
+            data, _ = self.sock.recvfrom(65536)
+            if data.startswith(b"#"):
+                header, chunk = data.split(b"\n", 1)
+                req_id, idx, count = map(int, header[1:].split())
+                parts = self.chunks.setdefault(req_id, [None] * count)
+                parts[idx] = chunk
+                if None in parts:
+                    continue
+                data = b"".join(self.chunks.pop(req_id))
+            message = json.loads(data)
+            if "event" in message:
+                self.events.append(message)
+                continue
+            return message["request"], message["response"]
+
+    def query(self, request):
+        req_id = self.send(request)
+        while True:
+            resp_id, response = self.recv()
+            if resp_id == req_id:
+                return response
+
+
+def measure(client, request, count, window, invalidate):
+    """Send the request count times keeping up to window in flight.
+
+    If invalidate, the response cache is dropped before every request
+    as if a prompt was shown in between.
+    """
+    latencies = []
+    sent = {}
+    start = time.perf_counter()
+    while len(latencies) < count:
+        while len(latencies) + len(sent) < count and len(sent) < window:
+            if invalidate:
+                gdb.post_event(gdb.events.before_prompt.fire)
+            sent[client.send(request)] = time.perf_counter()
+        req_id, _ = client.recv()
+        latencies.append(time.perf_counter() - sent.pop(req_id))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(lat * 1000 for lat in latencies)
+    entry = {"count": count, "timeouts": 0, "rps": round(count / elapsed)}
+    for pct in PERCENTILES:
+        entry[f"p{pct}"] = round(percentile(latencies, pct), 3)
+    entry["max"] = round(latencies[-1], 3)
+    return entry
+
+
+def get_scenarios(client):
+    """The measured requests: (name, request, share of the count, invalidate)."""
+    fname = FILES[0]
+    gen = client.query(f"info-breakpoints {fname}")["_gen"]
+    stored_gen = client.query("breakpoints-list")["_gen"]
+    return [
+        ("info-breakpoints", f"info-breakpoints {fname}", 1, True),
+        ("info-breakpoints-unchanged", f"info-breakpoints {fname} {gen}", 1, True),
+        ("info-breakpoints-cached", f"info-breakpoints {fname}", 1, False),
+        ("frame-location", "get-current-frame-location", 1, True),
+        ("stop-snapshot", f"get-stop-snapshot 0 {fname} {gen}", 1, True),
+        ("backtrace", "get-backtrace 0 50", 1, True),
+        ("handle-command", "handle-command info frame", 1, True),
+        ("handle-command-cached", "handle-command bt", 1, False),
+        ("all-breakpoints", "handle-command nvim-gdb-info-breakpoints", 0.05, True),
+        ("breakpoints-list-unchanged", f"breakpoints-list {stored_gen}", 1, True),
+        ("batch", json.dumps([f"get-stop-snapshot 0 {fname} {gen}",
+                              "get-backtrace 0 20"]).join(("batch ", "")),
+         1, True),
+    ]
+
+
+def report(stats):
+    columns = ["count", "rps"] + [f"p{p}" for p in PERCENTILES] + ["max"]
+    print(f"{'request':28}" + "".join(f"{c:>10}" for c in columns))
+    for name, entry in stats.items():
+        print(f"{name:28}" + "".join(f"{entry[c]:>10}" for c in columns))
+
+
+def check(client, breakpoints, depth):
+    """Verify the responses against the synthetic program."""
+    failures = []
+
+    def expect(what, actual, expected):
+        if actual != expected:
+            failures.append(f"{what}: expected {expected!r}, got {actual!r}")
+
+    fname = FILES[0]
+    per_file = -(-breakpoints // len(FILES))
+    expected = {str(line): [(line - 1) * len(FILES) + 1]
+                for line in range(1, per_file + 1)
+                if (line - 1) * len(FILES) < breakpoints}
+    breaks = client.query(f"info-breakpoints {fname}")
+    gen = breaks.pop("_gen")
+    expect("info-breakpoints", breaks, expected)
+    expect("info-breakpoints unchanged",
+           client.query(f"info-breakpoints {fname} {gen}"),
+           {"_gen": gen, "_unchanged": True})
+
+    bp = gdb.run_in_main(gdb.add_breakpoint, fname, 100000)
+    breaks = client.query(f"info-breakpoints {fname} {gen}")
+    expect("info-breakpoints after break", breaks.get("100000"), [bp.number])
+    gdb.run_in_main(gdb.delete_breakpoint, bp)
+    breaks = client.query(f"info-breakpoints {fname} {breaks['_gen']}")
+    expect("info-breakpoints after delete", "100000" in breaks, False)
+
+    expect("get-current-frame-location",
+           client.query("get-current-frame-location"), [fname, 1])
+    page = client.query("get-backtrace 0 50")
+    expect("get-backtrace levels", [f["level"] for f in page["frames"]],
+           list(range(min(50, depth))))
+    expect("get-backtrace more", page["more"], depth > 50)
+    if depth > 50:
+        page = client.query("get-backtrace 50 10")
+        expect("get-backtrace next page", page["frames"][0]["function"],
+               "func50")
+        # Another thread selected without a stop has its own stack
+        gdb.run_in_main(gdb.select_thread, 2,
+                        [(f"thread2_func{level}", FILES[0], level + 1)
+                         for level in range(100)])
+        page = client.query("get-backtrace 60 10")
+        expect("get-backtrace other thread", page["frames"][0]["function"],
+               "thread2_func60")
+        gdb.run_in_main(gdb.select_thread, 1)
+
+    expect("handle-command", client.query("handle-command info frame"),
+           "Stack level 0, frame at 0x7ffc0:\n")
+    expect("handle-command error", client.query("handle-command frobnicate"),
+           'Undefined command: "frobnicate".')
+    all_breaks = client.query("handle-command nvim-gdb-info-breakpoints")
+    expect("nvim-gdb-info-breakpoints", len(all_breaks.splitlines()),
+           breakpoints)
+
+    snapshot = client.query(f"get-stop-snapshot 0 {fname}")
+    batch = client.query("batch " + json.dumps(
+        [f"get-stop-snapshot {snapshot['frame_gen']} {fname}",
+         "get-process-state"]))
+    expect("batch location", "location" in batch[0], False)
+    expect("batch state", batch[1], "stopped")
+
+    # A repeated registration doesn't add another watch
+    for _ in range(2):
+        expect("register-watch", client.query("register-watch 7 info frame"),
+               True)
+    watches = client.query("get-watches 0")
+    expect("get-watches", watches["watches"],
+           {"7": "Stack level 0, frame at 0x7ffc0:\n"})
+    expect("unregister-watch", client.query("unregister-watch 7"), True)
+
+    expect("register-listener", client.query("register-listener"), True)
+    gdb.run_in_main(gdb.stop, [("func0", FILES[1], 42)])
+    client.query("get-process-state")
+    expect("stop event", [(e["event"], e["location"]) for e in client.events],
+           [("stop", [FILES[1], 42])])
+
+    listing = client.query("breakpoints-list")
+    expect("breakpoints-list executable", listing["executable"], "/src/a.out")
+    expect("breakpoints-list count", len(listing["breakpoints"]), breakpoints)
+    expect("breakpoints-list unchanged",
+           client.query(f"breakpoints-list {listing['_gen']}"),
+           {"_gen": listing["_gen"], "_unchanged": True})
+    batch = client.query("batch " + json.dumps(
+        [f"get-stop-snapshot - {fname} -",
+         f"breakpoints-list {listing['_gen']}"]))
+    expect("breakpoints-list batched", batch[1],
+           {"_gen": listing["_gen"], "_unchanged": True})
+    restored_file = "/src/restored.c"
+    stored = {
+        "breakpoints": [f"{restored_file}:{line}" for line in range(1, 501)]
+        + listing["breakpoints"][:1],
+        "disabled": [f"{restored_file}:1000"],
+    }
+    expect("breakpoints-restore",
+           client.query("breakpoints-restore " + json.dumps(stored)),
+           {"restored": 501, "failed": []})
+    expect("breakpoints-restore again",
+           client.query("breakpoints-restore " + json.dumps(stored)),
+           {"restored": 0, "failed": []})
+    expect("breakpoints-restore invalid",
+           client.query('breakpoints-restore {"breakpoints": ["nowhere"]}'),
+           {"restored": 0, "failed": ["nowhere"]})
+    spaced = "/src/dir  with   spaces/file.c:7"
+    client.query("breakpoints-restore " + json.dumps({"breakpoints": [spaced]}))
+    listing_spaced = client.query("breakpoints-list")
+    expect("breakpoints-restore spaces", spaced in listing_spaced["breakpoints"],
+           True)
+    breaks = client.query(f"info-breakpoints {restored_file}")
+    breaks.pop("_gen")
+    expect("restored breakpoints", sorted(map(int, breaks)),
+           list(range(1, 501)))
+    listing = client.query(f"breakpoints-list {listing['_gen']}")
+    expect("breakpoints-list after restore",
+           (len(listing["breakpoints"]), listing["disabled"]),
+           (breakpoints + 501, [f"{restored_file}:1000"]))
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} failure(s)")
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=2000,
+                        help="requests of every kind")
+    parser.add_argument("-w", "--window", type=int, default=1,
+                        help="requests in flight at once")
+    parser.add_argument("--breakpoints", type=int, default=10000,
+                        help="breakpoints in the program")
+    parser.add_argument("--depth", type=int, default=200,
+                        help="frames in the stack")
+    parser.add_argument("--check", action="store_true",
+                        help="verify the responses instead of measuring")
+    parser.add_argument("--baseline",
+                        help="JSON file with the statistics to compare to")
+    parser.add_argument("--save", help="store the statistics to the file")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative growth of a percentile")
+    parser.add_argument("--slack", type=float, default=0.1,
+                        help="allowed absolute growth of a percentile, ms")
+    args = parser.parse_args()
+
+    port, quit_event = start_side_channel(args.breakpoints, args.depth)
+    client = Client(port)
+    try:
+        if args.check:
+            return 0 if check(client, args.breakpoints, args.depth) else 1
+
+        stats = {}
+        for name, request, share, invalidate in get_scenarios(client):
+            count = max(1, int(args.count * share))
+            stats[name] = measure(client, request, count, args.window,
+                                  invalidate)
+        report(stats)
+    finally:
+        quit_event.set()
+
+    summary = {"gdb_commands": stats}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance, args.slack)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
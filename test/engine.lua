@@ -117,7 +117,63 @@ function E.get_termbuffers()
 end
 
 ---@alias BreakpointInfo table<integer, integer[]>  # breakpoint ID -> list of lines
----@alias SignInfo {cur: string, brk: BreakpointInfo}  # information about signs
+---@alias SignInfo {cur: string, brk: BreakpointInfo, brk_other: table<string, BreakpointInfo>}  # information about signs
+
+---Get the numbers of the signs GdbBreakpoint<num> by their text
+---@return table<string, integer>
+local function get_breakpoint_sign_nums()
+  local nums = {}
+  local num = 1
+  while true do
+    local def = vim.fn.sign_getdefined('GdbBreakpoint' .. num)[1]
+    if def == nil then
+      break
+    end
+    nums[vim.trim(def.text)] = num
+    num = num + 1
+  end
+  return nums
+end
+
+---Get the breakpoint signs in a buffer
+---@param buf integer buffer number
+---@param ns integer namespace of the breakpoint extmarks
+---@param nums table<string, integer> numbers of the signs by their text
+---@return BreakpointInfo
+local function get_breakpoint_signs(buf, ns, nums)
+  local breaks = {}
+  for _, mark in ipairs(vim.api.nvim_buf_get_extmarks(buf, ns, 0, -1, {details = true})) do
+    local idx = assert(nums[vim.trim(mark[4].sign_text)])
+    if breaks[idx] == nil then
+      breaks[idx] = {}
+    end
+    table.insert(breaks[idx], mark[2] + 1)
+  end
+  for _, lines in pairs(breaks) do
+    table.sort(lines)
+  end
+  return breaks
+end
+
+---Get the breakpoint signs expected for a file from the breakpoints known to the session
+---@param breakpoint Breakpoint breakpoints of the debugging session
+---@param fname string full path to the file
+---@param max_count integer count of the distinct breakpoint signs
+---@return BreakpointInfo
+local function get_expected_breakpoint_signs(breakpoint, fname, max_count)
+  local breaks = {}
+  for line, ids in pairs(breakpoint.breaks[fname] or {}) do
+    local idx = math.min(#ids, max_count)
+    if breaks[idx] == nil then
+      breaks[idx] = {}
+    end
+    table.insert(breaks[idx], assert(tonumber(line)))
+  end
+  for _, lines in pairs(breaks) do
+    table.sort(lines)
+  end
+  return breaks
+end
 
 ---Get current signs: current line and breakpoints
 ---@return SignInfo
@@ -125,17 +181,23 @@ function E.get_signs()
   -- Get pointer position and list of breakpoints.
   local ret = {}
 
+  local ns = vim.api.nvim_get_namespaces().NvimGdbBreakpoints
+  local nums = get_breakpoint_sign_nums()
+  local app = NvimGdb.here
+  local jump_buf = nil
+  if app ~= nil and app.win.jump_win ~= nil and vim.api.nvim_win_is_valid(app.win.jump_win) then
+    jump_buf = vim.api.nvim_win_get_buf(app.win.jump_win)
+  end
+
   for _, buf in ipairs(vim.api.nvim_list_bufs()) do
     if vim.api.nvim_buf_is_valid(buf) and vim.api.nvim_buf_is_loaded(buf) then
-      local breaks = {}
+      local bname = vim.api.nvim_buf_get_name(buf):match("[^/\\]+$")
+      if bname == nil then
+        bname = vim.api.nvim_buf_get_name(buf)
+      end
       for _, bsigns in ipairs(vim.fn.sign_getplaced(buf, {group = "NvimGdb"})) do
         for _, signs in ipairs(bsigns.signs) do
-          local sname = signs.name
-          if sname == 'GdbCurrentLine' then
-            local bname = vim.api.nvim_buf_get_name(buf):match("[^/\\]+$")
-            if bname == nil then
-              bname = vim.api.nvim_buf_get_name(buf)
-            end
+          if signs.name == 'GdbCurrentLine' then
             if ret.cur == nil then
               ret.cur = bname .. ':' .. signs.lnum
             else
@@ -145,17 +207,21 @@ function E.get_signs()
               table.insert(ret.curs, bname .. ':' .. signs.lnum)
             end
           end
-          if sname:match('^GdbBreakpoint') then
-            local num = assert(tonumber(sname:sub(1 + string.len('GdbBreakpoint'))))
-            if breaks[num] == nil then
-              breaks[num] = {}
-            end
-            table.insert(breaks[num], signs.lnum)
-          end
         end
       end
+
+      local breaks = ns ~= nil and get_breakpoint_signs(buf, ns, nums) or {}
       if next(breaks) ~= nil then
-        ret.brk = breaks
+        if buf == jump_buf or (jump_buf == nil and ret.brk == nil) then
+          ret.brk = breaks
+        elseif app == nil or not vim.deep_equal(breaks,
+            get_expected_breakpoint_signs(app.breakpoint, vim.api.nvim_buf_get_name(buf), #nums)) then
+          -- The breakpoints in every other file must agree with the session too
+          if ret.brk_other == nil then
+            ret.brk_other = {}
+          end
+          ret.brk_other[bname] = breaks
+        end
       end
     end
   end
@@ -0,0 +1,315 @@
+"""A stand-in for the GDB Python API to run lib/gdb_commands.py
+without a debugger.
+
+Only the parts used by the side channel are provided. The program state
+is synthetic: the breakpoints are added with add_breakpoint(), the stack
+is replaced with stop(). The callbacks posted with post_event() are run
+by run_main_loop(), which plays the role of the GDB main thread. Use
+run_in_main() to change the state from another thread.
+"""
+
+import queue
+import threading
+import types
+
+
+COMMAND_OBSCURE = 0
+BP_BREAKPOINT = 1
+
+(TYPE_CODE_PTR, TYPE_CODE_ARRAY, TYPE_CODE_STRUCT, TYPE_CODE_UNION,
+ TYPE_CODE_INT, TYPE_CODE_VOID, TYPE_CODE_FUNC) = range(7)
+
+
+class error(RuntimeError):  # pylint: disable=invalid-name
+    """Failure of a GDB operation."""
+
+
+class Command:
+    """The registered commands are remembered to be invoked directly."""
+
+    instances = {}
+
+    def __init__(self, name, command_class):
+        self.name = name
+        self.command_class = command_class
+        Command.instances[name] = self
+
+
+class EventRegistry:
+    """The handlers of an event."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def connect(self, handler):
+        self.handlers.append(handler)
+
+    def disconnect(self, handler):
+        self.handlers.remove(handler)
+
+    def fire(self, *args):
+        for handler in list(self.handlers):
+            handler(*args)
+
+
+events = types.SimpleNamespace(**{
+    name: EventRegistry() for name in (
+        "cont", "stop", "exited", "breakpoint_created",
+        "breakpoint_modified", "breakpoint_deleted", "memory_changed",
+        "register_changed", "before_prompt")})
+
+
+class StopEvent:
+    """The program has stopped."""
+
+
+class BreakpointEvent(StopEvent):
+    """The program has stopped at the breakpoints."""
+
+    def __init__(self, breakpoints):
+        self.breakpoints = breakpoints
+
+
+class SignalEvent(StopEvent):
+    """The program has received a signal."""
+
+    def __init__(self, stop_signal):
+        self.stop_signal = stop_signal
+
+
+# -----------------------------------------------------------------------------
+# Main thread
+# -----------------------------------------------------------------------------
+
+_posted = queue.Queue()
+
+
+def post_event(func):
+    _posted.put(func)
+
+
+def run_main_loop(quit_event):
+    """Run the posted callbacks until quit_event is set."""
+    while not quit_event.is_set():
+        try:
+            func = _posted.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        func()
+
+
+def run_in_main(func, *args):
+    """Execute the function in the main loop and wait for the result."""
+    done = threading.Event()
+    result = []
+
+    def _run():
+        try:
+            result.append(func(*args))
+        finally:
+            done.set()
+    post_event(_run)
+    done.wait()
+    return result[0] if result else None
+
+
+# -----------------------------------------------------------------------------
+# Program state
+# -----------------------------------------------------------------------------
+
+class Symtab:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def fullname(self):
+        return self.filename
+
+
+class Sal:
+    def __init__(self, filename, line):
+        self.symtab = Symtab(filename) if filename else None
+        self.line = line
+
+
+class Frame:
+    """A frame of the synthetic stack, the older frames follow it."""
+
+    def __init__(self, stack, level, function, filename, line):
+        self.stack = stack
+        self.level = level
+        self.function = function
+        self.sal = Sal(filename, line)
+
+    def is_valid(self):
+        return self.stack is _stack or any(
+            self.stack is stack for stack in _thread_stacks.values())
+
+    def older(self):
+        level = self.level + 1
+        return self.stack[level] if level < len(self.stack) else None
+
+    def pc(self):
+        return 0x400000 + 0x10 * self.level
+
+    def name(self):
+        return self.function
+
+    def find_sal(self):
+        return self.sal
+
+
+class BreakpointLocation:
+    def __init__(self, filename, line):
+        self.enabled = True
+        self.source = (filename, line)
+        self.fullname = filename
+
+
+class Breakpoint:
+    """Only the locations "file:line" are understood."""
+
+    def __init__(self, spec):
+        global _last_breakpoint  # pylint: disable=global-statement
+        filename, _, line = spec.rpartition(":")
+        if not filename or not line.isdigit():
+            raise error(f'Function "{spec}" not defined.')
+        _last_breakpoint += 1
+        self.number = _last_breakpoint
+        self.type = BP_BREAKPOINT
+        self.temporary = False
+        self.location = spec
+        self._enabled = True
+        self.locations = [BreakpointLocation(filename, int(line))]
+        self.valid = True
+        _breakpoints.append(self)
+        events.breakpoint_created.fire(self)
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+        events.breakpoint_modified.fire(self)
+
+    def is_valid(self):
+        return self.valid
+
+
+class Progspace:
+    def __init__(self, filename):
+        self.filename = filename
+
+
+_breakpoints = []
+_last_breakpoint = 0
+_stack = []
+_thread_stacks = {}     # {thread number -> stack} of the unselected threads
+_outputs = {}
+_progspace = Progspace("/src/a.out")
+
+
+def breakpoints():
+    return tuple(_breakpoints)
+
+
+def current_progspace():
+    return _progspace
+
+
+def add_breakpoint(filename, line):
+    """Create a breakpoint at the location as "break" would."""
+    return Breakpoint(f"{filename}:{line}")
+
+
+def delete_breakpoint(bp):
+    _breakpoints.remove(bp)
+    bp.valid = False
+    events.breakpoint_deleted.fire(bp)
+
+
+def stop(frames):
+    """Stop the program with the stack [(function, file, line)], newest first."""
+    global _stack  # pylint: disable=global-statement
+    _stack = _make_stack(frames)
+    _thread_stacks.clear()
+    events.stop.fire(StopEvent())
+
+
+def _make_stack(frames):
+    stack = []
+    for level, (function, filename, line) in enumerate(frames):
+        stack.append(Frame(stack, level, function, filename, line))
+    return stack
+
+
+def newest_frame():
+    if not _stack:
+        raise error("No stack.")
+    return _stack[0]
+
+
+def selected_frame():
+    return newest_frame()
+
+
+class Inferior:
+    def __init__(self, num):
+        self.num = num
+
+
+class InferiorThread:
+    def __init__(self, inferior, num):
+        self.inferior = inferior
+        self.num = num
+        self.global_num = num
+
+
+_threads = {1: InferiorThread(Inferior(1), 1)}
+_selected_thread = 1
+
+
+def selected_thread():
+    return _threads.get(_selected_thread)
+
+
+def select_thread(num, frames=None):
+    """Switch to the thread as "thread N" would without a stop.
+
+    The stack of a thread seen for the first time is given by frames.
+    """
+    global _selected_thread, _stack  # pylint: disable=global-statement
+    _threads.setdefault(num, InferiorThread(_threads[1].inferior, num))
+    _thread_stacks[_selected_thread] = _stack
+    _stack = _thread_stacks.pop(num, None) or _make_stack(frames or [])
+    _selected_thread = num
+
+
+def set_output(command, output):
+    """Define the output of a debugger command."""
+    _outputs[command] = output
+
+
+def execute(command, from_tty=False, to_string=False):
+    try:
+        return _outputs[command]
+    except KeyError:
+        raise error(f'Undefined command: "{command}".') from None
+
+
+# -----------------------------------------------------------------------------
+# Values
+# -----------------------------------------------------------------------------
+
+class Value:
+    def __init__(self, value):
+        self.value = value
+
+
+def parse_and_eval(expression):
+    raise error(f'No symbol "{expression}" in current context.')
+
+
+def default_visualizer(value):
+    return None
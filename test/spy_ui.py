@@ -27,10 +27,12 @@ class SpyUI:
         self.logger.info("Starting SpyUI %dx%d", self.width, self.height)
         self.nvim.ui_attach(self.width, self.height, rgb=True,
                             ext_linegrid=True)
-        self.grid = []
-        for _ in range(self.height):
-            self.grid.append([' '] * self.width)
-        self.screen = self.to_str()
+        # Every row is a list of cells, the rows are replaced as a whole
+        # when scrolling.
+        self.grid = [[' '] * self.width for _ in range(self.height)]
+        # The rows as of the last flush and the rows changed since then
+        self.lines = [self._render_row(row) for row in self.grid]
+        self.dirty = set()
 
     def run(self):
         """Run the loop."""
@@ -83,57 +85,75 @@ class SpyUI:
             elif cmd == "grid_scroll":
                 for_each_param(self._grid_scroll)
             elif cmd == "flush":
-                screen = self.to_str()
-                if screen != self.screen:
-                    # print(screen)
-                    self.logger.info("\n%s", self.screen)
-                    self.screen = screen
+                self._flush()
             else:
                 # print(cmd, par, file=sys.stderr)
                 pass
 
+    def _flush(self):
+        """Log the rows changed since the last flush."""
+        changes = []
+        for row in sorted(self.dirty):
+            if row >= self.height:
+                continue
+            line = self._render_row(self.grid[row])
+            if line != self.lines[row]:
+                self.lines[row] = line
+                changes.append(f"{row:3d}{line}")
+        self.dirty.clear()
+        if changes:
+            self.logger.info("\n%s", "\n".join(changes))
+
+    @staticmethod
+    def _render_row(row):
+        return '|' + ''.join(row) + '|'
+
     def _grid_resize(self, gr, width, height):
         assert gr == 1
         new_grid = []
-        for _ in range(height):
-            new_grid.append([' '] * width)
-        for row in range(min(self.height, height)):
-            for col in range(min(self.width, width)):
-                new_grid[row][col] = self.grid[row][col]
+        for row in range(height):
+            old = self.grid[row][:width] if row < self.height else []
+            new_grid.append(old + [' '] * (width - len(old)))
         self.grid = new_grid
         self.width = width
         self.height = height
+        self.lines = (self.lines + [None] * height)[:height]
+        self.dirty = set(range(height))
 
     def _grid_clear(self, gr):
         assert gr == 1
-        for row in range(self.height):
-            for col in range(self.width):
-                self.grid[row][col] = ' '
+        self.grid = [[' '] * self.width for _ in range(self.height)]
+        self.dirty = set(range(self.height))
 
     def _grid_line(self, gr, row, col, cells, wrap, *args):
         assert gr == 1
+        texts = []
         for cell in cells:
-            text = cell[0]
-            repeat = 1
-            if len(cell) > 2:
-                repeat = int(cell[2])
-            for i in range(repeat):
-                self.grid[row][col + i] = text
-            col += repeat
+            repeat = int(cell[2]) if len(cell) > 2 else 1
+            texts.extend([cell[0]] * repeat)
+        self.grid[row][col:col + len(texts)] = texts
+        self.dirty.add(row)
 
     def _grid_scroll(self, gr, top, bot, left, right, rows, cols):
         assert gr == 1
         assert cols == 0
         if rows > 0:
-            for row in range(top, bot - rows):
-                rfrom = row + rows
-                for col in range(left, right):
-                    self.grid[row][col] = self.grid[rfrom][col]
+            moved = range(top, bot - rows)
         else:
-            for row in range(bot - 1, top - rows - 1, -1):
-                rfrom = row + rows
-                for col in range(left, right):
-                    self.grid[row][col] = self.grid[rfrom][col]
+            moved = range(bot - 1, top - rows - 1, -1)
+        full_width = left == 0 and right == self.width
+        for row in moved:
+            rfrom = row + rows
+            if full_width:
+                self.grid[row] = self.grid[rfrom]
+            else:
+                self.grid[row][left:right] = self.grid[rfrom][left:right]
+            self.dirty.add(row)
+        if full_width:
+            # Don't let the rows share the cells
+            for row in range(top, bot):
+                if row not in moved:
+                    self.grid[row] = list(self.grid[row])
 
     def to_str(self):
         """Render the grid into a string."""